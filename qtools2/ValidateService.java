@@ -0,0 +1,154 @@
+/*
+ * The MIT License (MIT)
+ *
+ * Copyright (c) 2016 PMA2020
+ *
+ * Permission is hereby granted, free of charge, to any person obtaining a copy
+ * of this software and associated documentation files (the "Software"), to
+ * deal in the Software without restriction, including without limitation the
+ * rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+ * sell copies of the Software, and to permit persons to whom the Software is
+ * furnished to do so, subject to the following conditions:
+ *
+ * The above copyright notice and this permission notice shall be included in
+ * all copies or substantial portions of the Software.
+ *
+ * THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+ * IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+ * FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+ * AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+ * LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+ * FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+ * IN THE SOFTWARE.
+ */
+
+import java.io.BufferedReader;
+import java.io.ByteArrayOutputStream;
+import java.io.IOException;
+import java.io.InputStreamReader;
+import java.io.PrintStream;
+import java.lang.reflect.Field;
+import java.lang.reflect.InvocationTargetException;
+import java.lang.reflect.Method;
+import java.security.Permission;
+
+import org.opendatakit.validate.FormValidator;
+
+/**
+ * Run ODK Validate on one XForm after another in a single JVM.
+ *
+ * Reads one XForm path per line from stdin. For each path, runs ODK Validate
+ * and writes a header line "<exit status> <byte count>" to stdout, followed
+ * by that many bytes of UTF-8 text that ODK Validate wrote to stderr. Writes
+ * "READY" once at start-up. Exits when stdin is closed.
+ *
+ * ODK Validate ends its command-line entry point with System.exit. In
+ * "exit-trap" mode (the default) a SecurityManager turns that call into an
+ * exception, so the entry point runs exactly as on the command line. Java
+ * 18 to 23 need -Djava.security.manager=allow for this, and Java 24 and
+ * later cannot install a SecurityManager at all. In "direct" mode, or if a
+ * SecurityManager cannot be installed, FormValidator.validate is called
+ * instead and the exit status is read from its error flag, as the entry
+ * point does.
+ */
+public class ValidateService {
+
+    static final String EXIT_TRAP = "exit-trap";
+    static final String DIRECT = "direct";
+
+    static class ExitTrap extends SecurityException {
+        final int status;
+
+        ExitTrap(int status) {
+            this.status = status;
+        }
+    }
+
+    /** Calls FormValidator.validate and reads its private error flag. */
+    static class DirectValidator {
+        final Method validate;
+        final Field inError;
+
+        DirectValidator() throws ReflectiveOperationException {
+            validate = FormValidator.class.getMethod("validate",
+                                                     String.class);
+            inError = FormValidator.class.getDeclaredField("inError");
+            inError.setAccessible(true);
+        }
+
+        int run(String path) throws Throwable {
+            FormValidator validator = new FormValidator();
+            try {
+                validate.invoke(validator, path);
+            } catch (InvocationTargetException e) {
+                throw e.getCause();
+            }
+            return inError.getBoolean(validator) ? 1 : 0;
+        }
+    }
+
+    static boolean trapExit() {
+        try {
+            System.setSecurityManager(new SecurityManager() {
+                @Override
+                public void checkPermission(Permission perm) {
+                }
+
+                @Override
+                public void checkExit(int status) {
+                    throw new ExitTrap(status);
+                }
+            });
+            return true;
+        } catch (UnsupportedOperationException e) {
+            return false;
+        } catch (SecurityException e) {
+            return false;
+        }
+    }
+
+    public static void main(String[] args) throws IOException {
+        PrintStream out = System.out;
+        PrintStream err = System.err;
+        BufferedReader in = new BufferedReader(
+            new InputStreamReader(System.in, "UTF-8"));
+        String mode = args.length > 0 ? args[0] : EXIT_TRAP;
+        DirectValidator direct = null;
+        if (DIRECT.equals(mode) || !trapExit()) {
+            try {
+                direct = new DirectValidator();
+            } catch (ReflectiveOperationException e) {
+                err.println("Cannot call ODK Validate directly: " + e);
+                System.exit(2);
+            }
+        }
+        out.print("READY\n");
+        out.flush();
+        String path;
+        while ((path = in.readLine()) != null) {
+            ByteArrayOutputStream buffer = new ByteArrayOutputStream();
+            PrintStream errStream = new PrintStream(buffer, true, "UTF-8");
+            System.setErr(errStream);
+            System.setOut(new PrintStream(new ByteArrayOutputStream(), true,
+                                          "UTF-8"));
+            int status = 0;
+            try {
+                if (direct == null) {
+                    FormValidator.main(new String[] {path});
+                } else {
+                    status = direct.run(path);
+                }
+            } catch (ExitTrap e) {
+                status = e.status;
+            } catch (Throwable t) {
+                t.printStackTrace(errStream);
+                status = 1;
+            }
+            errStream.flush();
+            byte[] bytes = buffer.toByteArray();
+            out.print(status + " " + bytes.length + "\n");
+            out.write(bytes, 0, bytes.length);
+            out.flush();
+        }
+    }
+}
@@ -0,0 +1,144 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2016 PMA2020
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Convert XLSForms in memory, for use as a library
+
+``convert_xlsform`` takes the bytes of an XLSForm and returns the XForm, the
+itemsets CSV, and lists of warnings and errors. Nothing is read from or
+written to the file system and nothing is printed, so many conversions can
+run in one process, e.g. behind a web service.
+
+Linking among several forms and ODK Validate need files on disk, so they are
+left to ``convert.xlsform_convert``.
+"""
+
+import collections
+import os.path
+import zipfile
+import StringIO
+
+from xlrd import XLRDError
+from pmaxform.errors import PyXFormError
+from pmaxform.utils import has_external_choices
+from pmaxform.xls2json_backends import xls_to_dict
+
+import constants
+from errors import XlsformError
+from tokenrules import get_rules
+from xform import Xform
+from xlsform import Xlsform
+
+
+# The result of a conversion. xform is the edited XForm (unicode) and
+# itemsets the itemsets.csv contents (str), each None if not produced.
+# warnings and errors are lists of tuples (category, message).
+Conversion = collections.namedtuple('Conversion',
+                                    'xform itemsets warnings errors')
+
+# Categories of errors
+WORKBOOK_ERROR = u'workbook'
+XLSFORM_ERROR = u'xlsform'
+PYXFORM_ERROR = u'pyxform'
+UNEXPECTED_ERROR = u'unexpected'
+# Category of pmaxform warnings. Extra checks use their names in
+# ``Xlsform.EXTRA_CHECKS``.
+PYXFORM_WARNING = u'pyxform'
+ITEMSETS_WARNING = u'itemsets'
+
+
+def convert_xlsform(source, filename=u'xlsform.xlsx', pma=False,
+                    check_versioning=False, extras=True,
+                    translation_rules=None):
+    """Convert an XLSForm to an XForm without touching the file system
+
+    Args:
+        source: The XLSForm as a str of bytes or a file-like object
+        filename (str): The name of the file the XLSForm came from. The
+            extension tells .xls from .xlsx, and the name is used for the
+            survey name, the default form_id, and in messages.
+        pma (bool): Whether to enforce PMA2020 conventions
+        check_versioning (bool): Whether to check version consistency
+        extras (bool): Whether to run the extra checks
+        translation_rules (seq): Names of optional translation token rules,
+            see ``tokenrules.OPTIONAL_RULES``
+
+    Returns:
+        A Conversion. If errors is not empty, xform is None.
+
+    Raises:
+        KeyError: If a translation rule name is not known
+    """
+    contents = source if isinstance(source, str) else source.read()
+    rules = get_rules(translation_rules)
+    warnings = []
+    try:
+        xlsform = Xlsform(filename, pma=pma, contents=contents)
+        if check_versioning:
+            xlsform.version_consistency()
+    except XlsformError as e:
+        return Conversion(None, None, [], [(XLSFORM_ERROR, unicode(e))])
+    except (XLRDError, zipfile.BadZipfile) as e:
+        m = u'"{}" does not appear to be a well-formed MS-Excel file: {}'
+        m = m.format(os.path.basename(filename), unicode(e))
+        return Conversion(None, None, [], [(WORKBOOK_ERROR, m)])
+    xlsform.translation_rules = rules
+    try:
+        xform, itemsets = to_xform(xlsform, warnings)
+        if extras:
+            warnings.extend(xlsform.extra_warnings())
+    except PyXFormError as e:
+        return Conversion(None, None, warnings, [(PYXFORM_ERROR, unicode(e))])
+    except Exception as e:
+        return Conversion(None, None, warnings,
+                          [(UNEXPECTED_ERROR, repr(e))])
+    return Conversion(xform, itemsets, warnings, [])
+
+
+def to_xform(xlsform, warnings):
+    """Build the edited XForm and the itemsets CSV in memory
+
+    Args:
+        xlsform (Xlsform): An XLSForm made from its contents
+        warnings (list): Where to add (category, message) warnings
+
+    Returns:
+        A tuple (xform, itemsets). See ``Conversion``.
+    """
+    workbook_dict = None
+    if xlsform.index.unindexed(constants.PYXFORM_SHEETS):
+        workbook_dict = xls_to_dict(xlsform.open_source())
+    pyxform_warnings = []
+    json_survey, survey = xlsform.build_survey(pyxform_warnings,
+                                               workbook_dict)
+    lines = Xform.edit_text(survey._to_pretty_xml())
+    warnings.extend((PYXFORM_WARNING, w) for w in pyxform_warnings)
+    itemsets = None
+    if has_external_choices(json_survey):
+        if xlsform.has_itemsets():
+            out = StringIO.StringIO()
+            xlsform.itemsets_to_csv(out)
+            itemsets = out.getvalue()
+        else:
+            m = (u'Could not export itemsets.csv, perhaps the external '
+                 u'choices sheet is missing.')
+            warnings.append((ITEMSETS_WARNING, m))
+    return ''.join(lines).decode('utf-8'), itemsets
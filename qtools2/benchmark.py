@@ -0,0 +1,586 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2016 PMA2020
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Benchmarks for the checks, XForm edits, and linking validation
+
+Run from the command line::
+
+    python -m qtools2.benchmark -o before.json
+
+or, to fail when a benchmark is slower than in a stored baseline::
+
+    python -m qtools2.benchmark --compare benchmark-baseline.json
+
+Each benchmark is timed at several input sizes, a few times each, and the
+results are written as JSON so that runs can be compared. Inputs are made
+up in memory or in a temporary directory, with ``formgen`` for XLSForms.
+Nothing needs the network. Stages that need Java (ODK Validate) are skipped,
+and listed as skipped, when Java is not found.
+"""
+
+import os
+import os.path
+import gc
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import timeit
+from distutils.spawn import find_executable
+
+import constants
+from __init__ import __version__ as VERSION
+from convert import validate_xpaths
+from formgen import FormGenerator
+from sheetindex import IndexedSheet
+from sheetindex import SheetIndex
+from validator import check_xform
+from xform import Xform
+from xlsform import Xlsform
+
+
+DEFAULT_SIZES = (100, 1000, 5000)
+DEFAULT_REPEAT = 3
+DEFAULT_OUTPUT = u'qtools2-benchmark.json'
+DEFAULT_THRESHOLD = 0.5
+# Slowdowns smaller than this many seconds are never counted as regressions
+DEFAULT_MIN_DELTA = 0.005
+# Rows of external choices per question in made-up XLSForms
+EXTERNAL_PER_QUESTION = 10
+# ODK Validate takes seconds per form, so only small sizes are run
+VALIDATE_MAX_SIZE = 1000
+LANGUAGES = (u'English', u'Francais')
+CHOICES_PER_LIST = 5
+
+
+def make_index(size):
+    """Make up a two-language XLSForm with size questions as a SheetIndex
+
+    Every tenth question is a select_one of its own list, and the lists
+    include the problems that the checks look for: duplicate names, a list
+    defined in two places, unused lists, missing and mismatched
+    translations, and non-ASCII names.
+    """
+    survey = [[constants.TYPE, constants.NAME] +
+              [u'label::{}'.format(lang) for lang in LANGUAGES] +
+              [u'hint::{}'.format(lang) for lang in LANGUAGES] + [u'']]
+    choices = [[constants.LIST_NAME, constants.NAME] +
+               [u'label::{}'.format(lang) for lang in LANGUAGES]]
+    n_lists = max(1, size // 10)
+    for i in xrange(size):
+        qtype = u'integer'
+        if i % 10 == 0:
+            qtype = u'select_one list_{}'.format(i // 10)
+        english = u'Question {} about ${{q_{}}}'.format(i, max(0, i - 1))
+        french = u'Question {} sur ${{q_{}}}'.format(i, max(0, i - 1))
+        if i % 7 == 0:
+            french = u''
+        elif i % 11 == 0:
+            french = u'Question sur ${{q_{}}}'.format(i)
+        hint = u'Enter {} or more'.format(i % 5)
+        stray = u'note' if i % 97 == 0 else u''
+        survey.append([qtype, u'q_{}'.format(i), english, french, hint,
+                       hint, stray])
+    for k in xrange(n_lists + n_lists // 10 + 1):
+        list_name = u'list_{}'.format(k % (n_lists + 1))
+        for j in xrange(CHOICES_PER_LIST):
+            name = unicode(j)
+            if j == CHOICES_PER_LIST - 1 and k % 13 == 0:
+                name = u'0'
+            elif j == CHOICES_PER_LIST - 1 and k % 17 == 0:
+                name = u'caf\xe9'
+            choices.append([list_name, name, u'Choice {}'.format(j),
+                            u'Choix {}'.format(j if k % 19 else j + 1)])
+    sheets = {
+        constants.SURVEY: IndexedSheet(constants.SURVEY,
+                                       [list(c) for c in zip(*survey)]),
+        constants.CHOICES: IndexedSheet(constants.CHOICES,
+                                        [list(c) for c in zip(*choices)])
+    }
+    return SheetIndex(sheets, [constants.SURVEY, constants.CHOICES])
+
+
+def make_xform_text(size, form_id=u'bench', root=u'bench'):
+    """Make up an XForm with size questions in groups of ten
+
+    Labels hold the placeholder and the escaped entity that the XForm edits
+    remove and fix.
+    """
+    instance = []
+    binds = []
+    body = []
+    for g in xrange((size + 9) // 10):
+        group = u'/{}/grp_{}'.format(root, g)
+        instance.append(u'          <grp_{}>'.format(g))
+        binds.append(u'      <bind nodeset="{}"/>'.format(group))
+        body.append(u'    <group ref="{}">'.format(group))
+        for i in xrange(g * 10, min(size, g * 10 + 10)):
+            xpath = u'{}/q_{}'.format(group, i)
+            instance.append(u'            <q_{}/>'.format(i))
+            binds.append(u'      <bind nodeset="{}" type="int"/>'.format(
+                xpath))
+            body.append(u'      <input ref="{}"><label>{} Question {}'
+                        u'&amp;#x20;</label></input>'.format(
+                            xpath, constants.placeholders[0], i))
+        instance.append(u'          </grp_{}>'.format(g))
+        body.append(u'    </group>')
+    lines = [
+        u'<?xml version="1.0"?>',
+        u'<h:html xmlns="http://www.w3.org/2002/xforms" '
+        u'xmlns:h="http://www.w3.org/1999/xhtml">',
+        u'  <h:head>',
+        u'    <h:title>{}</h:title>'.format(form_id),
+        u'    <model>',
+        u'      <instance>',
+        u'        <{} id="{}">'.format(root, form_id)
+    ] + instance + [
+        u'          <meta>',
+        u'            <instanceID/>',
+        u'          </meta>',
+        u'        </{}>'.format(root),
+        u'      </instance>'
+    ] + binds + [
+        u'      <bind calculate="concat(\'uuid:\', uuid())" '
+        u'nodeset="/{}/meta/instanceID" type="string"/>'.format(root),
+        u'    </model>',
+        u'  </h:head>',
+        u'  <h:body>'
+    ] + body + [
+        u'  </h:body>',
+        u'</h:html>',
+        u''
+    ]
+    return u'\n'.join(lines)
+
+
+def form_xpaths(size, root=u'bench'):
+    return [u'/{}/grp_{}/q_{}'.format(root, i // 10, i) for i in
+            xrange(size)]
+
+
+class LinkedForm:
+    """The parts of an Xlsform that ``validate_xpaths`` reads"""
+
+    def __init__(self, path, save_instance, save_form):
+        self.path = path
+        self.save_instance = [constants.SAVE_INSTANCE] + save_instance
+        self.save_form = [constants.SAVE_FORM] + save_form
+
+
+def bench_xlsform(directory, sizes):
+    """Xlsform construction with PMA checks, from a made-up XLSForm"""
+    cases = []
+    for size in sizes:
+        sub_directory = os.path.join(directory, u'xlsform-{}'.format(size))
+        os.mkdir(sub_directory)
+        generator = FormGenerator(
+            questions=size, external_lists=5,
+            external_choices=size * EXTERNAL_PER_QUESTION)
+        path = generator.write(sub_directory)
+
+        def make(path=path):
+            return lambda: Xlsform(path)
+        cases.append((u'xlsform', size, make))
+    return cases
+
+
+def bench_checks(directory, sizes):
+    """Each static check of Xlsform, on a fresh index every time"""
+    checks = (
+        (u'find_name_dups', lambda wb, langs:
+            Xlsform.find_name_dups(wb, constants.CHOICES)),
+        (u'find_multiple_lists', lambda wb, langs:
+            Xlsform.find_multiple_lists(wb, constants.CHOICES)),
+        (u'find_unused_lists', lambda wb, langs:
+            Xlsform.find_unused_lists(wb)),
+        (u'undefined_cols', lambda wb, langs:
+            Xlsform.undefined_cols(wb, constants.SURVEY)),
+        (u'find_missing_translations', lambda wb, langs:
+            Xlsform.find_missing_translations(wb, langs)),
+        (u'find_by_regex_translations', lambda wb, langs:
+            Xlsform.find_by_regex_translations(wb, langs)),
+        (u'find_non_ascii', lambda wb, langs:
+            Xlsform.find_non_ascii(wb, constants.CHOICES)),
+        (u'check_languages', lambda wb, langs:
+            Xlsform.check_languages(wb))
+    )
+    cases = []
+    for size in sizes:
+        record = make_index(size).to_record()
+        langs = Xlsform.check_languages(SheetIndex.from_record(record))
+        for name, check in checks:
+            def make(record=record, check=check, langs=langs):
+                wb = SheetIndex.from_record(record)
+                return lambda: check(wb, langs)
+            cases.append((u'check.' + name, size, make))
+    return cases
+
+
+def bench_make_edits(directory, sizes):
+    """Xform.make_edits on a freshly written XForm every time"""
+    cases = []
+    for size in sizes:
+        text = make_xform_text(size).encode('utf-8')
+        path = os.path.join(directory, u'edits-{}.xml'.format(size))
+
+        def make(text=text, path=path):
+            with open(path, 'w') as f:
+                f.write(text)
+            return Xform(filename=path, form_id=u'bench').make_edits
+        cases.append((u'xform.make_edits', size, make))
+    return cases
+
+
+def bench_discover_all(directory, sizes):
+    """Xform.discover_all for every question, parsing included"""
+    cases = []
+    for size in sizes:
+        path = os.path.join(directory, u'discover-{}.xml'.format(size))
+        with open(path, 'w') as f:
+            f.write(make_xform_text(size).encode('utf-8'))
+        xpaths = form_xpaths(size) + [u'/bench/missing']
+
+        def make(path=path, xpaths=xpaths):
+            xform = Xform(filename=path, form_id=u'bench')
+            return lambda: xform.discover_all(xpaths)
+        cases.append((u'xform.discover_all', size, make))
+    return cases
+
+
+def bench_validate_xpaths(directory, sizes, parents=5):
+    """convert.validate_xpaths with several parents linking into one child
+
+    Each parent links to a tenth of the child's questions and, like real
+    forms, names the child once in save_form.
+    """
+    cases = []
+    for size in sizes:
+        path = os.path.join(directory, u'child-{}.xml'.format(size))
+        with open(path, 'w') as f:
+            f.write(make_xform_text(size, u'child').encode('utf-8'))
+        xpaths = form_xpaths(size)
+        linked = []
+        for p in xrange(parents):
+            save_instance = xpaths[p::10]
+            linked.append(LinkedForm(u'parent-{}.xlsx'.format(p),
+                                     save_instance, [u'child']))
+
+        def make(path=path, linked=linked):
+            child = Xform(filename=path, form_id=u'child')
+            return lambda: validate_xpaths(linked, [child])
+        cases.append((u'convert.validate_xpaths', size, make))
+    return cases
+
+
+def bench_validate(directory, sizes):
+    """ODK Validate on a made-up XForm, without the cache or service"""
+    cases = []
+    for size in sizes:
+        if size > VALIDATE_MAX_SIZE:
+            continue
+        path = os.path.join(directory, u'validate-{}.xml'.format(size))
+        with open(path, 'w') as f:
+            f.write(make_xform_text(size).encode('utf-8'))
+
+        def make(path=path):
+            return lambda: check_xform(path)
+        cases.append((u'odk_validate', size, make))
+    return cases
+
+
+def time_case(make, repeat):
+    """Time a benchmark case, with a fresh setup for each repetition
+
+    Garbage collection is off while timing, as in ``timeit``, so that
+    collections caused by earlier cases do not land in the timings.
+
+    Args:
+        make: A function that sets up and returns the function to time
+        repeat (int): How many times to time it
+
+    Returns:
+        A list of the times, in seconds
+    """
+    times = []
+    for _ in xrange(repeat):
+        func = make()
+        gc.collect()
+        gc.disable()
+        try:
+            start = timeit.default_timer()
+            func()
+            times.append(timeit.default_timer() - start)
+        finally:
+            gc.enable()
+    return times
+
+
+def percentile(values, fraction):
+    """Get a percentile by linear interpolation between closest ranks"""
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    weight = position - lower
+    return ordered[lower] * (1 - weight) + ordered[upper] * weight
+
+
+def median(values):
+    return percentile(values, 0.5)
+
+
+def iqr(values):
+    """Get the interquartile range, the spread of the middle half"""
+    return percentile(values, 0.75) - percentile(values, 0.25)
+
+
+def run(sizes=DEFAULT_SIZES, repeat=DEFAULT_REPEAT, only=None, out=None):
+    """Run the benchmarks
+
+    Args:
+        sizes (seq): The numbers of questions to make up for each input
+        repeat (int): How many times to time each case
+        only (str): Run only benchmarks whose names start with this
+        out: A file-like object for progress messages. Default is
+            sys.stdout.
+
+    Returns:
+        A dictionary of the results, ready to dump as JSON
+    """
+    if out is None:
+        out = sys.stdout
+    results = []
+    skipped = []
+    directory = tempfile.mkdtemp(prefix=u'qtools2-benchmark-')
+    try:
+        cases = bench_xlsform(directory, sizes)
+        cases.extend(bench_checks(directory, sizes))
+        cases.extend(bench_make_edits(directory, sizes))
+        cases.extend(bench_discover_all(directory, sizes))
+        cases.extend(bench_validate_xpaths(directory, sizes))
+        if find_executable(u'java'):
+            cases.extend(bench_validate(directory, sizes))
+        else:
+            skipped.append({u'name': u'odk_validate',
+                            u'reason': u'Java not found'})
+        for name, size, make in cases:
+            if only and not name.startswith(only):
+                continue
+            times = time_case(make, repeat)
+            result = {
+                u'name': name,
+                u'size': size,
+                u'times': times,
+                u'median': median(times),
+                u'iqr': iqr(times),
+                u'min': min(times)
+            }
+            results.append(result)
+            print >> out, u'{:<40} {:>6}  {:>10.4f} s'.format(
+                name, size, result[u'median'])
+    finally:
+        shutil.rmtree(directory)
+    for skip in skipped:
+        print >> out, u'Skipped {}: {}'.format(skip[u'name'],
+                                               skip[u'reason'])
+    return {
+        u'qtools2': VERSION,
+        u'python': platform.python_version(),
+        u'platform': platform.platform(),
+        u'time': time.strftime(u'%Y-%m-%dT%H:%M:%S'),
+        u'sizes': list(sizes),
+        u'repeat': repeat,
+        u'results': results,
+        u'skipped': skipped
+    }
+
+
+def compare(baseline, report, threshold=DEFAULT_THRESHOLD,
+            min_delta=DEFAULT_MIN_DELTA):
+    """Compare benchmark results against a baseline
+
+    A benchmark regresses when its median is more than threshold slower
+    than the baseline median, the slowdown is more than min_delta, and the
+    middle halves of the two sets of timings do not overlap. The median and
+    interquartile range (IQR) are used rather than the mean and standard
+    deviation so that one slow repetition does not decide the result.
+
+    Args:
+        baseline (dict): Results from ``run``, loaded from JSON
+        report (dict): Results from ``run`` to check
+        threshold (float): The allowed slowdown, as a fraction of the
+            baseline median
+        min_delta (float): The smallest slowdown, in seconds, that counts
+
+    Returns:
+        A list of dictionaries, one per benchmark in either set of results,
+        with the baseline and current median and IQR, the relative change,
+        and a status: "ok", "regressed", "improved", "new", or "missing".
+    """
+    current = {(r[u'name'], r[u'size']): r for r in report[u'results']}
+    compared = []
+    seen = set()
+    for base in baseline[u'results']:
+        key = (base[u'name'], base[u'size'])
+        seen.add(key)
+        row = {
+            u'name': base[u'name'],
+            u'size': base[u'size'],
+            u'baseline': base[u'median'],
+            u'baseline_iqr': base.get(u'iqr', 0.0),
+            u'current': None,
+            u'current_iqr': None,
+            u'change': None,
+            u'status': u'missing'
+        }
+        found = current.get(key)
+        if found is not None:
+            row[u'current'] = found[u'median']
+            row[u'current_iqr'] = found[u'iqr']
+            delta = found[u'median'] - base[u'median']
+            if base[u'median'] > 0:
+                row[u'change'] = delta / base[u'median']
+            # Medians more than half of each IQR apart have middle halves
+            # that do not overlap
+            noise = max(min_delta,
+                        (row[u'baseline_iqr'] + found[u'iqr']) / 2.0)
+            if abs(delta) <= noise:
+                row[u'status'] = u'ok'
+            elif delta > threshold * base[u'median']:
+                row[u'status'] = u'regressed'
+            elif -delta > threshold * base[u'median']:
+                row[u'status'] = u'improved'
+            else:
+                row[u'status'] = u'ok'
+        compared.append(row)
+    for result in report[u'results']:
+        if (result[u'name'], result[u'size']) not in seen:
+            compared.append({
+                u'name': result[u'name'],
+                u'size': result[u'size'],
+                u'baseline': None,
+                u'baseline_iqr': None,
+                u'current': result[u'median'],
+                u'current_iqr': result[u'iqr'],
+                u'change': None,
+                u'status': u'new'
+            })
+    return compared
+
+
+def format_comparison(compared):
+    """Format the output of ``compare`` as a table, regressions first"""
+    def seconds(value, spread):
+        if value is None:
+            return u'-'
+        return u'{:.4f} +/-{:.4f}'.format(value, spread or 0.0)
+
+    order = [u'regressed', u'improved', u'ok', u'new', u'missing']
+    rows = sorted(compared, key=lambda r: order.index(r[u'status']))
+    lines = [u'{:<34} {:>6} {:>18} {:>18} {:>8}  {}'.format(
+        u'benchmark', u'size', u'baseline (s)', u'current (s)', u'change',
+        u'status')]
+    for row in rows:
+        change = u'-'
+        if row[u'change'] is not None:
+            change = u'{:+.1%}'.format(row[u'change'])
+        lines.append(u'{:<34} {:>6} {:>18} {:>18} {:>8}  {}'.format(
+            row[u'name'], row[u'size'],
+            seconds(row[u'baseline'], row[u'baseline_iqr']),
+            seconds(row[u'current'], row[u'current_iqr']), change,
+            row[u'status'].upper() if row[u'status'] == u'regressed' else
+            row[u'status']))
+    return u'\n'.join(lines)
+
+
+def main():
+    prog_desc = ('Time the qtools2 checks, XForm edits, and linking '
+                 'validation at several input sizes and save the results '
+                 'as JSON.')
+    parser = argparse.ArgumentParser(description=prog_desc)
+    output_help = 'Where to write the results. Default is "{}".'.format(
+        DEFAULT_OUTPUT)
+    parser.add_argument('-o', '--output', default=DEFAULT_OUTPUT,
+                        help=output_help)
+    sizes_help = ('Comma-separated numbers of questions to make up. '
+                  'Default is "{}".'.format(
+                      u','.join(str(s) for s in DEFAULT_SIZES)))
+    parser.add_argument('--sizes', help=sizes_help)
+    repeat_help = 'How many times to time each case. Default is {}.'.format(
+        DEFAULT_REPEAT)
+    parser.add_argument('--repeat', type=int, help=repeat_help)
+    only_help = ('Run only the benchmarks whose names start with this, '
+                 'e.g. "check." or "xform".')
+    parser.add_argument('--only', help=only_help)
+    compare_help = ('Compare the results to a baseline written earlier '
+                    'with -o, and exit with an error if any benchmark '
+                    'regressed. Sizes and repeats default to those of the '
+                    'baseline.')
+    parser.add_argument('--compare', metavar='BASELINE', help=compare_help)
+    threshold_help = ('With --compare, the allowed slowdown of a median, '
+                      'as a fraction. Default is {}.'.format(
+                          DEFAULT_THRESHOLD))
+    parser.add_argument('--threshold', type=float,
+                        default=DEFAULT_THRESHOLD, help=threshold_help)
+    min_delta_help = ('With --compare, ignore slowdowns of fewer seconds '
+                      'than this. Default is {}.'.format(DEFAULT_MIN_DELTA))
+    parser.add_argument('--min_delta', type=float,
+                        default=DEFAULT_MIN_DELTA, help=min_delta_help)
+    args = parser.parse_args()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    sizes = DEFAULT_SIZES
+    repeat = DEFAULT_REPEAT
+    if baseline is not None:
+        sizes = baseline.get(u'sizes', sizes)
+        repeat = baseline.get(u'repeat', repeat)
+    if args.sizes:
+        try:
+            sizes = [int(s) for s in args.sizes.split(',') if s.strip()]
+        except ValueError:
+            parser.error('--sizes must be comma-separated integers')
+    if args.repeat is not None:
+        repeat = args.repeat
+    report = run(sizes, max(1, repeat), args.only)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print u'Results written to "{}"'.format(args.output)
+    if baseline is not None:
+        compared = compare(baseline, report, args.threshold, args.min_delta)
+        print
+        print format_comparison(compared)
+        regressed = [r for r in compared if r[u'status'] == u'regressed']
+        if regressed:
+            print
+            print u'{} benchmark(s) regressed more than {:.0%} from "{}"'\
+                .format(len(regressed), args.threshold, args.compare)
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
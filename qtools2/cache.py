@@ -0,0 +1,254 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2016 PMA2020
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""A persistent on-disk cache shared by runs of qtools2
+
+Entries are stored one per file under a cache directory, serialized with
+``marshal`` and compressed with ``zlib``. Only plain Python values (dict,
+list, tuple, unicode, str, int, float, None) can be stored. The total size is
+capped; when it is exceeded, the least recently used entries are removed. An
+entry's last use is its file modification time, which is updated on every
+hit, so the cache survives across processes without an index file.
+
+Files are identified by a hash of their contents. To avoid reading a file
+whose path, size, and modification time have been seen before, a small alias
+entry maps those to the content hash.
+"""
+
+import os
+import os.path
+import collections
+import hashlib
+import marshal
+import tempfile
+import zlib
+
+from utils import replace_file
+
+
+# Bump when the layout of cached values changes to invalidate old entries
+CACHE_VERSION = 1
+DEFAULT_DIR = os.path.join(os.path.expanduser(u'~'), u'.qtools2', u'cache')
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+ENTRY_EXT = u'.bin'
+HASH_CHUNK = 1024 * 1024
+
+
+class DiskCache:
+    """A size-capped key-value store on disk with LRU eviction
+
+    Args:
+        directory (str): Where to keep the entries. Created if missing.
+        max_bytes (int): The cap on the total size of all entries
+
+    Attributes:
+        hits (int): The number of successful lookups by this instance
+        misses (int): The number of failed lookups by this instance
+    """
+
+    def __init__(self, directory=DEFAULT_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    def entry_path(self, key):
+        name = hashlib.sha1(u'{}:{}'.format(CACHE_VERSION, key).encode(
+            'utf-8')).hexdigest()
+        return os.path.join(self.directory, name + ENTRY_EXT)
+
+    def get(self, key):
+        """Look up a key
+
+        A corrupt or unreadable entry counts as a miss and is removed.
+
+        Args:
+            key (str): The key
+
+        Returns:
+            The stored value, or None if there is no entry for the key
+        """
+        path = self.entry_path(key)
+        try:
+            with open(path, 'rb') as f:
+                value = marshal.loads(zlib.decompress(f.read()))
+        except (IOError, OSError):
+            self.misses += 1
+            return None
+        except (ValueError, EOFError, TypeError, zlib.error):
+            self.misses += 1
+            self.discard(path)
+            return None
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        """Store a value under a key, then enforce the size cap
+
+        The entry is written to a temporary file that then replaces any old
+        entry (see ``utils.replace_file``), so that other processes never
+        see a partial entry. Failures to write are
+        ignored: the cache is only an optimization.
+
+        Args:
+            key (str): The key
+            value: A value that ``marshal`` can serialize
+        """
+        data = zlib.compress(marshal.dumps(value), 1)
+        if len(data) > self.max_bytes:
+            return
+        path = self.entry_path(key)
+        try:
+            if not os.path.isdir(self.directory):
+                os.makedirs(self.directory)
+            fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=u'.tmp')
+        except (IOError, OSError):
+            return
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            replace_file(tmp, path)
+        except (IOError, OSError):
+            self.discard(tmp)
+            return
+        self.evict()
+
+    def evict(self):
+        """Remove least recently used entries until under the size cap"""
+        entries = []
+        total = 0
+        for path in self.entries():
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            self.discard(path)
+            total -= size
+
+    def clear(self):
+        """Remove every entry"""
+        for path in self.entries():
+            self.discard(path)
+
+    def entries(self):
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return []
+        return [os.path.join(self.directory, name) for name in names if
+                name.endswith(ENTRY_EXT)]
+
+    @staticmethod
+    def discard(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def file_key(self, path):
+        """Get the content hash of a file, reading it only when needed
+
+        The path, size, and modification time of the file are looked up
+        first. If they have been seen before, the content hash stored with
+        them is used. Otherwise the file is hashed and the result remembered.
+
+        Args:
+            path (str): The path to the file
+
+        Returns:
+            str: The hex SHA-1 digest of the file contents
+
+        Raises:
+            IOError, OSError: If the file cannot be read
+        """
+        stat = os.stat(path)
+        alias = u'stat:{}:{}:{!r}'.format(os.path.abspath(path), stat.st_size,
+                                          stat.st_mtime)
+        digest = self.get(alias)
+        if digest is None:
+            digest = hash_file(path)
+            self.put(alias, digest)
+        return digest
+
+
+class MemoryCache(DiskCache):
+    """A DiskCache that also keeps recently used values in memory
+
+    Meant for long-running sessions, such as watch mode, where the same
+    entries are read again and again. Values from memory are the very objects
+    that were stored, not copies.
+
+    Args:
+        directory (str): Where to keep the entries on disk
+        max_bytes (int): The cap on the total size of entries on disk
+        max_items (int): The number of values to keep in memory
+    """
+
+    def __init__(self, directory=DEFAULT_DIR, max_bytes=DEFAULT_MAX_BYTES,
+                 max_items=64):
+        DiskCache.__init__(self, directory, max_bytes)
+        self.max_items = max_items
+        self.memory = collections.OrderedDict()
+
+    def get(self, key):
+        try:
+            value = self.memory.pop(key)
+        except KeyError:
+            value = DiskCache.get(self, key)
+            if value is None:
+                return None
+        else:
+            self.hits += 1
+        self.remember(key, value)
+        return value
+
+    def put(self, key, value):
+        DiskCache.put(self, key, value)
+        self.remember(key, value)
+
+    def remember(self, key, value):
+        self.memory.pop(key, None)
+        self.memory[key] = value
+        while len(self.memory) > self.max_items:
+            self.memory.popitem(last=False)
+
+    def clear(self):
+        DiskCache.clear(self)
+        self.memory.clear()
+
+
+def hash_file(path):
+    sha1 = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b''):
+            sha1.update(chunk)
+    return sha1.hexdigest()
@@ -33,6 +33,8 @@ Last-modified: 3 Nov 2017
 import argparse
 
 import constants
+from tokenrules import OPTIONAL_RULES
+from tokenrules import get_rules
 
 
 def command_line_interface():
@@ -46,7 +48,8 @@ def command_line_interface():
                  'XLSForm to XForm for use in ODK.')
     parser = argparse.ArgumentParser(description=prog_desc)
 
-    file_help = 'One or more paths to files destined for conversion.'
+    file_help = ('One or more paths to files destined for conversion. With '
+                 '--watch, directories are also accepted.')
     parser.add_argument('xlsxfile', nargs='+', help=file_help)
 
     reg_help = ('This flag indicates the program should convert to XForm and '
@@ -87,6 +90,82 @@ def command_line_interface():
     debug_help = ('Show debug information. Helpful for squashing bugs.')
     parser.add_argument('-d', '--debug', action='store_true', help=debug_help)
 
+    no_cache_help = ('Do not use the cache of parsed workbooks in '
+                     '~/.qtools2/cache. Every file is read from scratch.')
+    parser.add_argument('--no_cache', action='store_true',
+                        help=no_cache_help)
+
+    clear_cache_help = ('Empty the cache of parsed workbooks and ODK Validate '
+                        'results before converting.')
+    parser.add_argument('--clear_cache', action='store_true',
+                        help=clear_cache_help)
+
+    jobs_help = ('The number of XLSForms to work on at once. Reading and '
+                 'checking run in separate processes, converting and '
+                 'validating in separate threads. Default is 1.')
+    parser.add_argument('-j', '--jobs', type=int, default=1, help=jobs_help)
+
+    service_help = ('Run ODK Validate in one long-lived Java process for all '
+                    'forms instead of one process per form.')
+    parser.add_argument('--validate_service', action='store_true',
+                        help=service_help)
+
+    no_validate_cache_help = ('Always run ODK Validate, even for XForms '
+                              'identical to ones already validated.')
+    parser.add_argument('--no_validate_cache', action='store_true',
+                        help=no_validate_cache_help)
+
+    incremental_help = ('Skip forms that are unchanged since the last '
+                        'conversion with the same options, according to the '
+                        'manifest kept next to the outputs. Linking checks '
+                        'still run on all forms.')
+    parser.add_argument('--incremental', action='store_true',
+                        help=incremental_help)
+
+    watch_help = ('Keep running and convert again whenever a file is saved. '
+                  'Directories may be given to watch the XLSForms in them. '
+                  'Implies --incremental and --validate_service.')
+    parser.add_argument('-w', '--watch', action='store_true',
+                        help=watch_help)
+
+    rules_help = ('Also check that translations keep these tokens of the '
+                  'default language, as a comma-separated list. Choose from: '
+                  '{}. Variables and numbers are always checked.')
+    rules_help = rules_help.format(', '.join(OPTIONAL_RULES))
+    parser.add_argument('--translation_rules', help=rules_help)
+
+    profile_help = ('Time each phase of the conversion for each file and '
+                    'print a summary, slowest first.')
+    parser.add_argument('--profile', action='store_true', help=profile_help)
+
+    profile_json_help = ('Also write every timing to this JSON file. '
+                         'Implies --profile.')
+    parser.add_argument('--profile_json', metavar='FILE',
+                        help=profile_json_help)
+
+    profile_phase_help = ('Run cProfile on this phase: read_workbook, '
+                          'check (or one check, e.g. check.nonascii), '
+                          'pyxform, validate, edit_xform, or linking. '
+                          'Implies --profile.')
+    parser.add_argument('--profile_phase', metavar='PHASE',
+                        help=profile_phase_help)
+
+    profile_stats_help = ('Where to dump the cProfile stats for '
+                          '--profile_phase. Default is "qtools2.pstats".')
+    parser.add_argument('--profile_stats', metavar='FILE',
+                        default='qtools2.pstats', help=profile_stats_help)
+
+    profile_memory_help = ('Also report the peak memory (RSS) of each file '
+                           'and phase, and the top allocation sites if '
+                           'tracemalloc is installed. Implies --profile.')
+    parser.add_argument('--profile_memory', action='store_true',
+                        help=profile_memory_help)
+
+    trace_help = ('Write a Chrome trace-event JSON file with a span for '
+                  'each file and phase, to view as a timeline in Perfetto '
+                  'or chrome://tracing.')
+    parser.add_argument('--trace', metavar='FILE', help=trace_help)
+
     args = parser.parse_args()
 
     xlsxfiles = [unicode(filename) for filename in args.xlsxfile]
@@ -99,6 +178,14 @@ def command_line_interface():
     strict_linking = not args.linking_warn
     validate = not args.no_validate
     extras = not args.no_extras
+    rule_names = []
+    if args.translation_rules:
+        rule_names = [name.strip() for name in
+                      args.translation_rules.split(',') if name.strip()]
+        unknown = [name for name in rule_names if name not in OPTIONAL_RULES]
+        if unknown:
+            parser.error('unknown translation rule(s): {}'.format(
+                ', '.join(unknown)))
 
     kwargs = {
         constants.SUFFIX: suffix,
@@ -108,7 +195,22 @@ def command_line_interface():
         constants.STRICT_LINKING: strict_linking,
         constants.VALIDATE: validate,
         constants.EXTRAS: extras,
-        constants.DEBUG: args.debug
+        constants.DEBUG: args.debug,
+        constants.CACHE: not args.no_cache,
+        constants.CLEAR_CACHE: args.clear_cache,
+        constants.JOBS: max(1, args.jobs),
+        constants.VALIDATE_SERVICE: args.validate_service,
+        constants.VALIDATE_CACHE: not args.no_validate_cache,
+        constants.INCREMENTAL: args.incremental,
+        constants.WATCH: args.watch,
+        constants.TRANSLATION_RULES: get_rules(rule_names),
+        constants.PROFILE: bool(args.profile or args.profile_json or
+                                args.profile_phase),
+        constants.PROFILE_JSON: args.profile_json,
+        constants.PROFILE_PHASE: args.profile_phase,
+        constants.PROFILE_STATS: args.profile_stats,
+        constants.TRACE: args.trace,
+        constants.PROFILE_MEMORY: args.profile_memory
     }
 
     return xlsxfiles, kwargs
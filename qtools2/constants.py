@@ -82,12 +82,17 @@ placeholders = ("#####",)
 Constants used throughout the package
 """
 XML_EXT = u'.xml'
+XLSX_EXT = u'.xlsx'
 
 SURVEY = u'survey'
 CHOICES = u'choices'
 SETTINGS = u'settings'
 EXTERNAL_CHOICES = u'external_choices'
 EXTERNAL_TYPES = [u'select_one_external', u'select_multiple_external']
+XLSFORM_SHEETS = (SURVEY, CHOICES, EXTERNAL_CHOICES, SETTINGS)
+# Every sheet that pmaxform reads when converting to XML
+PYXFORM_SHEETS = XLSFORM_SHEETS + (u'cascading_choices', u'columns',
+                                   u'choices_and_columns', u'osm')
 
 SAVE_INSTANCE = u'save_instance'
 SAVE_FORM = u'save_form'
@@ -113,6 +118,20 @@ STRICT_LINKING = u'strict_linking'
 VALIDATE = u'validate'
 EXTRAS = u'extras'
 DEBUG = u'debug'
+CACHE = u'cache'
+CLEAR_CACHE = u'clear_cache'
+JOBS = u'jobs'
+VALIDATE_SERVICE = u'validate_service'
+VALIDATE_CACHE = u'validate_cache'
+INCREMENTAL = u'incremental'
+WATCH = u'watch'
+TRANSLATION_RULES = u'translation_rules'
+PROFILE = u'profile'
+PROFILE_JSON = u'profile_json'
+PROFILE_PHASE = u'profile_phase'
+PROFILE_STATS = u'profile_stats'
+TRACE = u'trace'
+PROFILE_MEMORY = u'profile_memory'
 
 """
 Must be a dictionary with exactly one key-value pair. Used in searching within
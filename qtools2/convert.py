@@ -49,8 +49,12 @@ Last modified: 9 March 2017
 """
 
 import os
+import sys
 import itertools
 import traceback
+import multiprocessing
+from multiprocessing.pool import ThreadPool
+import StringIO
 
 from pmaxform.errors import PyXFormError
 from pmaxform.odk_validate import ODKValidateError
@@ -59,6 +63,11 @@ from xlrd import XLRDError
 from cli import command_line_interface
 from xlsform import Xlsform
 from xform import Xform
+from cache import DiskCache
+from validator import get_service
+from manifest import ManifestSet
+from profiling import Profiler
+import profiling
 import constants
 from errors import XlsformError
 from errors import XformError
@@ -66,6 +75,12 @@ from errors import ConvertError
 
 
 def xlsform_convert(xlsxfiles, **kwargs):
+    wants_profile = (kwargs.get(constants.PROFILE, False) or
+                     kwargs.get(constants.PROFILE_MEMORY, False) or
+                     kwargs.get(constants.TRACE, None))
+    if wants_profile and not profiling.is_active():
+        profile_convert(xlsxfiles, **kwargs)
+        return
     suffix = kwargs.get(constants.SUFFIX, u'')
     preexisting = kwargs.get(constants.PREEXISTING, False)
     pma = kwargs.get(constants.PMA, True)
@@ -74,32 +89,40 @@ def xlsform_convert(xlsxfiles, **kwargs):
     validate = kwargs.get(constants.VALIDATE, True)
     extras = kwargs.get(constants.EXTRAS, True)
     debug = kwargs.get(constants.DEBUG, False)
+    use_cache = kwargs.get(constants.CACHE, True)
+    clear_cache = kwargs.get(constants.CLEAR_CACHE, False)
+    jobs = kwargs.get(constants.JOBS, 1)
+    validate_service = kwargs.get(constants.VALIDATE_SERVICE, False)
+    use_validate_cache = kwargs.get(constants.VALIDATE_CACHE, True)
+    incremental = kwargs.get(constants.INCREMENTAL, False)
+    translation_rules = kwargs.get(constants.TRANSLATION_RULES, None)
+
+    # A cache object may be passed in to be shared among calls
+    if isinstance(use_cache, DiskCache):
+        workbook_cache = use_cache
+    else:
+        workbook_cache = DiskCache()
+    if clear_cache:
+        workbook_cache.clear()
+    validate_cache = workbook_cache if use_validate_cache else None
+    if not use_cache:
+        workbook_cache = None
 
     xlsforms = []
     error = []
-    all_files = set(xlsxfiles)
+    # Drop repeated files but keep the order given
+    all_files = sorted(set(xlsxfiles), key=xlsxfiles.index)
     if debug and len(all_files) < len(xlsxfiles):
         # Print msg
         pass
-    for f in all_files:
-        try:
-            xlsform = Xlsform(f, suffix=suffix, pma=pma)
+    args = [(f, suffix, pma, check_versioning, workbook_cache) for f in
+            all_files]
+    for xlsform, msg in precheck_all(args, jobs):
+        if xlsform is not None:
+            xlsform.translation_rules = translation_rules
             xlsforms.append(xlsform)
-            if check_versioning:
-                xlsform.version_consistency()
-        except XlsformError as e:
-            error.append(str(e))
-        except IOError:
-            msg = u'"%s" does not exist.'
-            msg %= f
-            error.append(msg)
-        except XLRDError:
-            msg = u'"%s" does not appear to be a well-formed MS-Excel file.'
-            msg %= f
+        if msg is not None:
             error.append(msg)
-        except Exception as e:
-            traceback.print_exc()
-            error.append(repr(e))
     if preexisting:
         overwrite_errors = get_overwrite_errors(xlsforms)
         error.extend(overwrite_errors)
@@ -113,88 +136,321 @@ def xlsform_convert(xlsxfiles, **kwargs):
         header = u'The following {} error(s) prevent qtools2 from converting'
         header = header.format(len(error))
         format_and_raise(header, error)
-    successes = [xlsform_offline(xlsform, validate) for xlsform in xlsforms]
+    options = {
+        constants.SUFFIX: suffix,
+        constants.PMA: pma,
+        constants.CHECK_VERSIONING: check_versioning,
+        constants.VALIDATE: validate
+    }
+    manifests = ManifestSet()
+    if incremental:
+        current = [manifests.is_current(x, options) for x in xlsforms]
+    else:
+        current = [False] * len(xlsforms)
+    report_unchanged(current, xlsforms)
+    stale = [x for x, is_current in zip(xlsforms, current) if not is_current]
+    service = None
+    if validate and validate_service and stale:
+        service = get_service()
+    stale_successes = iter(offline_all(stale, validate, extras, jobs, service,
+                                       validate_cache))
+    successes = [True if is_current else next(stale_successes) for
+                 is_current in current]
+    # Unchanged forms keep their outputs from an earlier run, so only what
+    # this run wrote is removed on failure
+    written = [success and not is_current for success, is_current in
+               zip(successes, current)]
     report_conversion_success(successes, xlsforms)
     all_wins = all(successes)
     if all_wins:
-        xform_edit_and_check(xlsforms, strict_linking)
+        try:
+            xform_edit_and_check(xlsforms, strict_linking, written)
+        except ConvertError:
+            for xlsform, was_written in zip(xlsforms, written):
+                if was_written:
+                    manifests.discard(xlsform)
+            manifests.save()
+            raise
+        for xlsform, is_current in zip(xlsforms, current):
+            if not is_current:
+                manifests.record(xlsform, options)
+        manifests.save()
     else:  # not all_wins:
         m = (u'*** Removing all generated files because not all conversions '
              u'were successful')
         print m
-        remove_all_successes(successes, xlsforms)
+        remove_all_successes(written, xlsforms)
 
 
-def xlsform_offline(xlsform, validate=True, extras=True):
+def profile_convert(xlsxfiles, **kwargs):
+    """Run ``xlsform_convert`` with a Profiler, then report the times
+
+    The report is printed even if conversion fails.
+    """
+    profiler = Profiler(kwargs.get(constants.PROFILE_PHASE, None),
+                        kwargs.get(constants.PROFILE_MEMORY, False))
     try:
-        warnings = xlsform.xlsform_convert(validate=validate)
-        if warnings:
-            m = u'### PyXForm warnings converting "%s" to XML! ###'
-            m %= xlsform.path
-            n = u'#' * len(m) + u'\n' + m + u'\n' + u'#' * len(m)
-            print n
-            for w in warnings:
-                o = u'\n'.join(filter(None, w.splitlines()))
-                print o
-            footer = u'  End PyXForm for "%s"  '
-            footer %= xlsform.path
-            print footer.center(len(m), u'#') + u'\n'
-        if extras:
-            msg = []
-            msg.extend(xlsform.extra_undefined_column())
-            msg.extend(xlsform.extra_undefined_ref())
-            msg.extend(xlsform.extra_multiple_choicelist())
-            msg.extend(xlsform.extra_unused_choicelist())
-            msg.extend(xlsform.extra_same_choices())
-            msg.extend(xlsform.extra_missing_translation())
-            msg.extend(xlsform.extra_regex_translation())
-            msg.extend(xlsform.extra_language_conflict())
-            msg.extend(xlsform.extra_nonascii())
-            if msg:
-                title = u'Qtools2 extra warnings for {}'
-                title = title.format(xlsform.path)
-                format_and_warn(title, msg)
-    except PyXFormError as e:
-        m = u'### PyXForm ERROR converting "%s" to XML! ###'
-        m %= xlsform.path
-        print m
-        print unicode(e)
-        xlsform.cleanup()
-        return False
-    except ODKValidateError as e:
-        m = u'### Invalid ODK Xform: "%s"! ###'
-        m %= xlsform.outpath
-        print m
-        # This error may contain unicode characters
-        print unicode(e)
-        # Remove output file if there is an error with ODKValidate
-        if os.path.exists(xlsform.outpath):
-            print u'### Deleting "%s"' % xlsform.outpath
-            xlsform.cleanup()
-        return False
+        with profiler.activated():
+            with profiling.span(profiling.TOTAL):
+                xlsform_convert(xlsxfiles, **kwargs)
+    finally:
+        profiler.report(kwargs.get(constants.PROFILE_JSON, None),
+                        kwargs.get(constants.PROFILE_STATS, None),
+                        kwargs.get(constants.TRACE, None),
+                        kwargs.get(constants.PROFILE, False) or
+                        kwargs.get(constants.PROFILE_MEMORY, False))
+
+
+def precheck(f, suffix, pma, check_versioning, workbook_cache):
+    """Read one XLSForm and run the checks that halt conversion
+
+    Defined at module level so it can run in a worker process.
+
+    Args:
+        f (str): The path to the XLSForm
+        suffix (str): The suffix to add to the output file name
+        pma (bool): Whether to enforce PMA2020 conventions
+        check_versioning (bool): Whether to check version consistency
+        workbook_cache (DiskCache): Where to look for parsed workbooks, or
+            None
+
+    Returns:
+        A tuple (xlsform, msg). xlsform is the Xlsform or None if it could
+        not be created. msg is the error message or None if all is well.
+    """
+    xlsform = None
+    try:
+        with profiling.span(profiling.XLSFORM, f):
+            xlsform = Xlsform(f, suffix=suffix, pma=pma,
+                              cache=workbook_cache)
+        if check_versioning:
+            with profiling.span(profiling.check_phase(u'version'), f):
+                xlsform.version_consistency()
+    except XlsformError as e:
+        return xlsform, str(e)
+    except IOError:
+        msg = u'"%s" does not exist.'
+        msg %= f
+        return xlsform, msg
+    except XLRDError:
+        msg = u'"%s" does not appear to be a well-formed MS-Excel file.'
+        msg %= f
+        return xlsform, msg
     except Exception as e:
-        print u'### Unexpected error: %s' % repr(e)
-        # Remove output file if there is an error with ODKValidate
         traceback.print_exc()
-        if os.path.exists(xlsform.outpath):
-            print u'### Deleting "%s"' % xlsform.outpath
-            xlsform.cleanup()
-        return False
-    else:
-        return True
+        return xlsform, repr(e)
+    return xlsform, None
 
 
-def xform_edit_and_check(xlsforms, strict_linking):
-    xforms = [Xform(xlsform) for xlsform in xlsforms]
-    for xform in xforms:
-        xform.make_edits()
-        xform.overwrite()
-    report_logging(xforms)
-    linking_report = validate_xpaths(xlsforms, xforms)
+def precheck_star(args):
+    return precheck(*args)
+
+
+def precheck_profiled(args, memory=False):
+    """Run ``precheck`` in a worker process with a Profiler of its own
+
+    Args:
+        args (tuple): The positional arguments of ``precheck``
+        memory (bool): Whether to record memory use
+
+    Returns:
+        A tuple (result, records) of the ``precheck`` result and the spans
+        recorded, to be merged into the Profiler of the main process
+    """
+    profiler = Profiler(memory=memory)
+    with profiler.activated():
+        result = precheck_star(args)
+    return result, profiler.records
+
+
+def precheck_profiled_star(args):
+    return precheck_profiled(*args)
+
+
+def precheck_all(args, jobs=1):
+    """Run ``precheck`` on several files, in a process pool if jobs > 1
+
+    Args:
+        args (list): Tuples of arguments for ``precheck``, one per file
+        jobs (int): The number of worker processes
+
+    Returns:
+        A list of the ``precheck`` results, in the same order as args
+    """
+    profiler = profiling.get_active()
+    # cProfile statistics from worker processes would be lost
+    in_workers = profiler is None or profiler.cprofile_phase is None
+    if jobs > 1 and len(args) > 1 and in_workers:
+        pool = multiprocessing.Pool(min(jobs, len(args)))
+        try:
+            if profiler is None:
+                return pool.map(precheck_star, args)
+            results = []
+            profiled_args = [(arg, profiler.memory) for arg in args]
+            for result, records in pool.map(precheck_profiled_star,
+                                            profiled_args):
+                profiler.merge(records)
+                results.append(result)
+            return results
+        finally:
+            pool.close()
+            pool.join()
+    return [precheck_star(arg) for arg in args]
+
+
+def xlsform_offline(xlsform, validate=True, extras=True, service=None,
+                    validate_cache=None, out=None):
+    """Convert one XLSForm to XML, validate it, and report any problems
+
+    Args:
+        xlsform (Xlsform): The XLSForm to convert
+        validate (bool): Whether to run ODK Validate
+        extras (bool): Whether to report the extra checks
+        service (ValidatorService): A long-lived ODK Validate process to use,
+            or None to start one process for this form
+        validate_cache (DiskCache): Where to look for ODK Validate results
+            before validating, or None
+        out: A file-like object for all messages. Default is sys.stdout.
+
+    Returns:
+        True if the XML file is created, otherwise False
+    """
+    if out is None:
+        out = sys.stdout
+    with profiling.span(profiling.OFFLINE, xlsform.path):
+        try:
+            warnings = xlsform.xlsform_convert(validate=validate,
+                                               service=service,
+                                               cache=validate_cache)
+            if warnings:
+                m = u'### PyXForm warnings converting "%s" to XML! ###'
+                m %= xlsform.path
+                n = u'#' * len(m) + u'\n' + m + u'\n' + u'#' * len(m)
+                print >> out, n
+                for w in warnings:
+                    o = u'\n'.join(filter(None, w.splitlines()))
+                    print >> out, o
+                footer = u'  End PyXForm for "%s"  '
+                footer %= xlsform.path
+                print >> out, footer.center(len(m), u'#') + u'\n'
+            if extras:
+                msg = [warning for _, warning in xlsform.extra_warnings()]
+                if msg:
+                    title = u'Qtools2 extra warnings for {}'
+                    title = title.format(xlsform.path)
+                    format_and_warn(title, msg, out)
+        except PyXFormError as e:
+            m = u'### PyXForm ERROR converting "%s" to XML! ###'
+            m %= xlsform.path
+            print >> out, m
+            print >> out, unicode(e)
+            xlsform.cleanup()
+            return False
+        except ODKValidateError as e:
+            m = u'### Invalid ODK Xform: "%s"! ###'
+            m %= xlsform.outpath
+            print >> out, m
+            # This error may contain unicode characters
+            print >> out, unicode(e)
+            # Remove output file if there is an error with ODKValidate
+            if os.path.exists(xlsform.outpath):
+                print >> out, u'### Deleting "%s"' % xlsform.outpath
+                xlsform.cleanup()
+            return False
+        except Exception as e:
+            print >> out, u'### Unexpected error: %s' % repr(e)
+            # Remove output file if there is an error with ODKValidate
+            traceback.print_exc(file=out)
+            if os.path.exists(xlsform.outpath):
+                print >> out, u'### Deleting "%s"' % xlsform.outpath
+                xlsform.cleanup()
+            return False
+        else:
+            return True
+
+
+def xlsform_offline_buffered(args):
+    """Run ``xlsform_offline`` with its messages kept in a buffer
+
+    Args:
+        args (tuple): The positional arguments of ``xlsform_offline``
+
+    Returns:
+        A tuple (success, output) with the result and the messages
+    """
+    out = StringIO.StringIO()
+    success = xlsform_offline(*args, out=out)
+    return success, out.getvalue()
+
+
+def offline_all(xlsforms, validate=True, extras=True, jobs=1, service=None,
+                validate_cache=None):
+    """Convert and validate several XLSForms, in threads if jobs > 1
+
+    Most of the time for each form is spent waiting on ODK Validate in a
+    separate Java process, so threads let several validations overlap.
+    Messages for each form are buffered and printed in the same order as
+    xlsforms, as soon as that form and all before it are done.
+
+    Args:
+        xlsforms (list): The Xlsform objects to convert
+        validate (bool): Whether to run ODK Validate
+        extras (bool): Whether to report the extra checks
+        jobs (int): The greatest number of forms to convert at once
+        service (ValidatorService): A long-lived ODK Validate process to
+            share among the forms, or None
+        validate_cache (DiskCache): Where to look for ODK Validate results
+            before validating, or None
+
+    Returns:
+        A list of bool, the ``xlsform_offline`` result for each form
+    """
+    if jobs <= 1 or len(xlsforms) < 2:
+        return [xlsform_offline(xlsform, validate, extras, service,
+                                validate_cache) for xlsform in xlsforms]
+    successes = []
+    args = [(xlsform, validate, extras, service, validate_cache) for xlsform
+            in xlsforms]
+    pool = ThreadPool(min(jobs, len(xlsforms)))
+    try:
+        for success, output in pool.imap(xlsform_offline_buffered, args):
+            if output:
+                print output,
+            successes.append(success)
+    finally:
+        pool.close()
+        pool.join()
+    return successes
+
+
+def xform_edit_and_check(xlsforms, strict_linking, written=None):
+    """Check linking among all of the XForms
+
+    The XForms are edited as they are written by ``Xlsform.xlsform_convert``.
+    Those left from a previous run (see --incremental) were edited then and
+    are read from file.
+
+    Args:
+        xlsforms (list): The converted Xlsform objects
+        strict_linking (bool): Whether linking problems are errors
+        written (list): Whether this run wrote each form's outputs, which
+            are removed if strict linking fails. Default is all of them.
+
+    Raises:
+        ConvertError: If strict_linking and there are linking problems
+    """
+    xforms = [Xform(xlsform) if xlsform.xform is None else xlsform.xform for
+              xlsform in xlsforms]
+    with profiling.span(profiling.LINKING):
+        report_logging(xforms)
+        linking_report = validate_xpaths(xlsforms, xforms)
     if linking_report:
         if strict_linking:
-            for xlsform in xlsforms:
-                xlsform.cleanup()
+            if written is None:
+                written = [True] * len(xlsforms)
+            for xlsform, was_written in zip(xlsforms, written):
+                if was_written:
+                    xlsform.cleanup()
             header = (u'Generated files deleted! Please address {} error(s) '
                       u'from qtools2 xform editing')
             header = header.format(len(linking_report))
@@ -207,7 +463,9 @@ def xform_edit_and_check(xlsforms, strict_linking):
 
 def validate_xpaths(xlsforms, xforms):
     findings = []
-    form_ids = [xform.form_id for xform in xforms]
+    xforms_by_id = {}
+    for xform in xforms:
+        xforms_by_id.setdefault(xform.form_id, xform)
 
     slash_flag = False
     for xlsform in xlsforms:
@@ -215,14 +473,19 @@ def validate_xpaths(xlsforms, xforms):
             this_save_instance = xlsform.save_instance[1:]
             this_save_form = xlsform.save_form[1:]
             not_found = [True] * len(this_save_instance)
+            # save_form is usually the same on every row, so each distinct
+            # child is searched once rather than once per row
+            targets = []
             for save_form in this_save_form:
-                if save_form not in form_ids:
+                if save_form not in targets:
+                    targets.append(save_form)
+            for save_form in targets:
+                match = xforms_by_id.get(save_form)
+                if match is None:
                     m = u'"{}" defines save_form with non-existent form_id "{}"'
                     m = m.format(xlsform.path, save_form)
                     raise XformError(m)
                 else:
-                    ind = form_ids.index(save_form)
-                    match = xforms[ind]
                     found, msg = match.discover_all(this_save_instance)
                     not_found = [a and not b for a, b in zip(not_found, found)]
                     if msg:
@@ -249,6 +512,18 @@ def remove_all_successes(successes, xlsforms):
             xlsform.cleanup()
 
 
+def report_unchanged(current, xlsforms):
+    n_current = current.count(True)
+    if n_current > 0:
+        record = u'/'.join([str(n_current), str(len(current))])
+        statement = u' Unchanged, not converted (' + record + u') '
+        print statement.center(50, u'=')
+        for is_current, xlsform in zip(current, xlsforms):
+            if is_current:
+                print u' -- ' + xlsform.outpath
+        print
+
+
 def report_conversion_success(successes, xlsforms):
     n_attempts = len(successes)
     n_successes = successes.count(True)
@@ -371,12 +646,14 @@ def get_overwrite_errors(xlsforms):
     return [template.format(f) for f in conflicts]
 
 
-def format_and_warn(headline, messages):
+def format_and_warn(headline, messages, out=None):
+    if out is None:
+        out = sys.stdout
     header = u'*** {}'.format(headline)
     body = format_lines(messages)
-    print header
-    print body
-    print
+    print >> out, header
+    print >> out, body
+    print >> out
 
 
 def format_and_raise(headline, messages):
@@ -401,6 +678,10 @@ def format_lines(lines):
 
 if __name__ == '__main__':
     xlsxfiles, kwargs = command_line_interface()
+    if kwargs.pop(constants.WATCH, False):
+        from watch import watch
+        watch(xlsxfiles, **kwargs)
+        sys.exit()
     try:
         xlsform_convert(xlsxfiles, **kwargs)
     except ConvertError as e:
@@ -0,0 +1,564 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2016 PMA2020
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Write made-up XLSForms of any size for scale testing
+
+A ``FormGenerator`` builds the rows of a PMA-named XLSForm: questions in
+nested groups and repeats, choice lists, external choices, labels in several
+languages with gaps and ``${...}`` references, and settings that pass the
+PMA naming checks. ``write_pair`` writes a linked household and female
+questionnaire, where the household form sends values to the female form
+with ``save_instance`` and ``save_form``, and the female form has a
+``delete_form`` question.
+
+The same seed and options always give the same files. The .xlsx files are
+written with ``zipfile`` alone, so no spreadsheet library is needed.
+
+From the command line::
+
+    python -m qtools2.formgen OUTDIR --questions 10000 \
+        --external_choices 100000
+"""
+
+import os
+import os.path
+import random
+import zipfile
+import argparse
+from xml.sax.saxutils import escape
+from xml.sax.saxutils import quoteattr
+
+import constants
+
+
+HOUSEHOLD = u'Household-Questionnaire'
+FEMALE = u'Female-Questionnaire'
+DEFAULT_LANGUAGES = (u'English', u'Francais')
+# Types of questions that are not selects, by relative weight
+PLAIN_TYPES = ((u'text', 4), (u'integer', 3), (u'decimal', 1),
+               (u'date', 1), (u'calculate', 1), (u'note', 1))
+# Types of questions that another form may fill with save_instance
+LINKABLE_TYPES = (u'text', u'integer', u'decimal', u'date')
+
+CONTENT_TYPES = u"""<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">
+<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>
+<Default Extension="xml" ContentType="application/xml"/>
+<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>
+<Override PartName="/xl/styles.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>
+<Override PartName="/xl/sharedStrings.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sharedStrings+xml"/>
+{}</Types>"""
+SHEET_CONTENT_TYPE = (u'<Override PartName="/xl/worksheets/sheet{}.xml" '
+                      u'ContentType="application/vnd.openxmlformats-'
+                      u'officedocument.spreadsheetml.worksheet+xml"/>\n')
+ROOT_RELS = u"""<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>
+</Relationships>"""
+WORKBOOK = u"""<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">
+<sheets>
+{}</sheets>
+</workbook>"""
+WORKBOOK_SHEET = u'<sheet name={} sheetId="{}" r:id="rId{}"/>\n'
+WORKBOOK_RELS = u"""<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+{}<Relationship Id="rId{}" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" Target="styles.xml"/>
+<Relationship Id="rId{}" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/sharedStrings" Target="sharedStrings.xml"/>
+</Relationships>"""
+WORKBOOK_REL = (u'<Relationship Id="rId{0}" Type="http://schemas.'
+                u'openxmlformats.org/officeDocument/2006/relationships/'
+                u'worksheet" Target="worksheets/sheet{0}.xml"/>\n')
+STYLES = u"""<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">
+<fonts count="1"><font><sz val="11"/><name val="Calibri"/></font></fonts>
+<fills count="1"><fill><patternFill patternType="none"/></fill></fills>
+<borders count="1"><border/></borders>
+<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>
+<cellXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/></cellXfs>
+</styleSheet>"""
+SHEET_START = (u'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+               u'<worksheet xmlns="http://schemas.openxmlformats.org/'
+               u'spreadsheetml/2006/main"><sheetData>')
+SHEET_END = u'</sheetData></worksheet>'
+SST_START = (u'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+             u'<sst xmlns="http://schemas.openxmlformats.org/spreadsheetml/'
+             u'2006/main" count="{0}" uniqueCount="{0}">')
+SST_END = u'</sst>'
+
+
+def column_name(colx):
+    """Get the spreadsheet letters for a 0-based column index, e.g. 27: AB"""
+    name = u''
+    colx += 1
+    while colx:
+        colx, rem = divmod(colx - 1, 26)
+        name = unichr(ord(u'A') + rem) + name
+    return name
+
+
+def write_xlsx(path, sheets):
+    """Write rows of text to an .xlsx file
+
+    Every non-blank cell is written as a shared string.
+
+    Args:
+        path (str): Where to write the file
+        sheets (list): A list of tuples (sheet name, rows), where rows is a
+            list of lists of unicode
+    """
+    sst = {}
+    sst_list = []
+    sheet_parts = []
+    for _, rows in sheets:
+        widest = max(len(row) for row in rows) if rows else 0
+        letters = [column_name(i) for i in xrange(widest)]
+        parts = [SHEET_START]
+        for rowx, row in enumerate(rows, start=1):
+            parts.append(u'<row r="{}">'.format(rowx))
+            for colx, value in enumerate(row):
+                if not value:
+                    continue
+                index = sst.get(value)
+                if index is None:
+                    index = len(sst_list)
+                    sst[value] = index
+                    sst_list.append(value)
+                parts.append(u'<c r="{}{}" t="s"><v>{}</v></c>'.format(
+                    letters[colx], rowx, index))
+            parts.append(u'</row>')
+        parts.append(SHEET_END)
+        sheet_parts.append(u''.join(parts).encode('utf-8'))
+    n = len(sheets)
+    shared = [SST_START.format(len(sst_list))]
+    shared.extend(u'<si><t xml:space="preserve">{}</t></si>'.format(
+        escape(value)) for value in sst_list)
+    shared.append(SST_END)
+    content_types = CONTENT_TYPES.format(u''.join(
+        SHEET_CONTENT_TYPE.format(i) for i in xrange(1, n + 1)))
+    workbook = WORKBOOK.format(u''.join(
+        WORKBOOK_SHEET.format(quoteattr(name), i, i) for i, (name, _) in
+        enumerate(sheets, start=1)))
+    workbook_rels = WORKBOOK_RELS.format(u''.join(
+        WORKBOOK_REL.format(i) for i in xrange(1, n + 1)), n + 1, n + 2)
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr('[Content_Types].xml', content_types.encode('utf-8'))
+        archive.writestr('_rels/.rels', ROOT_RELS.encode('utf-8'))
+        archive.writestr('xl/workbook.xml', workbook.encode('utf-8'))
+        archive.writestr('xl/_rels/workbook.xml.rels',
+                         workbook_rels.encode('utf-8'))
+        archive.writestr('xl/styles.xml', STYLES.encode('utf-8'))
+        archive.writestr('xl/sharedStrings.xml',
+                         u''.join(shared).encode('utf-8'))
+        for i, part in enumerate(sheet_parts, start=1):
+            archive.writestr('xl/worksheets/sheet{}.xml'.format(i), part)
+
+
+class FormGenerator:
+    """Make up the contents of one PMA-named XLSForm
+
+    Args:
+        qtype (str): The questionnaire type in the file name, one of the
+            keys of ``constants.q_codes``
+        seed: The seed for the random choices. The same seed and options
+            give the same form.
+        questions (int): The number of questions, not counting the begin
+            and end rows of groups and repeats
+        depth (int): How deeply groups and repeats nest
+        block_size (int): The number of questions in the innermost group
+        repeat_rate (float): The chance that a group is a repeat instead
+        lists (int): The number of choice lists in the choices tab
+        choices_per_list (int): The number of choices in each of those lists
+        external_lists (int): The number of lists in the external_choices
+            tab. With 0 there is no external_choices tab.
+        external_choices (int): The total number of rows in the
+            external_choices tab, shared among the external lists
+        select_rate (float): The chance that a question is a select
+        languages (seq): The languages of labels and hints
+        gap_rate (float): The chance that a translation of a label is blank
+        ref_rate (float): The chance that a label has a ``${...}``
+            reference to an earlier question in its group
+        country (str): The two-letter country code in the file name
+        round (int): The survey round in the file name
+        version (int): The form version in the file name
+        initials (str): The initials that end the file name
+    """
+
+    def __init__(self, qtype=FEMALE, seed=0, questions=100, depth=2,
+                 block_size=10, repeat_rate=0.1, lists=10,
+                 choices_per_list=5, external_lists=0, external_choices=0,
+                 select_rate=0.2, languages=DEFAULT_LANGUAGES, gap_rate=0.05,
+                 ref_rate=0.1, country=u'CD', round=1, version=1,
+                 initials=u'qt'):
+        self.qtype = qtype
+        self.random = random.Random(seed)
+        self.questions = questions
+        self.depth = depth
+        self.block_size = max(1, block_size)
+        self.repeat_rate = repeat_rate
+        self.lists = lists
+        self.choices_per_list = choices_per_list
+        self.external_lists = external_lists if external_choices else 0
+        self.external_choices = external_choices
+        self.select_rate = select_rate
+        self.languages = list(languages)
+        self.gap_rate = gap_rate
+        self.ref_rate = ref_rate
+        self.country = country
+        self.round = round
+        self.version = version
+        self.initials = initials
+        self.links = []
+        self.save_form = u''
+        self.survey_columns = {}
+        # The xpath of every question, in order, filled by survey_rows
+        self.xpaths = []
+        # The xpaths that pass the linking checks: plain questions outside
+        # of repeats, without a relevant
+        self.linkable = []
+        # The names of integer questions outside of repeats, which can
+        # decide whether to delete this form
+        self.integers = []
+
+    @property
+    def short_name(self):
+        return u'{}R{}-{}-v{}-{}'.format(self.country, self.round,
+                                         self.qtype, self.version,
+                                         self.initials)
+
+    @property
+    def form_id(self):
+        return u'{}-{}r{}-v{}'.format(constants.q_codes[self.qtype],
+                                      self.country.lower(), self.round,
+                                      self.version)
+
+    @property
+    def form_title(self):
+        return u'{}R{}-{}-v{}'.format(self.country, self.round, self.qtype,
+                                      self.version)
+
+    @property
+    def xml_root(self):
+        return unicode(constants.xml_codes[constants.q_codes[self.qtype]])
+
+    def add_links(self, xpaths, form_id):
+        """Send values to another form with save_instance and save_form
+
+        Args:
+            xpaths (seq): The xpaths in the other form's instance
+            form_id (str): The form_id of the other form
+        """
+        self.links = list(xpaths)
+        self.save_form = form_id
+
+    def survey_rows(self):
+        """Make up the survey tab, header first"""
+        labels = [u'label::{}'.format(lang) for lang in self.languages]
+        hints = [u'hint::{}'.format(lang) for lang in self.languages]
+        header = [constants.TYPE, constants.NAME] + labels + hints + [
+            u'relevant', u'calculation', u'choice_filter',
+            constants.SAVE_INSTANCE, constants.SAVE_FORM,
+            constants.DELETE_FORM]
+        self.survey_columns = {name: i for i, name in enumerate(header)}
+        rows = [header]
+        width = len(header)
+        self.xpaths = []
+        self.linkable = []
+        self.integers = []
+        path = [self.xml_root]
+        n_blocks = (self.questions + self.block_size - 1) // self.block_size
+        count = 0
+        for b in xrange(n_blocks):
+            opened = []
+            for level in xrange(self.depth):
+                name = u'g{}_{}'.format(b, level)
+                kind = u'group'
+                if self.random.random() < self.repeat_rate:
+                    kind = u'repeat'
+                opened.append(kind)
+                path.append(name)
+                rows.append(self.row(width, u'begin ' + kind, name,
+                                     self.texts(u'Section {}'.format(name))))
+            earlier = []
+            for _ in xrange(min(self.block_size, self.questions - count)):
+                name = u'q{}'.format(count)
+                row = self.question_row(width, name, earlier)
+                rows.append(row)
+                xpath = u'/'.join([u''] + path + [name])
+                self.xpaths.append(xpath)
+                if (u'repeat' not in opened and row[0] in LINKABLE_TYPES and
+                        not row[self.survey_columns[u'relevant']]):
+                    self.linkable.append(xpath)
+                if u'repeat' not in opened and row[0] == u'integer':
+                    self.integers.append(name)
+                earlier.append(name)
+                count += 1
+            for kind in reversed(opened):
+                path.pop()
+                rows.append(self.row(width, u'end ' + kind))
+        rows.extend(self.link_rows(width))
+        return rows
+
+    def row(self, width, qtype, name=u'', labels=None, hints=None):
+        row = [u''] * width
+        row[0] = qtype
+        row[1] = name
+        n = len(self.languages)
+        for i, text in enumerate(labels or []):
+            row[2 + i] = text
+        for i, text in enumerate(hints or []):
+            row[2 + n + i] = text
+        return row
+
+    def texts(self, english, ref=None):
+        """Make a label in each language, some left blank"""
+        texts = []
+        for i, lang in enumerate(self.languages):
+            if i and self.random.random() < self.gap_rate:
+                texts.append(u'')
+                continue
+            text = english if i == 0 else u'[{}] {}'.format(lang, english)
+            if ref:
+                text = u'{} (${{{}}})'.format(text, ref)
+            texts.append(text)
+        return texts
+
+    def set(self, row, column, value):
+        row[self.survey_columns[column]] = value
+
+    def question_row(self, width, name, earlier):
+        use_external = False
+        if self.random.random() < self.select_rate and (self.lists or
+                                                         self.external_lists):
+            use_external = self.external_lists and (
+                not self.lists or self.random.random() < 0.5)
+            if use_external:
+                list_name = u'ext{}'.format(
+                    self.random.randrange(self.external_lists))
+                qtype = u'select_one_external ' + list_name
+            else:
+                list_name = u'list{}'.format(self.random.randrange(self.lists))
+                qtype = self.random.choice([u'select_one', u'select_multiple'])
+                qtype = u'{} {}'.format(qtype, list_name)
+        else:
+            qtype = self.weighted(PLAIN_TYPES)
+        ref = None
+        if earlier and self.random.random() < self.ref_rate:
+            ref = self.random.choice(earlier)
+        labels = self.texts(u'Question {}'.format(name), ref)
+        hints = []
+        if self.random.random() < 0.2:
+            hints = self.texts(u'Hint for {}'.format(name))
+        row = self.row(width, qtype, name, labels, hints)
+        if qtype == u'calculate':
+            row[2:2 + 2 * len(self.languages)] = [u''] * (
+                2 * len(self.languages))
+            self.set(row, u'calculation', u'once(int(random()*3))')
+        if use_external:
+            # pmaxform only reads select_one_external with a choice_filter
+            self.set(row, u'choice_filter', u"filter='1'")
+        if ref and self.random.random() < 0.5:
+            self.set(row, u'relevant', u"${{{}}} != ''".format(ref))
+        return row
+
+    def weighted(self, choices):
+        total = sum(weight for _, weight in choices)
+        pick = self.random.uniform(0, total)
+        for value, weight in choices:
+            pick -= weight
+            if pick <= 0:
+                return value
+        return choices[-1][0]
+
+    def link_rows(self, width):
+        """The rows that link to another form, or delete this one"""
+        rows = []
+        if self.links:
+            rows.append(self.row(width, u'begin repeat', u'link',
+                                 self.texts(u'Linked form')))
+            for i, xpath in enumerate(self.links):
+                row = self.row(width, u'calculate', u'link{}'.format(i))
+                self.set(row, u'calculation', u'once(int(random()*3))')
+                self.set(row, constants.SAVE_INSTANCE, xpath)
+                rows.append(row)
+            row = self.row(width, u'calculate', u'link_form')
+            self.set(row, u'calculation', u"'{}'".format(self.save_form))
+            self.set(row, constants.SAVE_FORM, self.save_form)
+            rows.append(row)
+            rows.append(self.row(width, u'end repeat'))
+        else:
+            # As in the CDR1 forms, delete when an earlier answer is small
+            if self.integers:
+                name = self.random.choice(self.integers)
+            else:
+                name = u'age'
+                rows.append(self.row(width, u'integer', name,
+                                     self.texts(u'Age')))
+            row = self.row(width, u'hidden', u'delete_this')
+            self.set(row, u'relevant', u'${{{}}} <= 10'.format(name))
+            self.set(row, constants.DELETE_FORM, u'yes')
+            rows.append(row)
+        return rows
+
+    def choices_rows(self):
+        """Make up the choices tab, header first"""
+        header = [constants.LIST_NAME, constants.NAME] + [
+            u'label::{}'.format(lang) for lang in self.languages]
+        rows = [header]
+        for k in xrange(self.lists):
+            for j in xrange(self.choices_per_list):
+                rows.append([u'list{}'.format(k), unicode(j)] +
+                            self.texts(u'Choice {}'.format(j)))
+        return rows
+
+    def external_choices_rows(self):
+        """Make up the external_choices tab, header first"""
+        header = [constants.LIST_NAME, constants.NAME] + [
+            u'label::{}'.format(lang) for lang in self.languages] + [
+            u'filter']
+        rows = [header]
+        # Each list is one unbroken run of rows, as in real forms
+        per_list = -(-self.external_choices // self.external_lists)
+        for i in xrange(self.external_choices):
+            k, j = divmod(i, per_list)
+            rows.append([u'ext{}'.format(k), unicode(j)] +
+                        self.texts(u'Place {}'.format(j)) + [u'1'])
+        return rows
+
+    def settings_rows(self):
+        # "name" is the XForm root node in the XLSForm spec, the same as
+        # xml_root, so the xpaths hold with any converter
+        return [
+            [constants.FORM_TITLE, constants.FORM_ID, constants.XML_ROOT,
+             constants.NAME, u'default_language'],
+            [self.form_title, self.form_id, self.xml_root, self.xml_root,
+             self.languages[0] if self.languages else u'']
+        ]
+
+    def sheets(self):
+        """Make up every tab, as (name, rows) in workbook order"""
+        sheets = [(constants.SURVEY, self.survey_rows())]
+        if self.lists:
+            sheets.append((constants.CHOICES, self.choices_rows()))
+        if self.external_lists:
+            sheets.append((constants.EXTERNAL_CHOICES,
+                           self.external_choices_rows()))
+        sheets.append((constants.SETTINGS, self.settings_rows()))
+        return sheets
+
+    def write(self, directory):
+        """Write the XLSForm to directory
+
+        Returns:
+            The path of the new file
+        """
+        path = os.path.join(directory, self.short_name + constants.XLSX_EXT)
+        write_xlsx(path, self.sheets())
+        return path
+
+
+def write_pair(directory, seed=0, links=20, **kwargs):
+    """Write a household form that links to a female form
+
+    The household form fills links questions of the female form with
+    ``save_instance``. They are chosen at random among the plain questions
+    outside of repeats and without a relevant, so the pair passes strict
+    linking. There are fewer links if there are not enough such questions.
+
+    Args:
+        directory (str): Where to write the XLSForms
+        seed: The seed for the random choices
+        links (int): The number of ``save_instance`` links
+        **kwargs: Options for ``FormGenerator``, used for both forms
+
+    Returns:
+        A tuple (household path, female path)
+    """
+    female = FormGenerator(FEMALE, seed=seed, **kwargs)
+    female_path = female.write(directory)
+    household = FormGenerator(HOUSEHOLD, seed=seed, **kwargs)
+    chooser = random.Random(seed)
+    xpaths = female.linkable
+    household.add_links(chooser.sample(xpaths, min(links, len(xpaths))),
+                        female.form_id)
+    household_path = household.write(directory)
+    return household_path, female_path
+
+
+def main():
+    prog_desc = ('Write a made-up household XLSForm linked to a female '
+                 'XLSForm, for scale testing. The same seed and options '
+                 'always write the same forms.')
+    parser = argparse.ArgumentParser(description=prog_desc)
+    parser.add_argument('directory', help='Where to write the XLSForms.')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='The random seed. Default is 0.')
+    parser.add_argument('--questions', type=int, default=100,
+                        help='Questions per form. Default is 100.')
+    parser.add_argument('--depth', type=int, default=2,
+                        help='How deeply groups and repeats nest. Default '
+                             'is 2.')
+    parser.add_argument('--repeat_rate', type=float, default=0.1,
+                        help='The chance that a group is a repeat. Default '
+                             'is 0.1.')
+    parser.add_argument('--lists', type=int, default=10,
+                        help='Choice lists per form. Default is 10.')
+    parser.add_argument('--choices_per_list', type=int, default=5,
+                        help='Choices in each list. Default is 5.')
+    parser.add_argument('--external_lists', type=int, default=5,
+                        help='Lists in the external_choices tab. Default '
+                             'is 5.')
+    parser.add_argument('--external_choices', type=int, default=0,
+                        help='Rows in the external_choices tab. Default is '
+                             '0, for no tab.')
+    parser.add_argument('--languages', default=u','.join(DEFAULT_LANGUAGES),
+                        help='Comma-separated label languages. Default is '
+                             '"{}".'.format(u','.join(DEFAULT_LANGUAGES)))
+    parser.add_argument('--gap_rate', type=float, default=0.05,
+                        help='The chance that a translation is blank. '
+                             'Default is 0.05.')
+    parser.add_argument('--ref_rate', type=float, default=0.1,
+                        help='The chance that a label has a ${...} '
+                             'reference. Default is 0.1.')
+    parser.add_argument('--links', type=int, default=20,
+                        help='save_instance links from the household form. '
+                             'Default is 20.')
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.directory):
+        os.makedirs(args.directory)
+    languages = [lang.strip() for lang in args.languages.split(',')
+                 if lang.strip()]
+    paths = write_pair(args.directory, seed=args.seed, links=args.links,
+                       questions=args.questions, depth=args.depth,
+                       repeat_rate=args.repeat_rate, lists=args.lists,
+                       choices_per_list=args.choices_per_list,
+                       external_lists=args.external_lists,
+                       external_choices=args.external_choices,
+                       languages=languages, gap_rate=args.gap_rate,
+                       ref_rate=args.ref_rate)
+    for path in paths:
+        print u'Wrote "{}"'.format(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,188 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2016 PMA2020
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Record what each conversion produced so unchanged forms can be skipped
+
+A build manifest, a small JSON file, is written next to the XForms in each
+output directory. For every XLSForm converted into that directory it
+records the hash of the XLSForm, the versions of qtools2 and pmaxform, the
+options used, and the hashes of the resulting XForm and media files.
+
+A form is current when all of those still match: same input, same versions,
+same options, and outputs that have not been touched since. Incremental
+conversion skips current forms.
+"""
+
+import os
+import os.path
+import json
+import tempfile
+
+import pmaxform
+
+from __init__ import __version__ as VERSION
+from cache import hash_file
+from utils import replace_file
+
+
+MANIFEST_FILE = u'qtools2-manifest.json'
+# Bump when the layout of the manifest changes
+MANIFEST_VERSION = 1
+
+
+class Manifest:
+    """The build manifest of one output directory
+
+    Args:
+        directory (str): The output directory
+    """
+
+    def __init__(self, directory):
+        self.path = os.path.join(directory, MANIFEST_FILE)
+        self.entries = self.load()
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except (IOError, ValueError):
+            return {}
+        if not isinstance(data, dict):
+            return {}
+        if data.get(u'manifest_version') != MANIFEST_VERSION:
+            return {}
+        return data.get(u'forms', {})
+
+    def save(self):
+        """Write the manifest, replacing the file in one step
+
+        The old manifest is kept if the new one cannot be put in its place
+        (see ``utils.replace_file``).
+        """
+        data = {
+            u'manifest_version': MANIFEST_VERSION,
+            u'forms': self.entries
+        }
+        directory = os.path.dirname(self.path)
+        fd, tmp = tempfile.mkstemp(dir=directory or u'.', suffix=u'.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(data, f, indent=2, sort_keys=True)
+            replace_file(tmp, self.path)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    def is_current(self, xlsform, options):
+        """Check whether an XLSForm needs no conversion
+
+        Args:
+            xlsform (Xlsform): The XLSForm
+            options (dict): The conversion options
+
+        Returns:
+            True if the input, versions, and options match the manifest and
+            the outputs are as recorded
+        """
+        entry = self.entries.get(form_key(xlsform))
+        if entry is None:
+            return False
+        try:
+            expected = get_inputs(xlsform, options)
+            if entry.get(u'inputs') != expected:
+                return False
+            return entry.get(u'outputs') == get_outputs(xlsform)
+        except (IOError, OSError):
+            return False
+
+    def record(self, xlsform, options):
+        """Add or replace the entry for a converted XLSForm"""
+        self.entries[form_key(xlsform)] = {
+            u'inputs': get_inputs(xlsform, options),
+            u'outputs': get_outputs(xlsform)
+        }
+
+    def discard(self, xlsform):
+        self.entries.pop(form_key(xlsform), None)
+
+
+class ManifestSet:
+    """The manifests of all output directories used in one conversion"""
+
+    def __init__(self):
+        self.manifests = {}
+
+    def get(self, xlsform):
+        directory = os.path.dirname(os.path.abspath(xlsform.outpath))
+        if directory not in self.manifests:
+            self.manifests[directory] = Manifest(directory)
+        return self.manifests[directory]
+
+    def is_current(self, xlsform, options):
+        return self.get(xlsform).is_current(xlsform, options)
+
+    def record(self, xlsform, options):
+        self.get(xlsform).record(xlsform, options)
+
+    def discard(self, xlsform):
+        self.get(xlsform).discard(xlsform)
+
+    def save(self):
+        for manifest in self.manifests.values():
+            try:
+                manifest.save()
+            except (IOError, OSError):
+                # Without a manifest, the next run converts everything
+                pass
+
+
+def form_key(xlsform):
+    return os.path.abspath(xlsform.path)
+
+
+def get_inputs(xlsform, options):
+    """Describe everything that goes into converting an XLSForm"""
+    return {
+        u'input_hash': hash_file(xlsform.path),
+        u'qtools2_version': VERSION,
+        u'pmaxform_version': getattr(pmaxform, '__version__', u'unknown'),
+        u'options': options,
+        u'outpath': os.path.abspath(xlsform.outpath)
+    }
+
+
+def get_outputs(xlsform):
+    """Hash the XForm and media files of a converted XLSForm
+
+    Raises:
+        IOError: If the XForm does not exist
+    """
+    media = {}
+    if os.path.isdir(xlsform.media_dir):
+        for name in sorted(os.listdir(xlsform.media_dir)):
+            path = os.path.join(xlsform.media_dir, name)
+            if os.path.isfile(path):
+                media[name] = hash_file(path)
+    return {
+        u'xml_hash': hash_file(xlsform.outpath),
+        u'media_hashes': media
+    }
@@ -0,0 +1,469 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2016 PMA2020
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Time each phase of a conversion, per file
+
+Code marks a phase with ``span``::
+
+    with profiling.span(profiling.PYXFORM, path):
+        ...
+
+This costs nothing unless a ``Profiler`` is active. The active profiler
+records the wall time and the CPU time of each span, with its start time
+and the process and thread it ran in. It can also run ``cProfile`` on every
+span of one chosen phase and save the statistics, and it can write all spans
+as Chrome trace events, to be viewed on a timeline in Perfetto or
+chrome://tracing.
+
+CPU time is for the whole process, so spans that overlap in threads (see
+--jobs) each count CPU time used by the others.
+
+With memory accounting on, each span also records the peak resident set
+size (RSS) of its process and how much the span raised that peak. Where the
+``tracemalloc`` module can be imported (it is built into Python 3.4+ and is
+available for Python 2 as pytracemalloc), allocations are snapshotted at the
+start and end of each span and the top allocation sites of the difference
+are kept. Like CPU time, these are for the whole process.
+"""
+
+import os
+import sys
+import json
+import time
+import pstats
+import cProfile
+import threading
+import contextlib
+import collections
+
+try:
+    import resource
+except ImportError:
+    # Not on Windows
+    resource = None
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+
+# Phases of a conversion
+TOTAL = u'total'
+# Making an Xlsform: reading the workbook and the checks that halt
+XLSFORM = u'xlsform'
+READ_WORKBOOK = u'read_workbook'
+# Checks are named CHECK + "." + the name of the check
+CHECK = u'check'
+PYXFORM = u'pyxform'
+# Converting one form: PYXFORM, EDIT_XFORM, VALIDATE, and the extra checks
+OFFLINE = u'offline'
+VALIDATE = u'validate'
+EDIT_XFORM = u'edit_xform'
+LINKING = u'linking'
+
+# How many allocation sites to keep for each span and to report per phase
+TOP_SITES = 5
+
+_active = None
+
+
+class Profiler:
+    """Record the time spent in each span, by phase and file
+
+    Args:
+        cprofile_phase (str): A phase to run under ``cProfile``. A check
+            name such as "check.nonascii" picks one check, and "check" picks
+            them all.
+        memory (bool): Whether to record peak RSS and allocation sites
+    """
+
+    def __init__(self, cprofile_phase=None, memory=False):
+        self.records = []
+        self.lock = threading.Lock()
+        self.cprofile_phase = cprofile_phase
+        self.memory = memory
+        self.stats = None
+
+    @contextlib.contextmanager
+    def span(self, phase, path=None):
+        profile = None
+        if self.wants_cprofile(phase):
+            profile = cProfile.Profile()
+            profile.enable()
+        memory = memory_start() if self.memory else None
+        start = time.time()
+        cpu = cpu_time()
+        try:
+            yield
+        finally:
+            cpu = cpu_time() - cpu
+            wall = time.time() - start
+            if profile is not None:
+                profile.disable()
+            record = {
+                u'phase': phase,
+                u'file': path,
+                u'start': start,
+                u'wall': wall,
+                u'cpu': cpu,
+                u'pid': os.getpid(),
+                u'tid': threading.current_thread().ident
+            }
+            if memory is not None:
+                record.update(memory_end(memory))
+            with self.lock:
+                self.records.append(record)
+                if profile is not None:
+                    if self.stats is None:
+                        self.stats = pstats.Stats(profile)
+                    else:
+                        self.stats.add(profile)
+
+    def merge(self, records):
+        """Add records made by a Profiler in another process"""
+        with self.lock:
+            self.records.extend(records)
+
+    def wants_cprofile(self, phase):
+        chosen = self.cprofile_phase
+        if chosen is None:
+            return False
+        return phase == chosen or phase.startswith(chosen + u'.')
+
+    @contextlib.contextmanager
+    def activated(self):
+        """Make this the profiler that ``span`` records to
+
+        Starts tracing allocations for memory accounting if it is available
+        and not already on.
+        """
+        global _active
+        previous = _active
+        _active = self
+        started = False
+        if self.memory and tracemalloc is not None:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                started = True
+        try:
+            yield self
+        finally:
+            _active = previous
+            if started:
+                tracemalloc.stop()
+
+    def summarize(self, key):
+        """Total the records by a key
+
+        Args:
+            key (str): "phase" or "file"
+
+        Returns:
+            A list of dicts with the key, "calls", "wall", and "cpu", sorted
+            by wall time, longest first
+        """
+        totals = collections.OrderedDict()
+        for record in self.records:
+            value = record[key]
+            if key == u'file' and value is None:
+                continue
+            total = totals.setdefault(value, {
+                key: value,
+                u'calls': 0,
+                u'wall': 0.0,
+                u'cpu': 0.0
+            })
+            total[u'calls'] += 1
+            total[u'wall'] += record[u'wall']
+            total[u'cpu'] += record[u'cpu']
+        return sorted(totals.values(), key=lambda x: x[u'wall'],
+                      reverse=True)
+
+    def format_summary(self):
+        """Format the phase and file totals as text tables"""
+        lines = []
+        for key, title in ((u'phase', u'Phase'), (u'file', u'File')):
+            rows = self.summarize(key)
+            if not rows:
+                continue
+            width = max([len(title)] + [len(row[key]) for row in rows])
+            header = u'{:<{w}}  {:>6}  {:>10}  {:>10}'
+            lines.append(header.format(title, u'Calls', u'Wall (s)',
+                                       u'CPU (s)', w=width))
+            lines.append(u'-' * (width + 32))
+            row_format = u'{:<{w}}  {:>6}  {:>10.3f}  {:>10.3f}'
+            for row in rows:
+                lines.append(row_format.format(row[key], row[u'calls'],
+                                               row[u'wall'], row[u'cpu'],
+                                               w=width))
+            lines.append(u'')
+        return u'\n'.join(lines)
+
+    def summarize_memory(self):
+        """Total the memory records by file and phase
+
+        Checks are grouped together as the phase "check".
+
+        Returns:
+            A list of dicts with "file", "phase", "rss_peak" (the highest
+            peak RSS in bytes), "rss_growth" (bytes the peak was raised),
+            and "sites" (the top allocation sites, by bytes allocated),
+            sorted by growth, largest first
+        """
+        totals = collections.OrderedDict()
+        for record in self.records:
+            if u'rss_peak' not in record:
+                continue
+            phase = record[u'phase'].split(u'.')[0]
+            key = (record[u'file'], phase)
+            total = totals.setdefault(key, {
+                u'file': record[u'file'],
+                u'phase': phase,
+                u'rss_peak': None,
+                u'rss_growth': 0,
+                u'sites': collections.defaultdict(int)
+            })
+            if record[u'rss_peak'] is not None:
+                total[u'rss_peak'] = max(total[u'rss_peak'],
+                                         record[u'rss_peak'])
+                total[u'rss_growth'] += record[u'rss_growth']
+            for site in record.get(u'sites', ()):
+                total[u'sites'][site[u'site']] += site[u'size']
+        rows = []
+        for total in totals.values():
+            sites = sorted(total[u'sites'].items(), key=lambda x: x[1],
+                           reverse=True)[:TOP_SITES]
+            total[u'sites'] = [{u'site': site, u'size': size} for
+                               site, size in sites if size > 0]
+            rows.append(total)
+        return sorted(rows, key=lambda x: x[u'rss_growth'], reverse=True)
+
+    def format_memory(self):
+        """Format the memory totals as a text table and site lists"""
+        rows = self.summarize_memory()
+        if not rows:
+            return u''
+        labels = [u'{} {}'.format(row[u'phase'], os.path.basename(
+            row[u'file'])) if row[u'file'] else row[u'phase'] for row in rows]
+        width = max([len(u'Phase')] + [len(label) for label in labels])
+        lines = [
+            u'{:<{w}}  {:>15}  {:>15}'.format(u'Phase', u'Peak RSS (MB)',
+                                              u'Growth (MB)', w=width),
+            u'-' * (width + 34)
+        ]
+        for label, row in zip(labels, rows):
+            if row[u'rss_peak'] is None:
+                peak = growth = u'n/a'
+            else:
+                peak = u'{:.1f}'.format(row[u'rss_peak'] / 1048576.0)
+                growth = u'{:.1f}'.format(row[u'rss_growth'] / 1048576.0)
+            lines.append(u'{:<{w}}  {:>15}  {:>15}'.format(label, peak,
+                                                           growth, w=width))
+        lines.append(u'')
+        for label, row in zip(labels, rows):
+            if row[u'sites']:
+                lines.append(u'Top allocations in {}:'.format(label))
+                for site in row[u'sites']:
+                    lines.append(u'  {:>10.1f} KB  {}'.format(
+                        site[u'size'] / 1024.0, site[u'site']))
+        if tracemalloc is None:
+            lines.append(u'(Allocation sites need the tracemalloc module.)')
+        lines.append(u'')
+        return u'\n'.join(lines)
+
+    def to_json(self):
+        data = {
+            u'phases': self.summarize(u'phase'),
+            u'files': self.summarize(u'file'),
+            u'records': self.records
+        }
+        if self.memory:
+            data[u'memory'] = self.summarize_memory()
+        return data
+
+    def to_trace(self):
+        """Convert the records to Chrome trace-event format
+
+        Each span is a complete ("X") event named for its phase and file,
+        with times in microseconds from the first span. The main process
+        and the worker processes are named with metadata events.
+
+        Returns:
+            A dictionary ready to dump as JSON
+        """
+        events = []
+        if not self.records:
+            return {u'traceEvents': events, u'displayTimeUnit': u'ms'}
+        origin = min(record[u'start'] for record in self.records)
+        main_pid = os.getpid()
+        for pid in sorted(set(record[u'pid'] for record in self.records)):
+            name = u'qtools2' if pid == main_pid else u'qtools2 worker'
+            events.append({
+                u'name': u'process_name',
+                u'ph': u'M',
+                u'pid': pid,
+                u'args': {u'name': u'{} ({})'.format(name, pid)}
+            })
+        # Enclosing spans first when two start together
+        ordered = sorted(self.records,
+                         key=lambda x: (x[u'start'], -x[u'wall']))
+        for record in ordered:
+            name = record[u'phase']
+            if record[u'file'] is not None:
+                name = u'{} {}'.format(name,
+                                       os.path.basename(record[u'file']))
+            events.append({
+                u'name': name,
+                u'cat': record[u'phase'].split(u'.')[0],
+                u'ph': u'X',
+                u'ts': int(round((record[u'start'] - origin) * 1e6)),
+                u'dur': int(round(record[u'wall'] * 1e6)),
+                u'pid': record[u'pid'],
+                u'tid': record[u'tid'],
+                u'args': {
+                    u'file': record[u'file'],
+                    u'cpu': record[u'cpu'],
+                    u'rss_peak': record.get(u'rss_peak')
+                }
+            })
+        return {u'traceEvents': events, u'displayTimeUnit': u'ms'}
+
+    def report(self, json_path=None, stats_path=None, trace_path=None,
+               summary=True):
+        """Print the summary, and write the JSON, cProfile, and trace files
+
+        Args:
+            json_path (str): Where to write the records as JSON, or None
+            stats_path (str): Where to dump the cProfile statistics, or None
+            trace_path (str): Where to write trace events, or None
+            summary (bool): Whether to print the summary tables
+        """
+        if summary:
+            m = u'### qtools2 profile ###'
+            print u'#' * len(m) + u'\n' + m + u'\n' + u'#' * len(m)
+            print self.format_summary()
+            if self.memory:
+                print self.format_memory()
+        if trace_path:
+            with open(trace_path, 'w') as f:
+                json.dump(self.to_trace(), f)
+            print u'Trace written to "{}"'.format(trace_path)
+        if json_path:
+            with open(json_path, 'w') as f:
+                json.dump(self.to_json(), f, indent=2)
+            print u'Profile written to "{}"'.format(json_path)
+        if stats_path and self.stats is not None:
+            self.stats.dump_stats(stats_path)
+            print u'cProfile stats for "{}" written to "{}"'.format(
+                self.cprofile_phase, stats_path)
+        elif self.cprofile_phase is not None and self.stats is None:
+            print u'No spans of phase "{}" to profile'.format(
+                self.cprofile_phase)
+
+
+class NullSpan:
+    """A span that records nothing, for when no profiler is active"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+
+NULL_SPAN = NullSpan()
+
+
+def span(phase, path=None):
+    """Time a block as the given phase if a profiler is active
+
+    Args:
+        phase (str): The phase, one of the constants in this module
+        path (str): The file the work is for, or None if for all files
+    """
+    if _active is None:
+        return NULL_SPAN
+    return _active.span(phase, path)
+
+
+def is_active():
+    return _active is not None
+
+
+def get_active():
+    """Get the active Profiler, or None"""
+    return _active
+
+
+def check_phase(name):
+    return u'{}.{}'.format(CHECK, name)
+
+
+def peak_rss():
+    """Get the peak resident set size of this process in bytes, or None"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        return peak
+    # Kilobytes elsewhere
+    return peak * 1024
+
+
+def memory_start():
+    snapshot = None
+    if tracemalloc is not None and tracemalloc.is_tracing():
+        snapshot = tracemalloc.take_snapshot()
+    return peak_rss(), snapshot
+
+
+def memory_end(memory):
+    """Measure memory at the end of a span
+
+    Args:
+        memory (tuple): What ``memory_start`` returned
+
+    Returns:
+        A dictionary of "rss_peak", "rss_growth" and "sites" to add to the
+        record of the span
+    """
+    before, snapshot = memory
+    peak = peak_rss()
+    growth = None if peak is None else peak - before
+    sites = []
+    if snapshot is not None and tracemalloc.is_tracing():
+        diff = tracemalloc.take_snapshot().compare_to(snapshot, 'lineno')
+        for stat in diff[:TOP_SITES]:
+            if stat.size_diff <= 0:
+                continue
+            frame = stat.traceback[0]
+            sites.append({
+                u'site': u'{}:{}'.format(frame.filename, frame.lineno),
+                u'size': stat.size_diff
+            })
+    return {u'rss_peak': peak, u'rss_growth': growth, u'sites': sites}
+
+
+def cpu_time():
+    """Get the user plus system CPU time of this process"""
+    times = os.times()
+    return times[0] + times[1]
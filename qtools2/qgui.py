@@ -43,7 +43,7 @@ from errors import ConvertError
 from qgui_config import config
 from convert import xlsform_convert
 from constants import SUFFIX, PREEXISTING, PMA, CHECK_VERSIONING, \
-    STRICT_LINKING, VALIDATE, EXTRAS, DEBUG
+    STRICT_LINKING, VALIDATE, EXTRAS, DEBUG, VALIDATE_SERVICE
 
 
 class PmaConvert:
@@ -229,7 +229,8 @@ class PmaConvert:
                 STRICT_LINKING: not self.linking_warn.get(),
                 VALIDATE: not self.novalidate.get(),
                 EXTRAS: self.extras.get(),
-                DEBUG: self.debug.get()
+                DEBUG: self.debug.get(),
+                VALIDATE_SERVICE: True
             }
 
             buffer = StringIO.StringIO()
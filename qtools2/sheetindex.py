@@ -0,0 +1,263 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2016 PMA2020
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Share the columns of an XLSForm among all of the Xlsform checks
+
+The checks in ``Xlsform`` each need a handful of columns from the survey,
+choices, external_choices, and settings tabs. A ``SheetIndex`` pulls those
+tabs out of the workbook in one pass and decodes a column to unicode the first
+time a check asks for it. Every check after that reuses the same list.
+
+The index also holds enough about cell types to build the workbook dictionary
+that pmaxform converts, so the file need not be parsed a second time.
+"""
+
+import datetime
+import collections
+
+import xlrd
+from pmaxform.errors import PyXFormError
+
+import constants
+
+
+# Cell types that cannot be told apart by the Python type of the value
+SPECIAL_TYPES = (xlrd.XL_CELL_DATE, xlrd.XL_CELL_BOOLEAN, xlrd.XL_CELL_ERROR)
+
+
+class IndexedSheet:
+    """The cell values of one worksheet, stored column by column
+
+    Offers the subset of the ``xlrd.sheet.Sheet`` interface that the checks
+    use, plus lookup of whole columns by header. Text cells are unicode and
+    number cells are float. Dates, booleans, and errors are recorded in
+    ``types`` by (row, column).
+    """
+
+    def __init__(self, name, columns, types=None):
+        self.name = name
+        self.columns = columns
+        self.types = {} if types is None else types
+        self.ncols = len(columns)
+        self.nrows = len(columns[0]) if columns else 0
+        self.headers = self.row_values(0) if self.nrows else []
+        self.header_map = {}
+        for i, header in enumerate(self.headers):
+            self.header_map.setdefault(header, i)
+        self.decoded = {}
+
+    @classmethod
+    def from_sheet(cls, sheet):
+        rows = []
+        types = {}
+        for i in xrange(sheet.nrows):
+            rows.append(sheet.row_values(i))
+            for j, ctype in enumerate(sheet.row_types(i)):
+                if ctype in SPECIAL_TYPES:
+                    types[(i, j)] = ctype
+        columns = [list(col) for col in zip(*rows)]
+        return cls(sheet.name, columns, types)
+
+    def row_values(self, rowx):
+        return [col[rowx] for col in self.columns]
+
+    def col_values(self, colx):
+        return self.columns[colx]
+
+    def cell_type(self, rowx, colx):
+        ctype = self.types.get((rowx, colx))
+        if ctype is not None:
+            return ctype
+        value = self.columns[colx][rowx]
+        if isinstance(value, basestring):
+            return xlrd.XL_CELL_TEXT if value else xlrd.XL_CELL_EMPTY
+        return xlrd.XL_CELL_NUMBER
+
+    def column(self, header):
+        """Get the column under a header with every value as unicode
+
+        Args:
+            header (str): The header to look up in the first row
+
+        Returns:
+            A list of unicode, header first. The same list is returned for
+            every call with the same header, so callers must not modify it.
+
+        Raises:
+            ValueError: If the header is not found in the first row
+        """
+        try:
+            return self.decoded[header]
+        except KeyError:
+            pass
+        try:
+            col = self.header_map[header]
+        except KeyError:
+            raise ValueError(u'"{}" is not a header in "{}"'.format(header,
+                                                                   self.name))
+        decoded = [unicode(val) for val in self.columns[col]]
+        self.decoded[header] = decoded
+        return decoded
+
+
+class SheetIndex:
+    """The XLSForm tabs of a workbook, extracted once for all checks
+
+    Stands in for an ``xlrd.Book`` with the checks: ``sheet_by_name`` and
+    ``sheet_names`` behave the same, including raising ``xlrd.XLRDError`` for
+    a missing sheet.
+    """
+
+    def __init__(self, sheets, sheet_names, datemode=0):
+        self.sheets = sheets
+        self.names = sheet_names
+        self.datemode = datemode
+
+    @classmethod
+    def from_workbook(cls, wb, sheetnames=constants.XLSFORM_SHEETS):
+        """Build the index from an ``xlrd`` Book
+
+        Args:
+            wb: An `xlrd` Book instance
+            sheetnames (seq): The names of the sheets to extract
+
+        Returns:
+            A SheetIndex
+        """
+        names = wb.sheet_names()
+        sheets = {}
+        for name in sheetnames:
+            if name in names:
+                sheets[name] = IndexedSheet.from_sheet(wb.sheet_by_name(name))
+        return cls(sheets, names, wb.datemode)
+
+    def to_record(self):
+        """Reduce the index to plain values for ``cache.DiskCache``"""
+        sheets = {}
+        for name, sheet in self.sheets.items():
+            sheets[name] = (sheet.columns, sheet.types)
+        return (self.names, self.datemode, sheets)
+
+    @classmethod
+    def from_record(cls, record):
+        """Rebuild an index from the output of ``to_record``"""
+        names, datemode, sheets = record
+        indexed = {}
+        for name, (columns, types) in sheets.items():
+            indexed[name] = IndexedSheet(name, columns, types)
+        return cls(indexed, names, datemode)
+
+    @staticmethod
+    def wrap(wb):
+        """Return wb if it is already a SheetIndex, otherwise index it"""
+        if isinstance(wb, SheetIndex):
+            return wb
+        return SheetIndex.from_workbook(wb)
+
+    def sheet_names(self):
+        return list(self.names)
+
+    def sheet_by_name(self, sheetname):
+        try:
+            return self.sheets[sheetname]
+        except KeyError:
+            raise xlrd.XLRDError(u'No sheet named <{!r}>'.format(sheetname))
+
+    def unindexed(self, sheetnames):
+        """Find workbook sheets matching sheetnames that were not extracted
+
+        Args:
+            sheetnames (seq): Sheet names to look for, compared without case
+
+        Returns:
+            A list of the names of sheets in the workbook that match but are
+            not in this index
+        """
+        lower = set(name.lower() for name in sheetnames)
+        return [name for name in self.names if name.lower() in lower and
+                name not in self.sheets]
+
+    def to_workbook_dict(self):
+        """Build the workbook dictionary that pmaxform converts to JSON
+
+        Mirrors ``xls_to_dict`` in ``pmaxform.xls2json_backends``: each sheet
+        is a list of row dictionaries keyed by stripped header, with blank
+        cells left out, plus a "<sheet>_header" entry listing the headers.
+
+        Returns:
+            A dictionary, {sheetname: [{header: unicode value}]}
+
+        Raises:
+            PyXFormError: If a sheet has a duplicate column header
+        """
+        result = {}
+        for name, sheet in self.sheets.items():
+            rows, headers = self.sheet_to_dicts(sheet)
+            result[name] = rows
+            result[u'{}_header'.format(name)] = headers
+        return result
+
+    def sheet_to_dicts(self, sheet):
+        header_list = []
+        for header in sheet.headers:
+            if header in header_list:
+                m = u'Duplicate column header: {}'.format(header)
+                raise PyXFormError(m)
+            if not is_whitespace(header):
+                header_list.append(header)
+        keys = [u'{}'.format(header).strip() for header in sheet.headers]
+        rows = []
+        for rowx in xrange(1, sheet.nrows):
+            row_dict = collections.OrderedDict()
+            for colx, key in enumerate(keys):
+                value = sheet.columns[colx][rowx]
+                if isinstance(value, basestring):
+                    value = value.strip()
+                if not is_whitespace(value):
+                    ctype = sheet.cell_type(rowx, colx)
+                    row_dict[key] = self.to_unicode(value, ctype)
+            rows.append(row_dict)
+        headers = []
+        if header_list:
+            headers.append(collections.OrderedDict(
+                (u'{}'.format(header), u'') for header in header_list))
+        return rows, headers
+
+    def to_unicode(self, value, ctype):
+        """Represent a cell value as text the way pmaxform does"""
+        if ctype == xlrd.XL_CELL_BOOLEAN:
+            return u'TRUE' if value else u'FALSE'
+        elif ctype == xlrd.XL_CELL_NUMBER:
+            int_value = int(value)
+            if int_value == value:
+                return unicode(int_value)
+            return unicode(value)
+        elif ctype == xlrd.XL_CELL_DATE:
+            date_tuple = xlrd.xldate_as_tuple(value, self.datemode)
+            if date_tuple[:3] == (0, 0, 0):
+                return unicode(datetime.time(*date_tuple[3:]))
+            return unicode(datetime.datetime(*date_tuple))
+        return unicode(value).replace(unichr(160), u' ')
+
+
+def is_whitespace(value):
+    return isinstance(value, basestring) and not value.strip()
@@ -0,0 +1,97 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2016 PMA2020
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import unittest
+import os.path
+import shutil
+import sys
+import tempfile
+import StringIO
+
+from qtools2 import api
+from qtools2.xlsform import Xlsform
+
+
+class ApiTest(unittest.TestCase):
+    """
+    Unit tests should be done calling the script from inside root package, and
+    outside qtools2 top folder.
+    """
+
+    FORM_DIR = u'qtools2/test/forms'
+
+    def convert(self, filename, **kwargs):
+        path = os.path.join(self.FORM_DIR, filename)
+        stdout = sys.stdout
+        sys.stdout = StringIO.StringIO()
+        try:
+            with open(path, 'rb') as f:
+                result = api.convert_xlsform(f, filename=filename, **kwargs)
+            printed = sys.stdout.getvalue()
+        finally:
+            sys.stdout = stdout
+        self.assertEqual(printed, u'')
+        return result
+
+    def test_same_as_file_conversion(self):
+        """In-memory output matches the files written by xlsform_convert"""
+        filename = u'ex-choice-type.xlsx'
+        result = self.convert(filename)
+        self.assertEqual(result.errors, [])
+        out_dir = tempfile.mkdtemp()
+        try:
+            outpath = os.path.join(out_dir, u'ex-choice-type.xml')
+            xlsform = Xlsform(os.path.join(self.FORM_DIR, filename),
+                              outpath=outpath, pma=False)
+            xlsform.xlsform_convert(validate=False)
+            with open(outpath) as f:
+                self.assertEqual(result.xform.encode('utf-8'), f.read())
+            itemsets = os.path.join(xlsform.media_dir, u'itemsets.csv')
+            with open(itemsets, 'rb') as f:
+                self.assertEqual(result.itemsets, f.read())
+        finally:
+            shutil.rmtree(out_dir)
+
+    def test_bytes_source(self):
+        filename = u'CDR1-Female-good1.xlsx'
+        with open(os.path.join(self.FORM_DIR, filename), 'rb') as f:
+            contents = f.read()
+        result = api.convert_xlsform(contents, filename=filename)
+        self.assertEqual(result.errors, [])
+        self.assertIsNone(result.itemsets)
+        self.assertTrue(result.xform.startswith(u'<?xml'))
+        for category, message in result.warnings:
+            self.assertIsInstance(category, unicode)
+
+    def test_errors(self):
+        """Each kind of problem is reported with its category"""
+        result = self.convert(u'convert_fail.xlsx')
+        self.assertIsNone(result.xform)
+        self.assertEqual([c for c, _ in result.errors], [api.PYXFORM_ERROR])
+        result = self.convert(u'save_instance_no_form1.xlsx')
+        self.assertEqual([c for c, _ in result.errors], [api.XLSFORM_ERROR])
+        result = api.convert_xlsform('not a workbook')
+        self.assertEqual([c for c, _ in result.errors], [api.WORKBOOK_ERROR])
+
+
+if __name__ == '__main__':
+    unittest.main()
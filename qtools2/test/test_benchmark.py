@@ -0,0 +1,135 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2016 PMA2020
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+import unittest
+import json
+from StringIO import StringIO
+
+from qtools2 import benchmark
+from qtools2 import constants
+from qtools2.xlsform import Xlsform
+
+
+class BenchmarkTest(unittest.TestCase):
+    """
+    Unit tests should be done calling the script from inside root package, and
+    outside qtools2 top folder.
+    """
+
+    def test_made_up_index_has_problems(self):
+        """The made-up XLSForm gives every check something to find"""
+        wb = benchmark.make_index(200)
+        survey = wb.sheet_by_name(constants.SURVEY)
+        self.assertEqual(survey.nrows, 201)
+        self.assertTrue(Xlsform.find_name_dups(wb, constants.CHOICES))
+        self.assertTrue(Xlsform.find_multiple_lists(wb, constants.CHOICES))
+        self.assertTrue(Xlsform.find_unused_lists(wb))
+        self.assertTrue(Xlsform.undefined_cols(wb, constants.SURVEY))
+        self.assertTrue(Xlsform.find_non_ascii(wb, constants.CHOICES))
+        langs = Xlsform.check_languages(wb)
+        self.assertTrue(Xlsform.find_missing_translations(wb, langs))
+        self.assertTrue(Xlsform.find_by_regex_translations(wb, langs))
+
+    def test_run_small(self):
+        """A quick run covers every benchmark and dumps to JSON"""
+        out = StringIO()
+        report = benchmark.run(sizes=(10, 20), repeat=2, out=out)
+        names = set(r[u'name'] for r in report[u'results'])
+        expected = [
+            u'xlsform',
+            u'check.find_name_dups',
+            u'check.check_languages',
+            u'xform.make_edits',
+            u'xform.discover_all',
+            u'convert.validate_xpaths'
+        ]
+        for name in expected:
+            self.assertIn(name, names)
+        for result in report[u'results']:
+            self.assertEqual(len(result[u'times']), 2)
+            self.assertLessEqual(result[u'min'], result[u'median'])
+        skipped = [s[u'name'] for s in report[u'skipped']]
+        self.assertEqual(u'odk_validate' in skipped,
+                         u'odk_validate' not in names)
+        self.assertTrue(json.loads(json.dumps(report)))
+
+    def test_only(self):
+        """Only benchmarks with the given prefix are run"""
+        report = benchmark.run(sizes=(10,), repeat=1, only=u'xform.',
+                               out=StringIO())
+        names = set(r[u'name'] for r in report[u'results'])
+        self.assertEqual(names,
+                         {u'xform.make_edits', u'xform.discover_all'})
+
+    def test_median(self):
+        self.assertEqual(benchmark.median([3, 1, 2]), 2)
+        self.assertEqual(benchmark.median([4, 1, 2, 3]), 2.5)
+        self.assertEqual(benchmark.iqr([1, 2, 3, 4, 5]), 2)
+        self.assertEqual(benchmark.iqr([7]), 0)
+
+    @staticmethod
+    def make_report(*results):
+        return {u'results': [
+            {u'name': name, u'size': 10, u'median': median, u'iqr': iqr}
+            for name, median, iqr in results]}
+
+    def test_compare(self):
+        """Only clear slowdowns past the threshold are regressions"""
+        baseline = self.make_report(
+            (u'slower', 1.0, 0.1),
+            (u'noisy', 1.0, 1.2),
+            (u'tiny', 0.001, 0.0),
+            (u'faster', 1.0, 0.1),
+            (u'within', 1.0, 0.0),
+            (u'gone', 1.0, 0.1))
+        report = self.make_report(
+            (u'slower', 2.0, 0.1),
+            (u'noisy', 2.0, 1.2),
+            (u'tiny', 0.004, 0.0),
+            (u'faster', 0.2, 0.1),
+            (u'within', 1.2, 0.0),
+            (u'added', 1.0, 0.1))
+        compared = benchmark.compare(baseline, report, threshold=0.5)
+        status = {row[u'name']: row[u'status'] for row in compared}
+        self.assertEqual(status, {
+            u'slower': u'regressed',
+            u'noisy': u'ok',
+            u'tiny': u'ok',
+            u'faster': u'improved',
+            u'within': u'ok',
+            u'gone': u'missing',
+            u'added': u'new'
+        })
+        slower = [row for row in compared if row[u'name'] == u'slower'][0]
+        self.assertAlmostEqual(slower[u'change'], 1.0)
+        strict = benchmark.compare(baseline, report, threshold=0.1)
+        self.assertIn(u'within', [row[u'name'] for row in strict if
+                                  row[u'status'] == u'regressed'])
+        table = benchmark.format_comparison(compared)
+        lines = table.splitlines()
+        self.assertEqual(len(lines), len(compared) + 1)
+        self.assertIn(u'REGRESSED', lines[1])
+
+
+if __name__ == '__main__':
+    unittest.main()
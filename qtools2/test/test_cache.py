@@ -0,0 +1,118 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2016 PMA2020
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+import unittest
+import os
+import os.path
+import shutil
+import tempfile
+
+from qtools2.cache import DiskCache
+from qtools2.cache import MemoryCache
+from qtools2.xlsform import Xlsform
+
+
+class DiskCacheTest(unittest.TestCase):
+    """
+    Unit tests should be done calling the script from inside root package, and
+    outside qtools2 top folder.
+    """
+
+    FORM_DIR = u'qtools2/test/forms'
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_round_trip(self):
+        """Stored values come back unchanged, in another instance too"""
+        value = ([u'survey', u'choices'], 0, {u'survey': ([[u'a', 1.0]],
+                                                           {(1, 1): 4})})
+        DiskCache(self.directory).put(u'key', value)
+        cache = DiskCache(self.directory)
+        self.assertEqual(cache.get(u'key'), value)
+        self.assertIsNone(cache.get(u'other'))
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        cache.clear()
+        self.assertIsNone(cache.get(u'key'))
+
+    def test_corrupt_entry_is_a_miss(self):
+        cache = DiskCache(self.directory)
+        cache.put(u'key', u'value')
+        with open(cache.entry_path(u'key'), 'wb') as f:
+            f.write(b'not a cache entry')
+        self.assertIsNone(cache.get(u'key'))
+        self.assertFalse(os.path.exists(cache.entry_path(u'key')))
+
+    def test_least_recently_used_evicted(self):
+        """The entry not read for the longest is removed past the cap"""
+        cache = DiskCache(self.directory)
+        for i, key in enumerate((u'a', u'b', u'c')):
+            cache.put(key, os.urandom(1000))
+            os.utime(cache.entry_path(key), (i, i))
+        self.assertIsNotNone(cache.get(u'a'))
+        size = os.path.getsize(cache.entry_path(u'a'))
+        cache.max_bytes = 3 * size
+        cache.put(u'd', os.urandom(1000))
+        self.assertIsNotNone(cache.get(u'a'))
+        self.assertIsNone(cache.get(u'b'))
+        self.assertIsNotNone(cache.get(u'c'))
+        self.assertIsNotNone(cache.get(u'd'))
+
+    def test_memory_cache(self):
+        """Recent values come from memory, older ones from disk"""
+        cache = MemoryCache(self.directory, max_items=1)
+        first = [u'first']
+        cache.put(u'a', first)
+        self.assertIs(cache.get(u'a'), first)
+        cache.put(u'b', [u'second'])
+        self.assertNotIn(u'a', cache.memory)
+        self.assertEqual(cache.get(u'a'), first)
+        self.assertEqual(cache.hits, 2)
+
+    def test_xlsform_uses_cache(self):
+        """A second Xlsform of the same file reads its sheets from the cache"""
+        path = os.path.join(self.FORM_DIR, u'choices_two_spots.xlsx')
+        first = Xlsform(path, pma=False, cache=DiskCache(self.directory))
+        cache = DiskCache(self.directory)
+        second = Xlsform(path, pma=False, cache=cache)
+        self.assertEqual(cache.misses, 0)
+        self.assertEqual(first.index.to_record(), second.index.to_record())
+        self.assertEqual(first.choices_multiple, second.choices_multiple)
+
+    def test_file_key_follows_content(self):
+        path = os.path.join(self.directory, u'form.xlsx')
+        with open(path, 'wb') as f:
+            f.write(b'one')
+        cache = DiskCache(self.directory)
+        before = cache.file_key(path)
+        self.assertEqual(cache.file_key(path), before)
+        with open(path, 'wb') as f:
+            f.write(b'two!')
+        self.assertNotEqual(cache.file_key(path), before)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -22,9 +22,14 @@
 
 import unittest
 import os.path
+import sys
+import shutil
+import tempfile
+import StringIO
 
 from qtools2.xlsform import Xlsform
 from qtools2.errors import XlsformError
+from qtools2 import constants
 from qtools2 import convert
 
 
@@ -80,3 +85,108 @@ class XlsformTest(unittest.TestCase):
         for xlsform in bad:
             seq = [xlsform]
             self.assertRaises(XlsformError, convert.check_hq_fq_headers, seq)
+
+    def test_validate_xpaths_searches_each_child_once(self):
+        """Each distinct save_form is searched once for all rows"""
+
+        class Parent:
+            path = u'parent.xlsx'
+            save_instance = [u'save_instance', u'/FRS/a', u'/FRS/b',
+                             u'/FRS/c']
+            save_form = [u'save_form', u'FRS', u'FRS', u'FRS']
+
+        class Child:
+            form_id = u'FRS'
+            searches = []
+
+            def discover_all(self, xpaths):
+                self.searches.append(list(xpaths))
+                return [xpath != u'/FRS/c' for xpath in xpaths], []
+
+        child = Child()
+        findings = convert.validate_xpaths([Parent()], [child])
+        self.assertEqual(child.searches, [[u'/FRS/a', u'/FRS/b', u'/FRS/c']])
+        self.assertEqual(len(findings), 1)
+        self.assertIn(u'/FRS/c', findings[0])
+
+    def test_incremental_failure_keeps_unchanged_outputs(self):
+        """A failed incremental run removes only what it wrote"""
+        directory = tempfile.mkdtemp()
+        good = os.path.join(directory, u'good.xlsx')
+        bad = os.path.join(directory, u'bad.xlsx')
+        shutil.copy(os.path.join(self.FORM_DIR, u'CDR1-Female-good1.xlsx'),
+                    good)
+        shutil.copy(os.path.join(self.FORM_DIR, u'convert_fail.xlsx'), bad)
+        options = {
+            constants.PMA: False,
+            constants.VALIDATE: False,
+            constants.CHECK_VERSIONING: False,
+            constants.CACHE: False,
+            constants.INCREMENTAL: True
+        }
+        stdout = sys.stdout
+        sys.stdout = StringIO.StringIO()
+        try:
+            convert.xlsform_convert([good], **options)
+            good_xml = os.path.join(directory, u'good.xml')
+            self.assertTrue(os.path.exists(good_xml))
+            convert.xlsform_convert([good, bad], **options)
+            output = sys.stdout.getvalue()
+        finally:
+            sys.stdout = stdout
+            unchanged = os.path.exists(good_xml)
+            shutil.rmtree(directory)
+        self.assertIn(u'Unchanged, not converted', output)
+        self.assertIn(u'not all conversions were successful', output)
+        self.assertTrue(unchanged)
+
+    def test_parallel_precheck(self):
+        """Prechecks in a process pool match serial results, in order"""
+        file_list = [
+            u'CDR1-Household-good1.xlsx',
+            u'settings-repeat.xlsx',
+            u'does-not-exist.xlsx',
+            u'CDR1-Female-good1.xlsx',
+            u'choices_two_spots.xlsx'
+        ]
+        args = [(os.path.join(self.FORM_DIR, f), u'', False, False, None)
+                for f in file_list]
+        serial = convert.precheck_all(args, jobs=1)
+        parallel = convert.precheck_all(args, jobs=3)
+        self.assertEqual(len(parallel), len(file_list))
+        for (a, a_msg), (b, b_msg), f in zip(serial, parallel, file_list):
+            self.assertEqual(a_msg, b_msg, msg=f)
+            if a is None:
+                self.assertIsNone(b, msg=f)
+            else:
+                self.assertEqual(a.path, b.path)
+                self.assertEqual(a.index.to_record(), b.index.to_record())
+
+    def test_concurrent_offline_conversion(self):
+        """Converting in threads gives the same results and output order"""
+        file_list = [
+            u'CDR1-Household-good1.xlsx',
+            u'convert_fail.xlsx',
+            u'CDR1-Female-good1.xlsx',
+            u'choices_two_spots.xlsx'
+        ]
+        results = []
+        for jobs in (1, 3):
+            out_dir = tempfile.mkdtemp()
+            xlsforms = []
+            for f in file_list:
+                outpath = os.path.join(out_dir, f.replace(u'.xlsx', u'.xml'))
+                xlsforms.append(Xlsform(os.path.join(self.FORM_DIR, f),
+                                        outpath=outpath, pma=False))
+            stdout = sys.stdout
+            sys.stdout = StringIO.StringIO()
+            try:
+                successes = convert.offline_all(xlsforms, validate=False,
+                                                jobs=jobs)
+                output = sys.stdout.getvalue()
+            finally:
+                sys.stdout = stdout
+                shutil.rmtree(out_dir)
+            results.append((successes, output.replace(out_dir, u'')))
+        self.assertEqual(results[0], results[1])
+        self.assertEqual(len(results[0][0]), len(file_list))
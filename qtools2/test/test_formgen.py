@@ -0,0 +1,172 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2016 PMA2020
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+import unittest
+import os
+import os.path
+import shutil
+import tempfile
+import zipfile
+from distutils.spawn import find_executable
+
+import xlrd
+
+from qtools2 import constants
+from qtools2 import convert
+from qtools2 import formgen
+from qtools2 import validator
+from qtools2.sheetindex import SheetIndex
+from qtools2.xlsform import Xlsform
+from qtools2.xlsxreader import read_sheet_index
+
+
+class FormgenTest(unittest.TestCase):
+    """
+    Unit tests should be done calling the script from inside root package, and
+    outside qtools2 top folder.
+    """
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_same_seed_same_files(self):
+        """The same seed and options write identical workbooks"""
+        kwargs = {u'questions': 60, u'external_lists': 3,
+                  u'external_choices': 50}
+        first = formgen.write_pair(self.directory, seed=7, links=10,
+                                   **kwargs)
+        other_directory = os.path.join(self.directory, u'other')
+        os.mkdir(other_directory)
+        second = formgen.write_pair(other_directory, seed=7, links=10,
+                                    **kwargs)
+        for a, b in zip(first, second):
+            self.assertEqual(os.path.basename(a), os.path.basename(b))
+            with zipfile.ZipFile(a) as za, zipfile.ZipFile(b) as zb:
+                self.assertEqual(za.namelist(), zb.namelist())
+                for name in za.namelist():
+                    self.assertEqual(za.read(name), zb.read(name), msg=name)
+        gen = formgen.FormGenerator(seed=8, **kwargs)
+        other = SheetIndex.from_workbook(xlrd.open_workbook(
+            gen.write(other_directory)))
+        same = SheetIndex.from_workbook(xlrd.open_workbook(first[1]))
+        self.assertNotEqual(other.sheet_by_name(constants.SURVEY).columns,
+                            same.sheet_by_name(constants.SURVEY).columns)
+
+    def test_readable_and_pma_named(self):
+        """Both readers agree on the file, and it passes the PMA checks"""
+        gen = formgen.FormGenerator(questions=35, depth=3, block_size=4,
+                                    external_lists=2, external_choices=30,
+                                    languages=(u'English', u'Hindi',
+                                               u'Kiswahili'))
+        path = gen.write(self.directory)
+        expected = SheetIndex.from_workbook(xlrd.open_workbook(path))
+        found = read_sheet_index(path)
+        self.assertEqual(expected.sheet_names(), [
+            constants.SURVEY, constants.CHOICES, constants.EXTERNAL_CHOICES,
+            constants.SETTINGS])
+        for name in expected.sheets:
+            self.assertEqual(expected.sheet_by_name(name).columns,
+                             found.sheet_by_name(name).columns, msg=name)
+        xlsform = Xlsform(path)
+        self.assertEqual(xlsform.form_id, u'FQ-cdr1-v1')
+        self.assertEqual(xlsform.xml_root, u'FRS')
+        survey = xlsform.index.sheet_by_name(constants.SURVEY)
+        types = survey.column(constants.TYPE)
+        self.assertEqual(len(gen.xpaths), 35)
+        self.assertEqual(types.count(u'begin group') +
+                         types.count(u'begin repeat'), 9 * 3)
+        self.assertEqual(xlsform.index.sheet_by_name(
+            constants.EXTERNAL_CHOICES).nrows, 31)
+        self.assertEqual(len(Xlsform.check_languages(xlsform.index)), 3)
+
+    def test_linked_pair(self):
+        """The household form links to questions in the female form"""
+        hq_path, fq_path = formgen.write_pair(self.directory, links=8,
+                                              questions=40)
+        hq = Xlsform(hq_path)
+        fq = Xlsform(fq_path)
+        self.assertEqual(len(hq.save_instance), 9)
+        self.assertEqual(hq.save_form[1:], [fq.form_id])
+        self.assertEqual(fq.delete_form[1:], [u'yes'])
+        female = formgen.FormGenerator(questions=40)
+        female.survey_rows()
+        for xpath in hq.save_instance[1:]:
+            self.assertIn(xpath, female.linkable)
+        convert.check_hq_fq_headers([hq, fq])
+
+    def test_linked_pair_passes_linking(self):
+        """Converted pairs pass strict linking whatever the seed"""
+        for seed in xrange(3):
+            directory = os.path.join(self.directory, unicode(seed))
+            os.mkdir(directory)
+            hq_path, fq_path = formgen.write_pair(directory, seed=seed,
+                                                  links=20, questions=200)
+            xlsforms = [Xlsform(hq_path), Xlsform(fq_path)]
+            for xlsform in xlsforms:
+                xlsform.xlsform_convert(validate=False)
+            self.assertEqual(len(xlsforms[0].save_instance), 21)
+            xforms = [xlsform.xform for xlsform in xlsforms]
+            findings = convert.validate_xpaths(xlsforms, xforms)
+            self.assertEqual(findings, [], msg=u'With seed {}'.format(seed))
+
+    def test_delete_depends_on_earlier_question(self):
+        """delete_form is decided by an earlier integer, not by itself"""
+        for seed in xrange(5):
+            female = formgen.FormGenerator(seed=seed, questions=40)
+            rows = female.survey_rows()
+            columns = female.survey_columns
+            names = [row[1] for row in rows]
+            delete = rows[names.index(u'delete_this')]
+            self.assertEqual(delete[0], u'hidden')
+            self.assertEqual(delete[columns[constants.DELETE_FORM]], u'yes')
+            relevant = delete[columns[u'relevant']]
+            name = relevant[2:relevant.index(u'}')]
+            self.assertEqual(relevant, u'${{{}}} <= 10'.format(name))
+            self.assertLess(names.index(name), names.index(u'delete_this'))
+            self.assertEqual(rows[names.index(name)][0], u'integer')
+        female = formgen.FormGenerator(questions=0)
+        names = [row[1] for row in female.survey_rows()]
+        self.assertEqual(names[1:], [u'age', u'delete_this'])
+
+    @unittest.skipUnless(find_executable(u'java'), u'Java not found')
+    def test_linked_pair_passes_validate(self):
+        """Converted pairs are valid XForms according to ODK Validate"""
+        hq_path, fq_path = formgen.write_pair(self.directory, links=20,
+                                              questions=200)
+        for path in (hq_path, fq_path):
+            xlsform = Xlsform(path)
+            xlsform.xlsform_convert(validate=False)
+            validator.check_xform(xlsform.outpath)
+
+    def test_column_name(self):
+        names = {0: u'A', 25: u'Z', 26: u'AA', 51: u'AZ', 52: u'BA',
+                 701: u'ZZ', 702: u'AAA'}
+        for colx, name in names.items():
+            self.assertEqual(formgen.column_name(colx), name)
+
+
+if __name__ == '__main__':
+    unittest.main()
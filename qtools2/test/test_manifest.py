@@ -0,0 +1,119 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2016 PMA2020
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+import unittest
+import os
+import os.path
+import shutil
+import tempfile
+
+from qtools2 import constants
+from qtools2 import utils
+from qtools2.manifest import Manifest
+from qtools2.manifest import ManifestSet
+from qtools2.xlsform import Xlsform
+
+
+class ManifestTest(unittest.TestCase):
+    """
+    Unit tests should be done calling the script from inside root package, and
+    outside qtools2 top folder.
+    """
+
+    FORM_DIR = u'qtools2/test/forms'
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, u'ex-choice-type.xlsx')
+        shutil.copy(os.path.join(self.FORM_DIR, u'ex-choice-type.xlsx'),
+                    self.path)
+        self.options = {
+            constants.SUFFIX: u'',
+            constants.PMA: False,
+            constants.CHECK_VERSIONING: False,
+            constants.VALIDATE: False
+        }
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def converted(self):
+        xlsform = Xlsform(self.path, pma=False)
+        xlsform.xlsform_convert(validate=False)
+        return xlsform
+
+    def test_unchanged_form_is_current(self):
+        """A recorded form is current until its outputs or options change"""
+        xlsform = self.converted()
+        manifests = ManifestSet()
+        self.assertFalse(manifests.is_current(xlsform, self.options))
+        manifests.record(xlsform, self.options)
+        manifests.save()
+        manifest = Manifest(self.directory)
+        self.assertTrue(manifest.is_current(xlsform, self.options))
+        other = dict(self.options)
+        other[constants.VALIDATE] = True
+        self.assertFalse(manifest.is_current(xlsform, other))
+        itemsets = os.path.join(xlsform.media_dir, constants.ITEMSETS)
+        with open(itemsets, 'a') as f:
+            f.write(u'"extra"\n')
+        self.assertFalse(manifest.is_current(xlsform, self.options))
+
+    def test_changed_input_is_not_current(self):
+        xlsform = self.converted()
+        manifest = Manifest(self.directory)
+        manifest.record(xlsform, self.options)
+        with open(self.path, 'ab') as f:
+            f.write(b'\0')
+        self.assertFalse(manifest.is_current(xlsform, self.options))
+        os.remove(xlsform.outpath)
+        self.assertFalse(manifest.is_current(xlsform, self.options))
+
+    def test_failed_save_keeps_manifest(self):
+        """The old manifest survives a save that cannot replace it"""
+        xlsform = self.converted()
+        manifest = Manifest(self.directory)
+        manifest.record(xlsform, self.options)
+        manifest.save()
+        with open(manifest.path) as f:
+            expected = f.read()
+        manifest.entries = {}
+        rename = os.rename
+
+        def failing_rename(src, dst):
+            raise OSError(u'Simulated rename failure')
+
+        utils.os.rename = failing_rename
+        try:
+            self.assertRaises(OSError, manifest.save)
+        finally:
+            utils.os.rename = rename
+        with open(manifest.path) as f:
+            self.assertEqual(f.read(), expected)
+        leftovers = [f for f in os.listdir(self.directory) if
+                     f.endswith(u'.tmp')]
+        self.assertEqual(leftovers, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,193 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2016 PMA2020
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import unittest
+import os.path
+import json
+import collections
+
+from qtools2 import profiling
+from qtools2.profiling import Profiler
+from qtools2.xlsform import Xlsform
+
+
+Frame = collections.namedtuple('Frame', 'filename lineno')
+Stat = collections.namedtuple('Stat', 'size_diff traceback')
+
+
+class FakeSnapshot:
+
+    def __init__(self, sizes):
+        self.sizes = sizes
+
+    def compare_to(self, other, key_type):
+        stats = [Stat(size - other.sizes.get(site, 0), [Frame(*site)]) for
+                 site, size in self.sizes.items()]
+        return sorted(stats, key=lambda x: x.size_diff, reverse=True)
+
+
+class FakeTracemalloc:
+    """Stands in for tracemalloc, which Python 2 does not have built in"""
+
+    def __init__(self):
+        self.tracing = False
+        self.sizes = {}
+
+    def is_tracing(self):
+        return self.tracing
+
+    def start(self):
+        self.tracing = True
+
+    def stop(self):
+        self.tracing = False
+
+    def take_snapshot(self):
+        return FakeSnapshot(dict(self.sizes))
+
+
+class ProfilingTest(unittest.TestCase):
+    """
+    Unit tests should be done calling the script from inside root package, and
+    outside qtools2 top folder.
+    """
+
+    FORM_DIR = u'qtools2/test/forms'
+
+    def test_inactive_span(self):
+        self.assertFalse(profiling.is_active())
+        with profiling.span(profiling.PYXFORM):
+            pass
+        self.assertIs(profiling.span(profiling.PYXFORM), profiling.NULL_SPAN)
+
+    def test_phases_recorded(self):
+        """Reading, checks, and extras are timed per file"""
+        path = os.path.join(self.FORM_DIR, u'CDR1-Female-good1.xlsx')
+        profiler = Profiler(cprofile_phase=profiling.CHECK)
+        with profiler.activated():
+            self.assertTrue(profiling.is_active())
+            xlsform = Xlsform(path, pma=False)
+            xlsform.extra_warnings()
+        self.assertFalse(profiling.is_active())
+        phases = set(record[u'phase'] for record in profiler.records)
+        self.assertIn(profiling.READ_WORKBOOK, phases)
+        for name in Xlsform.EXTRA_CHECKS:
+            self.assertIn(profiling.check_phase(name), phases)
+        self.assertTrue(all(record[u'file'] == path for record in
+                            profiler.records))
+        self.assertIsNotNone(profiler.stats)
+        files = profiler.summarize(u'file')
+        self.assertEqual(len(files), 1)
+        self.assertEqual(files[0][u'calls'], len(profiler.records))
+        json.dumps(profiler.to_json())
+
+    def test_trace_events(self):
+        """Each span becomes a complete event with process and thread"""
+        path = os.path.join(self.FORM_DIR, u'CDR1-Female-good1.xlsx')
+        profiler = Profiler()
+        with profiler.activated():
+            with profiling.span(profiling.XLSFORM, path):
+                Xlsform(path, pma=False)
+        trace = profiler.to_trace()
+        events = trace[u'traceEvents']
+        meta = [e for e in events if e[u'ph'] == u'M']
+        spans = [e for e in events if e[u'ph'] == u'X']
+        self.assertEqual(len(meta), 1)
+        self.assertEqual(len(spans), len(profiler.records))
+        self.assertEqual(spans[0][u'name'],
+                         u'xlsform CDR1-Female-good1.xlsx')
+        self.assertEqual(spans[0][u'ts'], 0)
+        first = spans[0]
+        for event in spans:
+            self.assertEqual(event[u'pid'], os.getpid())
+            self.assertIsNotNone(event[u'tid'])
+            self.assertGreaterEqual(event[u'ts'], first[u'ts'])
+            self.assertLessEqual(event[u'ts'] + event[u'dur'],
+                                 first[u'ts'] + first[u'dur'] + 1)
+        json.dumps(trace)
+        worker = [dict(r, pid=-1) for r in profiler.records]
+        profiler.merge(worker)
+        meta = [e for e in profiler.to_trace()[u'traceEvents'] if
+                e[u'ph'] == u'M']
+        self.assertEqual(len(meta), 2)
+
+    def test_memory(self):
+        """Peak RSS and allocation sites are recorded and summarized"""
+        fake = FakeTracemalloc()
+        saved = profiling.tracemalloc
+        profiling.tracemalloc = fake
+        try:
+            profiler = Profiler(memory=True)
+            with profiler.activated():
+                self.assertTrue(fake.tracing)
+                with profiling.span(profiling.READ_WORKBOOK, u'a.xlsx'):
+                    fake.sizes[(u'x.py', 1)] = 4096
+                    fake.sizes[(u'y.py', 2)] = 1024
+                with profiling.span(profiling.check_phase(u'a'), u'a.xlsx'):
+                    fake.sizes[(u'x.py', 1)] = 6144
+                with profiling.span(profiling.check_phase(u'b'), u'a.xlsx'):
+                    fake.sizes[(u'z.py', 3)] = 512
+            self.assertFalse(fake.tracing)
+        finally:
+            profiling.tracemalloc = saved
+        rows = profiler.summarize_memory()
+        self.assertEqual(len(rows), 2)
+        by_phase = dict((row[u'phase'], row) for row in rows)
+        read = by_phase[profiling.READ_WORKBOOK]
+        self.assertEqual(read[u'sites'], [
+            {u'site': u'x.py:1', u'size': 4096},
+            {u'site': u'y.py:2', u'size': 1024}
+        ])
+        check = by_phase[profiling.CHECK]
+        self.assertEqual(check[u'sites'], [
+            {u'site': u'x.py:1', u'size': 2048},
+            {u'site': u'z.py:3', u'size': 512}
+        ])
+        if profiling.resource is not None:
+            self.assertGreater(read[u'rss_peak'], 0)
+            self.assertGreaterEqual(read[u'rss_growth'], 0)
+        self.assertIn(u'Top allocations in check a.xlsx:',
+                      profiler.format_memory())
+        self.assertIn(u'memory', profiler.to_json())
+
+    def test_summary_sorted(self):
+        profiler = Profiler()
+        profiler.records = [
+            {u'phase': u'a', u'file': u'x', u'wall': 1.0, u'cpu': 0.5},
+            {u'phase': u'b', u'file': u'x', u'wall': 3.0, u'cpu': 1.0},
+            {u'phase': u'a', u'file': None, u'wall': 4.0, u'cpu': 2.0}
+        ]
+        phases = profiler.summarize(u'phase')
+        self.assertEqual([p[u'phase'] for p in phases], [u'a', u'b'])
+        self.assertEqual(phases[0][u'calls'], 2)
+        self.assertEqual(phases[0][u'wall'], 5.0)
+        files = profiler.summarize(u'file')
+        self.assertEqual(files, [{u'file': u'x', u'calls': 2, u'wall': 4.0,
+                                  u'cpu': 1.5}])
+        self.assertFalse(profiler.wants_cprofile(u'check.nonascii'))
+        profiler.cprofile_phase = u'check'
+        self.assertTrue(profiler.wants_cprofile(u'check.nonascii'))
+        self.assertFalse(profiler.wants_cprofile(u'checks'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2016 PMA2020
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import unittest
+import os.path
+
+import xlrd
+from pmaxform.xls2json_backends import xls_to_dict
+
+from qtools2 import constants
+from qtools2.sheetindex import SheetIndex
+from qtools2.xlsform import Xlsform
+
+
+class SheetIndexTest(unittest.TestCase):
+    """
+    Unit tests should be done calling the script from inside root package, and
+    outside qtools2 top folder.
+    """
+
+    FORM_DIR = u'qtools2/test/forms'
+
+    def test_same_values_as_xlrd(self):
+        """Indexed columns hold exactly what xlrd returns"""
+        file_list = [
+            u'BFR3-Female-Questionnaire-v11-jkp.xlsx',
+            u'headerless-1.xlsx',
+            u'settings-staggered-top2.xlsx',
+            u'ex-choice-type.xlsx'
+        ]
+        for f in file_list:
+            wb = xlrd.open_workbook(os.path.join(self.FORM_DIR, f))
+            index = SheetIndex.from_workbook(wb)
+            self.assertEqual(index.sheet_names(), wb.sheet_names())
+            for name in constants.XLSFORM_SHEETS:
+                if name not in wb.sheet_names():
+                    continue
+                sheet = wb.sheet_by_name(name)
+                indexed = index.sheet_by_name(name)
+                msg = u'With "{}" tab in "{}"'.format(name, f)
+                self.assertEqual(indexed.nrows, sheet.nrows, msg=msg)
+                self.assertEqual(indexed.ncols, sheet.ncols, msg=msg)
+                for i in range(sheet.ncols):
+                    self.assertEqual(indexed.col_values(i),
+                                     sheet.col_values(i), msg=msg)
+
+    def test_column_decoded_once(self):
+        """Repeated lookups of a header share one decoded column"""
+        path = os.path.join(self.FORM_DIR, u'choices_two_spots.xlsx')
+        index = SheetIndex.from_workbook(xlrd.open_workbook(path))
+        choices = index.sheet_by_name(constants.CHOICES)
+        first = choices.column(constants.LIST_NAME)
+        second = choices.column(constants.LIST_NAME)
+        self.assertIs(first, second)
+        self.assertTrue(all(isinstance(val, unicode) for val in first))
+        self.assertRaises(ValueError, choices.column, u'no_such_header')
+        self.assertRaises(xlrd.XLRDError, index.sheet_by_name, u'no_sheet')
+
+    def test_workbook_dict_same_as_pmaxform(self):
+        """The workbook dictionary matches what pmaxform reads from file"""
+        file_list = [
+            u'BFR3-Female-Questionnaire-v11-jkp.xlsx',
+            u'nonascii1.xlsx',
+            u'ex-choice-type.xlsx',
+            u'spacing-test.xlsx'
+        ]
+        for f in file_list:
+            path = os.path.join(self.FORM_DIR, f)
+            expected = xls_to_dict(path)
+            found = Xlsform(path, pma=False).index.to_workbook_dict()
+            for key, value in found.items():
+                msg = u'With "{}" in "{}"'.format(key, f)
+                self.assertEqual(value, expected[key], msg=msg)
+
+    def test_checks_accept_index(self):
+        """Static checks give the same results from a Book or a SheetIndex"""
+        path = os.path.join(self.FORM_DIR, u'choices_unused_list2.xlsx')
+        wb = xlrd.open_workbook(path)
+        index = SheetIndex.from_workbook(wb)
+        self.assertIs(SheetIndex.wrap(index), index)
+        self.assertEqual(Xlsform.find_unused_lists(wb),
+                         Xlsform.find_unused_lists(index))
+        self.assertEqual(Xlsform.check_languages(wb),
+                         Xlsform.check_languages(index))
+        self.assertEqual(Xlsform.get_settings(wb),
+                         Xlsform.get_settings(index))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2016 PMA2020
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import unittest
+import os.path
+import re
+
+from qtools2.xlsform import Xlsform
+from qtools2.tokenrules import TokenScanner
+from qtools2.tokenrules import DEFAULT_RULES
+from qtools2.tokenrules import OPTIONAL_RULES
+from qtools2.tokenrules import get_rules
+
+
+class TokenRulesTest(unittest.TestCase):
+    """
+    Unit tests should be done calling the script from inside root package, and
+    outside qtools2 top folder.
+    """
+
+    FORM_DIR = u'qtools2/test/forms'
+
+    def test_same_as_separate_scans(self):
+        """One combined scan finds what each rule finds by itself"""
+        texts = [
+            u'',
+            u'Enter ${q1} for 12 months',
+            u'<span style="color:red">${age_2}</span> is over 15<br>',
+            u'%(name)s has {0} of %d items\nNext line',
+            u'**Bold** and _italic_ but not snake_case',
+            u'<h1>Title 2</h1> ${a}${b} 3'
+        ]
+        rules = get_rules(OPTIONAL_RULES)
+        scanner = TokenScanner(rules)
+        for text in texts:
+            expected = tuple(sorted(re.findall(rule.pattern, text)) for rule
+                             in rules)
+            self.assertEqual(scanner.signature(text), expected, msg=text)
+
+    def test_signature_memoised(self):
+        scanner = TokenScanner()
+        first = scanner.signature(u'Enter ${q1}')
+        second = scanner.signature(u'Enter ${q1}')
+        self.assertIs(first, second)
+
+    def test_optional_rules(self):
+        """Optional rules add their own description to mismatches"""
+        rules = get_rules([u'span', u'placeholder', u'linebreak'])
+        self.assertEqual(rules[:len(DEFAULT_RULES)], DEFAULT_RULES)
+        scanner = TokenScanner(rules)
+        a = scanner.signature(u'<span style="x">Hi</span> %s\nBye')
+        b = scanner.signature(u'Salut %s Au revoir')
+        self.assertEqual(scanner.mismatches(a, b),
+                         (u"'<span ...>'", u"'line break'"))
+        self.assertEqual(scanner.mismatches(a, a), ())
+        self.assertRaises(KeyError, get_rules, [u'no_such_rule'])
+
+    def test_default_rules_in_xlsform(self):
+        """Optional rules add nothing where the markup agrees"""
+        filename = u'NER1-mismatching-regex-translations.xlsx'
+        path = os.path.join(self.FORM_DIR, filename)
+        xlsform = Xlsform(path, pma=False)
+        found = xlsform.regex_tranlsations
+        self.assertEqual(len(found), 3)
+        xlsform.translation_rules = get_rules(OPTIONAL_RULES)
+        report = Xlsform.analyze_translations(xlsform.index,
+                                              rules=xlsform.translation_rules)
+        self.assertEqual(report[1], found)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,197 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2016 PMA2020
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+import unittest
+import os
+import os.path
+import sys
+import shutil
+import tempfile
+import StringIO
+
+from pmaxform.odk_validate import ODKValidateError
+
+from qtools2.cache import DiskCache
+from qtools2 import validator
+from qtools2.validator import ValidatorService
+from qtools2.validator import check_xform
+
+
+FAKE_SERVICE = b"""import sys
+sys.stdout.write('READY\\n')
+sys.stdout.flush()
+for line in iter(sys.stdin.readline, ''):
+    path = line.strip()
+    if path.endswith('die.xml'):
+        sys.exit(0)
+    if path.endswith('bad.xml'):
+        msg = 'Error at /data/q1'
+        sys.stdout.write('1 %d\\n%s' % (len(msg), msg))
+    else:
+        sys.stdout.write('0 0\\n')
+    sys.stdout.flush()
+"""
+
+
+class FakeService(ValidatorService):
+
+    def __init__(self, script):
+        ValidatorService.__init__(self)
+        self.script = script
+        self.starts = 0
+
+    def get_command(self):
+        self.starts += 1
+        if self.script is None:
+            self.problem = u'Java was not found'
+            return None
+        return [sys.executable, self.script]
+
+
+class ValidatorServiceTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.script = os.path.join(self.directory, u'service.py')
+        with open(self.script, 'wb') as f:
+            f.write(FAKE_SERVICE)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def capture_stderr(self, func, *args):
+        stderr = sys.stderr
+        sys.stderr = StringIO.StringIO()
+        try:
+            func(*args)
+        except (ODKValidateError, EnvironmentError):
+            # From pmaxform, depending on whether Java is installed
+            pass
+        finally:
+            output = sys.stderr.getvalue()
+            sys.stderr = stderr
+        return output
+
+    def test_one_process_for_many_forms(self):
+        """The service is started once and answers each form in turn"""
+        service = FakeService(self.script)
+        try:
+            self.assertEqual(service.check_xform(u'good.xml'), [])
+            self.assertRaises(ODKValidateError, service.check_xform,
+                              u'bad.xml')
+            self.assertEqual(service.check_xform(u'good.xml'), [])
+            self.assertEqual(service.starts, 1)
+            self.assertTrue(service.running())
+        finally:
+            service.stop()
+        self.assertFalse(service.running())
+
+    def test_dead_service_not_restarted(self):
+        """Once the service dies, validation falls back to a process per form
+        """
+        service = FakeService(self.script)
+        output = self.capture_stderr(service.check_xform, u'die.xml')
+        self.assertIn(u'stopped responding', output)
+        self.assertTrue(service.failed)
+        self.assertFalse(service.start())
+        self.assertEqual(service.starts, 1)
+
+    def test_fall_back_warnings(self):
+        """A service that cannot start says why it is not used"""
+        service = FakeService(None)
+        output = self.capture_stderr(service.check_xform, u'good.xml')
+        self.assertIn(u'Java was not found', output)
+        self.assertTrue(service.failed)
+        silent = os.path.join(self.directory, u'silent.py')
+        with open(silent, 'wb') as f:
+            f.write(b'import sys\nsys.stdout.write("HELLO\\n")\n')
+        service = FakeService(silent)
+        output = self.capture_stderr(service.check_xform, u'good.xml')
+        self.assertIn(u'did not start', output)
+        self.assertFalse(service.running())
+
+    def test_java_version(self):
+        outputs = {
+            b'java version "1.8.0_292"': 8,
+            b'openjdk version "11.0.2" 2019-01-15': 11,
+            b'openjdk version "17" 2021-09-14': 17,
+            b'openjdk version "24-ea" 2025-03-18': 24,
+            b'Error: could not find libjava.so': None
+        }
+        for output, version in outputs.items():
+            self.assertEqual(validator.parse_java_version(output), version,
+                             msg=output)
+
+    def test_exit_handling(self):
+        """The SecurityManager flag is passed only to Java 18 to 23"""
+        allow = [validator.ALLOW_SECURITY_MANAGER_OPTION]
+        cases = {
+            None: ([], validator.EXIT_TRAP),
+            8: ([], validator.EXIT_TRAP),
+            11: ([], validator.EXIT_TRAP),
+            17: ([], validator.EXIT_TRAP),
+            18: (allow, validator.EXIT_TRAP),
+            23: (allow, validator.EXIT_TRAP),
+            24: ([], validator.DIRECT),
+            25: ([], validator.DIRECT)
+        }
+        for version, expected in cases.items():
+            self.assertEqual(ValidatorService.get_exit_handling(version),
+                             expected, msg=version)
+
+    def test_results_cached_by_content(self):
+        """An XForm with the same bytes is not validated again"""
+        cache = DiskCache(os.path.join(self.directory, u'cache'))
+        paths = {}
+        for name, text in ((u'good.xml', b'<h:html/>'),
+                           (u'bad.xml', b'<h:html>'),
+                           (u'copy.xml', b'<h:html>')):
+            paths[name] = os.path.join(self.directory, name)
+            with open(paths[name], 'wb') as f:
+                f.write(text)
+        service = FakeService(self.script)
+        try:
+            self.assertEqual(check_xform(paths[u'good.xml'], service, cache),
+                             [])
+            self.assertRaises(ODKValidateError, check_xform,
+                              paths[u'bad.xml'], service, cache)
+        finally:
+            service.stop()
+        # The service is stopped and failed, so only the cache can answer
+        service.failed = True
+        self.assertEqual(check_xform(paths[u'good.xml'], service, cache), [])
+        with self.assertRaises(ODKValidateError) as context:
+            check_xform(paths[u'copy.xml'], service, cache)
+        self.assertIn(u'${q1}', unicode(context.exception))
+        self.assertEqual(service.starts, 1)
+
+    def test_interpret(self):
+        self.assertEqual(ValidatorService.interpret(0, b''), [])
+        warnings = ValidatorService.interpret(0, b'Careful')
+        self.assertEqual(warnings, [u'ODK Validate Warnings:\nCareful'])
+        self.assertRaises(ODKValidateError, ValidatorService.interpret, 1,
+                          b'Broken')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,150 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2016 PMA2020
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+import unittest
+import os.path
+import sys
+import shutil
+import tempfile
+import StringIO
+
+from qtools2 import constants
+from qtools2 import watch
+from qtools2.errors import XformError
+
+
+class FakeTime:
+    """Stands in for the time module, calling a function on each sleep"""
+
+    def __init__(self, on_sleep):
+        self.on_sleep = on_sleep
+
+    def sleep(self, seconds):
+        self.on_sleep()
+
+
+class WatchTest(unittest.TestCase):
+    """
+    Unit tests should be done calling the script from inside root package, and
+    outside qtools2 top folder.
+    """
+
+    FORM_DIR = u'qtools2/test/forms'
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        for name in (u'a.xlsx', u'b.xls', u'~$a.xlsx', u'notes.txt'):
+            with open(os.path.join(self.directory, name), 'wb') as f:
+                f.write(b'x')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_expand_paths(self):
+        """Directories give their XLSForms but not Excel lock files"""
+        missing = os.path.join(self.directory, u'missing.xlsx')
+        notes = os.path.join(self.directory, u'notes.txt')
+        found = watch.expand_paths([self.directory, missing, notes])
+        expected = [os.path.join(self.directory, name) for name in
+                    (u'a.xlsx', u'b.xls', u'notes.txt')]
+        self.assertEqual(found, expected)
+
+    def test_snapshot_sees_changes(self):
+        paths = watch.expand_paths([self.directory])
+        before = watch.snapshot(paths)
+        self.assertEqual(before, watch.snapshot(paths))
+        with open(paths[0], 'ab') as f:
+            f.write(b'more')
+        self.assertNotEqual(before, watch.snapshot(paths))
+        self.assertEqual(watch.wait_until_settled([self.directory],
+                                                  watch.snapshot(paths), 0),
+                         watch.snapshot(paths))
+
+    def run_watch(self, paths, on_sleep, runs):
+        """Watch for a number of runs, returning what was printed"""
+        options = {constants.PMA: False, constants.VALIDATE: False,
+                   constants.CHECK_VERSIONING: False}
+        stdout, stderr, real_time = sys.stdout, sys.stderr, watch.time
+        sys.stdout = StringIO.StringIO()
+        sys.stderr = StringIO.StringIO()
+        watch.time = FakeTime(on_sleep)
+        try:
+            watch.watch(paths, runs=runs, **options)
+            return sys.stdout.getvalue()
+        finally:
+            sys.stdout, sys.stderr, watch.time = stdout, stderr, real_time
+
+    def test_keeps_watching_after_failure(self):
+        """A form that fails to convert is converted again once fixed"""
+        path = os.path.join(self.directory, u'form.xlsx')
+        shutil.copy(os.path.join(self.FORM_DIR, u'convert_fail.xlsx'), path)
+
+        fixed = []
+
+        def fix():
+            # Only once, so the file then settles
+            if not fixed:
+                fixed.append(True)
+                shutil.copy(os.path.join(self.FORM_DIR,
+                                         u'CDR1-Female-good1.xlsx'), path)
+
+        output = self.run_watch([path], fix, runs=2)
+        self.assertEqual(output.count(u'converting 1 file(s)'), 2)
+        self.assertIn(u'ERROR', output)
+        self.assertTrue(os.path.exists(os.path.join(self.directory,
+                                                    u'form.xml')))
+
+    def test_keeps_watching_after_unexpected_error(self):
+        """Linking and unexpected errors are reported, not raised"""
+        errors = [XformError(u'No such save_form'), RuntimeError(u'Boom')]
+        calls = []
+
+        def failing_convert(xlsxfiles, **kwargs):
+            calls.append(xlsxfiles)
+            if errors:
+                raise errors.pop(0)
+
+        path = os.path.join(self.directory, u'a.xlsx')
+        touched = []
+
+        def touch():
+            # Once per conversion, so the file then settles
+            if len(touched) < len(calls):
+                touched.append(True)
+                with open(path, 'ab') as f:
+                    f.write(b'x')
+
+        real_convert = watch.xlsform_convert
+        watch.xlsform_convert = failing_convert
+        try:
+            output = self.run_watch([path], touch, runs=3)
+        finally:
+            watch.xlsform_convert = real_convert
+        self.assertEqual(len(calls), 3)
+        self.assertIn(u'No such save_form', output)
+        self.assertIn(u'Unexpected error', output)
+        self.assertEqual(output.count(u'Watching for changes'), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
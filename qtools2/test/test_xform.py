@@ -21,8 +21,12 @@
 # SOFTWARE.
 
 import unittest
+import os
 import os.path
+import shutil
+import tempfile
 
+from qtools2 import utils
 from qtools2.xform import Xform
 from qtools2.errors import XformError
 
@@ -90,6 +94,20 @@ class XformTest(unittest.TestCase):
                 self.assertEqual(len(result), 1, msg=msg)
                 self.assertTrue(result[0] is True, msg=msg)
 
+    def test_instance_paths(self):
+        """Plain xpaths are found in the path set, others by searching"""
+        f = u'child_form.xml'
+        path = os.path.join(self.FORM_DIR, f)
+        this_xform = Xform(filename=path, form_id=self.form_ids[f])
+        paths = this_xform.instance_paths
+        self.assertIn(u'/child/a/name', paths)
+        self.assertIn(u'/child/meta/instanceID', paths)
+        self.assertNotIn(u'/child', paths)
+        instance = this_xform.get_instance_xml()
+        for xpath in paths:
+            self.assertTrue(Xform.discover_xpath(xpath, instance), msg=xpath)
+        self.assertTrue(this_xform.discover(u'/child/a[1]/name'))
+
     def test_simple_incorrect_xpaths(self):
         self.longMessage = True
         not_xpath = {
@@ -213,6 +231,98 @@ class XformTest(unittest.TestCase):
                 self.assertRaises(XformError, this_xform.check_bind_attr,
                                   xpath, xml_root)
 
+    def test_parsed_once(self):
+        """The tree is kept until an edit changes the data"""
+        f = u'spacing-test-logging.xml'
+        path = os.path.join(self.FORM_DIR, f)
+        this_xform = Xform(filename=path, form_id=self.form_ids[f])
+        xml_root = this_xform.get_xml_root()
+        instance = this_xform.get_instance_xml()
+        self.assertTrue(this_xform.has_logging())
+        self.assertIs(this_xform.get_xml_root(), xml_root)
+        self.assertIs(this_xform.get_instance_xml(), instance)
+        this_xform.inject_version()
+        self.assertIsNot(this_xform.get_xml_root(), xml_root)
+        self.assertIsNot(this_xform.get_instance_xml(), instance)
+        self.assertEqual(this_xform.get_instance_xml().tag, instance.tag)
+
+    def test_streamed_edits(self):
+        """Editing in place gives the same file as editing in memory"""
+        f = u'spacing-test-logging.xml'
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, f)
+            shutil.copy(os.path.join(self.FORM_DIR, f), path)
+            with open(path, 'a') as out:
+                out.write('<!-- &amp;#x20; ##### -->\n')
+            in_memory = Xform(filename=path, form_id=self.form_ids[f])
+            in_memory.newline_fix()
+            in_memory.remove_placeholders()
+            in_memory.inject_version()
+            expected = in_memory.data
+            streamed = Xform(filename=path, form_id=self.form_ids[f])
+            instance = streamed.get_instance_xml()
+            streamed.make_edits()
+            with open(path) as edited:
+                self.assertEqual(list(edited), expected)
+            self.assertIsNot(streamed.get_instance_xml(), instance)
+            self.assertEqual(os.listdir(directory), [f])
+        finally:
+            shutil.rmtree(directory)
+
+    def test_failed_edit_keeps_original(self):
+        """The original XForm survives a failed replace, on any platform"""
+        f = u'spacing-test-logging.xml'
+        directory = tempfile.mkdtemp()
+        rename = os.rename
+        os_name = os.name
+
+        def failing_rename(src, dst):
+            if src.endswith(u'.tmp'):
+                raise OSError(u'Simulated rename failure')
+            rename(src, dst)
+
+        try:
+            path = os.path.join(directory, f)
+            shutil.copy(os.path.join(self.FORM_DIR, f), path)
+            with open(path) as original:
+                expected = original.read()
+            utils.os.rename = failing_rename
+            for name in (u'posix', u'nt'):
+                utils.os.name = name
+                xform = Xform(filename=path, form_id=self.form_ids[f])
+                self.assertRaises(OSError, xform.make_edits)
+                with open(path) as kept:
+                    self.assertEqual(kept.read(), expected, msg=name)
+                self.assertEqual(os.listdir(directory), [f], msg=name)
+            # A working rename, still taking the Windows path
+            utils.os.rename = rename
+            xform = Xform(filename=path, form_id=self.form_ids[f])
+            xform.make_edits()
+            with open(path) as edited:
+                self.assertIn(Xform.version_stamp(), edited.read())
+            self.assertEqual(os.listdir(directory), [f])
+        finally:
+            utils.os.rename = rename
+            utils.os.name = os_name
+            shutil.rmtree(directory)
+
+    def test_bind_index(self):
+        """Indexed binds are the ones a document search finds"""
+        f = u'KEShort-HQ.xml'
+        path = os.path.join(self.FORM_DIR, f)
+        this_xform = Xform(filename=path, form_id=self.form_ids[f])
+        xml_root = this_xform.get_xml_root()
+        binds, memo = this_xform.get_bind_index(xml_root)
+        self.assertTrue(binds)
+        for nodeset, attrib in binds.items():
+            found = Xform.xpath_query(nodeset, xml_root)
+            self.assertEqual(found.attrib, attrib, msg=nodeset)
+        for nodeset in binds:
+            this_xform.first_relevant(nodeset, binds, memo)
+        self.assertIs(this_xform.get_bind_index(xml_root)[1], memo)
+        self.assertTrue(memo)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -22,12 +22,16 @@
 
 import unittest
 import os.path
+import re
 import itertools
+import shutil
+import tempfile
 
 import xlrd
 
 from qtools2 import constants
 from qtools2.xlsform import Xlsform
+from qtools2.xform import Xform
 from qtools2.errors import XlsformError
 
 
@@ -141,6 +145,32 @@ class XlsformTest(unittest.TestCase):
             b = found
             msg = u'With {}, expected {}, found {}'.format(f, a, b)
             self.assertEqual(a, b, msg=msg)
+
+    def test_analyze_translations(self):
+        """One pass finds the same results as the pairwise iteration"""
+        f = u'WGE-Female-Questionnaire-NG-Pilot-v11.xlsx'
+        wb = xlrd.open_workbook(os.path.join(self.FORM_DIR, f))
+        lang_dict = Xlsform.check_languages(wb)
+        missing = []
+        mismatched = []
+        digits = re.compile(r'\d+')
+        for sheetname in (u'survey', u'choices', u'external_choices'):
+            if not lang_dict[sheetname]:
+                continue
+            sheet = wb.sheet_by_name(sheetname)
+            pairs = Xlsform.translation_pairs(sheet, lang_dict[sheetname])
+            for row, _, a_val, _, col, b_val in pairs:
+                if bool(a_val) != bool(b_val):
+                    missing.append((sheetname, row, col, bool(a_val)))
+                a_digits = sorted(digits.findall(unicode(a_val)))
+                b_digits = sorted(digits.findall(unicode(b_val)))
+                if a_digits != b_digits:
+                    mismatched.append((row, col))
+        found_missing, found_mismatched = Xlsform.analyze_translations(wb)
+        self.assertEqual(found_missing, missing)
+        found_digits = [(row, col) for _, row, col, fails in
+                        found_mismatched if "'[0-9]+'" in fails]
+        self.assertEqual(found_digits, mismatched)
             
     def test_get_identifiers(self):
         """Test file names and PMA naming conventions"""
@@ -230,6 +260,45 @@ class XlsformTest(unittest.TestCase):
             m3 = msg.format(u'settings', f)
             self.assertTrue(xlsform.settings_blanks == [], msg=m3)
 
+    def test_convert_writes_edited_xform(self):
+        """The XForm is edited before it is written and kept for linking"""
+        filename = u'CDR1-Female-good1.xlsx'
+        out_dir = tempfile.mkdtemp()
+        try:
+            outpath = os.path.join(out_dir, u'out.xml')
+            xlsform = Xlsform(os.path.join(self.FORM_DIR, filename),
+                              outpath=outpath, pma=False)
+            self.assertIsNone(xlsform.xform)
+            xlsform.xlsform_convert(validate=False)
+            with open(outpath) as f:
+                written = list(f)
+            self.assertEqual(written[1], Xform.version_stamp())
+            self.assertEqual(xlsform.xform.data, written)
+            self.assertIsNotNone(xlsform.xform.get_instance_xml())
+        finally:
+            shutil.rmtree(out_dir)
+
+    def test_extras_computed_on_demand(self):
+        """Extra checks run only when their results are first used"""
+        path = os.path.join(self.FORM_DIR, u'NER1-missing-translations.xlsx')
+        xlsform = Xlsform(path, pma=False)
+        lazy = [
+            u'missing_translations',
+            u'regex_tranlsations',
+            u'language_consistency',
+            u'unused_lists',
+            u'choices_ascii'
+        ]
+        for attr in lazy:
+            self.assertNotIn(attr, vars(xlsform), msg=attr)
+        found = xlsform.missing_translations
+        self.assertIn(u'missing_translations', vars(xlsform))
+        self.assertIn(u'language_consistency', vars(xlsform))
+        self.assertIs(found, xlsform.missing_translations)
+        self.assertNotIn(u'regex_tranlsations', vars(xlsform))
+        self.assertIs(xlsform.regex_tranlsations,
+                      xlsform.translation_report[1])
+
     def test_has_external_choices_and_type(self):
         file_list = [
             u'ex-choice-type.xlsx'
@@ -0,0 +1,108 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2016 PMA2020
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import unittest
+import os
+import os.path
+
+import xlrd
+
+from qtools2 import constants
+from qtools2.sheetindex import SheetIndex
+from qtools2.xlsxreader import read_sheet_index
+from qtools2.xlsxreader import column_index
+
+
+class XlsxReaderTest(unittest.TestCase):
+    """
+    Unit tests should be done calling the script from inside root package, and
+    outside qtools2 top folder.
+    """
+
+    FORM_DIR = u'qtools2/test/forms'
+
+    def test_same_as_xlrd(self):
+        """Streamed sheets match xlrd cell for cell in every test form"""
+        file_list = [f for f in os.listdir(self.FORM_DIR)
+                     if f.endswith(u'.xlsx')]
+        for f in file_list:
+            path = os.path.join(self.FORM_DIR, f)
+            expected = SheetIndex.from_workbook(xlrd.open_workbook(path))
+            found = read_sheet_index(path)
+            msg = u'With "{}"'.format(f)
+            self.assertEqual(expected.sheet_names(), found.sheet_names(),
+                             msg=msg)
+            self.assertEqual(sorted(expected.sheets), sorted(found.sheets),
+                             msg=msg)
+            for name in expected.sheets:
+                a = expected.sheet_by_name(name)
+                b = found.sheet_by_name(name)
+                sheet_msg = u'{}, "{}" tab'.format(msg, name)
+                self.assertEqual(a.nrows, b.nrows, msg=sheet_msg)
+                self.assertEqual(a.ncols, b.ncols, msg=sheet_msg)
+                self.assertEqual(a.columns, b.columns, msg=sheet_msg)
+                self.assertEqual(a.types, b.types, msg=sheet_msg)
+            self.assertEqual(expected.datemode, found.datemode, msg=msg)
+
+    def test_only_requested_sheets(self):
+        """Sheets that are not asked for are not read"""
+        path = os.path.join(self.FORM_DIR, u'ex-choice-type.xlsx')
+        index = read_sheet_index(path, sheetnames=(constants.SURVEY,))
+        self.assertEqual(index.sheets.keys(), [constants.SURVEY])
+        self.assertIn(constants.EXTERNAL_CHOICES, index.sheet_names())
+        self.assertRaises(xlrd.XLRDError, index.sheet_by_name,
+                          constants.CHOICES)
+
+    def test_column_projection(self):
+        """Only requested columns keep their values"""
+        path = os.path.join(self.FORM_DIR, u'headerless-1.xlsx')
+        full = read_sheet_index(path).sheet_by_name(constants.SURVEY)
+        columns = {constants.SURVEY: [constants.TYPE]}
+        index = read_sheet_index(path, columns=columns)
+        projected = index.sheet_by_name(constants.SURVEY)
+        self.assertEqual(projected.headers, full.headers)
+        self.assertEqual(projected.ncols, full.ncols)
+        self.assertEqual(projected.column(constants.TYPE),
+                         full.column(constants.TYPE))
+        name = projected.column(constants.NAME)
+        self.assertTrue(all(val == u'' for val in name[1:]))
+        for i, header in enumerate(full.headers):
+            if header == u'':
+                self.assertEqual(projected.col_values(i), full.col_values(i))
+        choices = index.sheet_by_name(constants.CHOICES)
+        self.assertEqual(choices.columns,
+                         read_sheet_index(path).sheets[u'choices'].columns)
+
+    def test_column_index(self):
+        cells = {
+            u'A1': 0,
+            u'Z10': 25,
+            u'AA3': 26,
+            u'AZ100': 51,
+            u'$B$2': 1
+        }
+        for cell_name, colx in cells.items():
+            self.assertEqual(column_index(cell_name), colx, msg=cell_name)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,146 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2016 PMA2020
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Rules for the tokens that must agree between translations
+
+A translation should keep the variables, numbers, markup, and placeholders of
+the default language. Each ``TokenRule`` describes one kind of token with a
+regular expression. A ``TokenScanner`` compiles a set of rules into one
+alternation and scans a string once for all of them.
+
+Tokens can nest, e.g. the digit in "${q1}" or the digit in "<h1>". Each
+token found is scanned again for the other rules, so a rule finds the same
+tokens it would find scanning the string by itself.
+"""
+
+import re
+import collections
+
+
+# A kind of token that translations must keep: a short name for choosing the
+# rule on the command line, the description used in warnings, and a regular
+# expression for one token, without capturing groups
+TokenRule = collections.namedtuple('TokenRule', 'name description pattern')
+
+VARIABLE = TokenRule(u'variable', u"'${...}'", ur'\$\{.*?\}')
+NUMBER = TokenRule(u'number', u"'[0-9]+'", ur'\d+')
+SPAN = TokenRule(u'span', u"'<span ...>'", ur'<span\b[^<>]*>|</span\s*>')
+HTML = TokenRule(u'html', u"'<tag>'", ur'</?[A-Za-z][A-Za-z0-9]*\b[^<>]*>')
+PLACEHOLDER = TokenRule(u'placeholder', u"'%s/{0}'",
+                        ur'%(?:\([^()]*\))?[sdifr]|\{\d*\}')
+MARKDOWN = TokenRule(u'markdown', u"'*emphasis*'",
+                     ur'\*{1,3}|(?<![A-Za-z0-9])_{1,3}|_{1,3}(?![A-Za-z0-9])')
+LINE_BREAK = TokenRule(u'linebreak', u"'line break'",
+                       ur'\r\n|\r|\n|<br\s*/?>')
+
+# The rules that are always checked
+DEFAULT_RULES = (VARIABLE, NUMBER)
+# Rules that can be added by name
+OPTIONAL_RULES = collections.OrderedDict(
+    (rule.name, rule) for rule in (SPAN, HTML, PLACEHOLDER, MARKDOWN,
+                                   LINE_BREAK)
+)
+
+
+def get_rules(names=None):
+    """Get the default rules plus optional rules by name
+
+    Args:
+        names (seq): Names of optional rules to add
+
+    Returns:
+        A tuple of TokenRule
+
+    Raises:
+        KeyError: If a name is not an optional rule
+    """
+    rules = list(DEFAULT_RULES)
+    for name in names or ():
+        rule = OPTIONAL_RULES[name]
+        if rule not in rules:
+            rules.append(rule)
+    return tuple(rules)
+
+
+class TokenScanner:
+    """Find the tokens of several rules in one scan of each string
+
+    Signatures are remembered for each distinct string, so repeated labels,
+    common in choice lists, are scanned only once.
+
+    Args:
+        rules (seq): The TokenRule objects to scan for, in order of priority
+    """
+
+    def __init__(self, rules=DEFAULT_RULES):
+        self.rules = tuple(rules)
+        self.regexes = {}
+        self.signatures = {}
+
+    def get_regex(self, skip):
+        """Compile the rules not in skip into one alternation"""
+        try:
+            return self.regexes[skip]
+        except KeyError:
+            parts = [u'(?P<r{}>{})'.format(i, rule.pattern) for i, rule in
+                     enumerate(self.rules) if i not in skip]
+            regex = re.compile(u'|'.join(parts)) if parts else None
+            self.regexes[skip] = regex
+            return regex
+
+    def signature(self, text):
+        """Get the tokens in a string
+
+        Args:
+            text (unicode): The string to scan
+
+        Returns:
+            A tuple with one sorted list of tokens for each rule
+        """
+        try:
+            return self.signatures[text]
+        except KeyError:
+            found = tuple([] for _ in self.rules)
+            self.scan(text, found, frozenset())
+            for tokens in found:
+                tokens.sort()
+            self.signatures[text] = found
+            return found
+
+    def scan(self, text, found, skip):
+        regex = self.get_regex(skip)
+        if regex is None:
+            return
+        for match in regex.finditer(text):
+            i = int(match.lastgroup[1:])
+            token = match.group()
+            found[i].append(token)
+            self.scan(token, found, skip | {i})
+
+    def mismatches(self, a, b):
+        """Describe the rules whose tokens differ between two signatures
+
+        Returns:
+            A tuple of rule descriptions, empty if the signatures agree
+        """
+        return tuple(rule.description for rule, x, y in
+                     zip(self.rules, a, b) if x != y)
@@ -0,0 +1,81 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2016 PMA2020
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Small helpers shared across qtools2 modules"""
+
+import os
+import os.path
+import tempfile
+
+
+class cached_property(object):
+    """Decorate a method to compute an attribute once, on first access
+
+    The result is stored in the instance ``__dict__`` under the method name,
+    which then shadows this descriptor. Delete the instance attribute to have
+    it computed again.
+    """
+
+    def __init__(self, func):
+        self.func = func
+        self.__name__ = func.__name__
+        self.__doc__ = func.__doc__
+
+    def __get__(self, obj, cls):
+        if obj is None:
+            return self
+        value = self.func(obj)
+        obj.__dict__[self.__name__] = value
+        return value
+
+
+def replace_file(src, dst):
+    """Move a new file over an old one without ever losing both
+
+    On POSIX, ``os.rename`` replaces dst in one step. On Windows it fails
+    if dst exists, so dst is first moved aside, moved back if the rename
+    fails, and deleted only once src is in its place.
+
+    Args:
+        src (str): The path of the new file, e.g. a finished temporary file
+        dst (str): The path to replace
+
+    Raises:
+        OSError: If src cannot be moved. dst is then unchanged.
+    """
+    if os.name != 'nt' or not os.path.exists(dst):
+        os.rename(src, dst)
+        return
+    directory = os.path.dirname(dst) or u'.'
+    fd, backup = tempfile.mkstemp(dir=directory, suffix=u'.bak')
+    os.close(fd)
+    os.remove(backup)
+    os.rename(dst, backup)
+    try:
+        os.rename(src, dst)
+    except OSError:
+        os.rename(backup, dst)
+        raise
+    try:
+        os.remove(backup)
+    except OSError:
+        pass
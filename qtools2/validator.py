@@ -0,0 +1,408 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2016 PMA2020
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Validate XForms with ODK Validate, optionally in one long-lived JVM
+
+``pmaxform.odk_validate.check_xform`` starts a new Java process for every
+form. JVM start-up and class loading cost seconds per form before any
+validation happens. A ``ValidatorService`` instead starts one Java process
+per session, running ``ValidateService.java`` next to this module, and
+streams XForm paths to it over a pipe.
+
+The service class is compiled with ``javac`` into ``~/.qtools2/validator``
+the first time it is needed. Without ``javac``, the Java 11+ source launcher
+is tried. The Java version is read once per session to choose how the
+service keeps ODK Validate from exiting the JVM: a SecurityManager up to
+Java 23, allowed explicitly on 18 to 23, and a direct call on 24 and later.
+If the service cannot start, or dies, a warning is printed and validation
+falls back to one process per form for the rest of the session.
+
+Results can also be kept in a ``cache.DiskCache``, keyed by a hash of the
+XForm bytes and of the ODK Validate jar, so that an XForm identical to one
+already validated is not validated again.
+"""
+
+import os
+import os.path
+import re
+import sys
+import atexit
+import hashlib
+import threading
+import subprocess
+from distutils.spawn import find_executable
+
+from pmaxform import odk_validate
+from pmaxform.odk_validate import ODKValidateError
+from pmaxform.odk_validate import ODK_VALIDATE_JAR
+
+from cache import hash_file
+
+
+SERVICE_SOURCE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                              u'ValidateService.java')
+SERVICE_CLASS = u'ValidateService'
+BUILD_DIR = os.path.join(os.path.expanduser(u'~'), u'.qtools2', u'validator')
+READY = 'READY'
+TIMEOUT = 100
+TIMEOUT_WARNING = u'XForm took to long to completely validate.'
+BAD_RETURN_WARNING = u'Bad return code from ODK Validate.'
+# How ValidateService.java keeps ODK Validate from exiting the JVM
+EXIT_TRAP = u'exit-trap'
+DIRECT = u'direct'
+# Java versions where the SecurityManager must be allowed on the command
+# line, and the first version where it cannot be used at all
+ALLOW_SECURITY_MANAGER = 18
+NO_SECURITY_MANAGER = 24
+ALLOW_SECURITY_MANAGER_OPTION = u'-Djava.security.manager=allow'
+SOURCE_LAUNCHER = 11
+JAVA_VERSION_RE = re.compile(r'version "(\d+)(?:\.(\d+))?')
+
+
+class ValidatorService:
+    """A long-lived ODK Validate process shared by all forms in a session
+
+    Calls to ``check_xform`` are serialized with a lock so that the service
+    can be shared among threads.
+
+    Args:
+        jar (str): The path to the ODK Validate jar
+        timeout (int): Seconds to allow for each form
+    """
+
+    def __init__(self, jar=ODK_VALIDATE_JAR, timeout=TIMEOUT):
+        self.jar = jar
+        self.timeout = timeout
+        self.process = None
+        self.failed = False
+        self.timed_out = False
+        # Why get_command found no command, for the fallback warning
+        self.problem = None
+        self.lock = threading.Lock()
+
+    def start(self):
+        """Start the Java process if it is not already running
+
+        Returns:
+            True if the service is running, False if it could not be started
+        """
+        if self.running():
+            return True
+        if self.failed:
+            return False
+        command = self.get_command()
+        if command is None:
+            self.fall_back(self.problem)
+            return False
+        try:
+            self.process = subprocess.Popen(command, stdin=subprocess.PIPE,
+                                            stdout=subprocess.PIPE,
+                                            stderr=open(os.devnull, 'wb'))
+            ready = self.process.stdout.readline().strip()
+        except (IOError, OSError):
+            ready = None
+        if ready != READY:
+            self.stop()
+            self.fall_back(u'it did not start')
+            return False
+        return True
+
+    def fall_back(self, reason):
+        """Stop using the service for this session, with a warning"""
+        self.failed = True
+        m = (u'### Warning: ODK Validate service stopped being used because '
+             u'{}. Validating with one Java process per form instead.')
+        print >> sys.stderr, m.format(reason)
+
+    def running(self):
+        return self.process is not None and self.process.poll() is None
+
+    def get_command(self):
+        """Build the command that runs the service, compiling if needed
+
+        Returns:
+            A list of command-line arguments, or None if the service cannot
+            run, with the reason in ``self.problem``
+        """
+        java = find_executable(u'java')
+        if java is None:
+            self.problem = u'Java was not found'
+            return None
+        version = java_version(java)
+        options, mode = self.get_exit_handling(version)
+        build_dir = self.compile()
+        if build_dir is not None:
+            classpath = os.pathsep.join((self.jar, build_dir))
+            return [java] + options + [u'-cp', classpath, SERVICE_CLASS,
+                                       mode]
+        if version is not None and version < SOURCE_LAUNCHER:
+            self.problem = (u'javac was not found and Java {} cannot run '
+                            u'source files'.format(version))
+            return None
+        # Java 11+ can run a single source file directly
+        return [java] + options + [u'-cp', self.jar, SERVICE_SOURCE, mode]
+
+    @staticmethod
+    def get_exit_handling(version):
+        """Choose how the service stops ODK Validate exiting the JVM
+
+        Args:
+            version (int): The Java feature version, or None if unknown
+
+        Returns:
+            A tuple (JVM options, service mode)
+        """
+        if version is None or version < ALLOW_SECURITY_MANAGER:
+            # The service itself switches to a direct call if the
+            # SecurityManager is refused
+            return [], EXIT_TRAP
+        elif version < NO_SECURITY_MANAGER:
+            return [ALLOW_SECURITY_MANAGER_OPTION], EXIT_TRAP
+        return [], DIRECT
+
+    def compile(self):
+        """Compile the service class, once per version of the source and jar
+
+        Returns:
+            The directory with the compiled class, or None if it cannot be
+            compiled
+        """
+        with open(SERVICE_SOURCE, 'rb') as f:
+            source = f.read()
+        digest = hashlib.sha1(source + self.jar.encode('utf-8')).hexdigest()
+        build_dir = os.path.join(BUILD_DIR, digest)
+        if os.path.exists(os.path.join(build_dir, SERVICE_CLASS + u'.class')):
+            return build_dir
+        javac = find_executable(u'javac')
+        if javac is None:
+            return None
+        try:
+            if not os.path.isdir(build_dir):
+                os.makedirs(build_dir)
+            with open(os.devnull, 'wb') as devnull:
+                returncode = subprocess.call([javac, u'-cp', self.jar, u'-d',
+                                              build_dir, SERVICE_SOURCE],
+                                             stdout=devnull, stderr=devnull)
+        except OSError:
+            return None
+        if returncode != 0:
+            return None
+        return build_dir
+
+    def stop(self):
+        """Stop the Java process if it is running"""
+        if self.process is not None:
+            try:
+                self.process.stdin.close()
+                if self.process.poll() is None:
+                    self.process.kill()
+                self.process.wait()
+            except (IOError, OSError):
+                pass
+            self.process = None
+
+    def check_xform(self, path):
+        """Validate an XForm, the same as ``odk_validate.check_xform``
+
+        Args:
+            path (str): The path to the XForm
+
+        Returns:
+            A list of warnings if the XForm is valid
+
+        Raises:
+            ODKValidateError: If the XForm is not valid
+            EnvironmentError: If Java is not found
+        """
+        with self.lock:
+            if self.start():
+                try:
+                    returncode, stderr = self.request(path)
+                except (IOError, OSError, ValueError):
+                    self.stop()
+                    if self.timed_out:
+                        self.timed_out = False
+                        return [TIMEOUT_WARNING]
+                    self.fall_back(u'it stopped responding')
+                else:
+                    return self.interpret(returncode, stderr)
+        return odk_validate.check_xform(path)
+
+    def request(self, path):
+        """Send one path to the service and read its reply
+
+        Returns:
+            A tuple (exit status, stderr bytes)
+
+        Raises:
+            IOError, OSError: If the pipe to the service breaks
+            ValueError: If the reply is malformed
+        """
+        self.timed_out = False
+        watchdog = threading.Timer(self.timeout, self.kill_for_timeout)
+        watchdog.start()
+        try:
+            line = os.path.abspath(path).encode('utf-8') + b'\n'
+            self.process.stdin.write(line)
+            self.process.stdin.flush()
+            header = self.process.stdout.readline().split()
+            returncode, size = int(header[0]), int(header[1])
+            stderr = self.process.stdout.read(size)
+            if len(stderr) != size:
+                raise ValueError(u'Incomplete reply from validator service')
+        except IndexError:
+            raise ValueError(u'Malformed reply from validator service')
+        finally:
+            watchdog.cancel()
+        return returncode, stderr
+
+    def kill_for_timeout(self):
+        self.timed_out = True
+        try:
+            self.process.kill()
+        except (AttributeError, OSError):
+            pass
+
+    @staticmethod
+    def interpret(returncode, stderr):
+        """Turn an exit status and stderr into warnings or an error
+
+        Mirrors the handling of the ODK Validate process in
+        ``odk_validate.check_xform``.
+        """
+        try:
+            stderr = stderr.decode('utf-8')
+        except UnicodeDecodeError:
+            stderr = stderr.decode('latin-1')
+        if returncode > 0:
+            raise ODKValidateError(u'ODK Validate Errors:\n' +
+                                   odk_validate._cleanup_errors(stderr))
+        elif returncode == 0:
+            if stderr:
+                return [u'ODK Validate Warnings:\n' + stderr]
+            return []
+        return [BAD_RETURN_WARNING]
+
+
+_service = None
+
+
+def get_service():
+    """Get the validator service for this session, creating it if needed"""
+    global _service
+    if _service is None:
+        _service = ValidatorService()
+        atexit.register(_service.stop)
+    return _service
+
+
+def check_xform(path, service=None, cache=None):
+    """Validate an XForm with the service if given, else a new process
+
+    If a cache is given, a result stored for the same XForm bytes and ODK
+    Validate jar is used instead, and a new result is stored. Timeouts and
+    bad return codes are not stored.
+
+    Args:
+        path (str): The path to the XForm
+        service (ValidatorService): The service to use, or None
+        cache (DiskCache): Where to look for and keep results, or None
+
+    Returns:
+        A list of warnings if the XForm is valid
+
+    Raises:
+        ODKValidateError: If the XForm is not valid
+    """
+    if cache is None:
+        return run_validator(path, service)
+    key = u'validate:{}:{}'.format(hash_file(path), validator_version())
+    result = cache.get(key)
+    if result is not None:
+        passed, messages = result
+        if not passed:
+            raise ODKValidateError(messages)
+        return list(messages)
+    try:
+        warnings = run_validator(path, service)
+    except ODKValidateError as e:
+        cache.put(key, (False, unicode(e)))
+        raise
+    if TIMEOUT_WARNING not in warnings and BAD_RETURN_WARNING not in warnings:
+        cache.put(key, (True, [unicode(w) for w in warnings]))
+    return warnings
+
+
+def run_validator(path, service=None):
+    if service is None:
+        return odk_validate.check_xform(path)
+    return service.check_xform(path)
+
+
+_java_versions = {}
+
+
+def java_version(java):
+    """Get the feature version of a Java executable, once per session
+
+    Args:
+        java (str): The path to the java executable
+
+    Returns:
+        The version as an int, e.g. 8 for "1.8.0_292" and 17 for "17.0.2",
+        or None if it cannot be read
+    """
+    if java not in _java_versions:
+        _java_versions[java] = read_java_version(java)
+    return _java_versions[java]
+
+
+def read_java_version(java):
+    try:
+        process = subprocess.Popen([java, u'-version'],
+                                   stdout=subprocess.PIPE,
+                                   stderr=subprocess.PIPE)
+        stdout, stderr = process.communicate()
+    except OSError:
+        return None
+    return parse_java_version(stderr + stdout)
+
+
+def parse_java_version(text):
+    """Find the feature version in the output of ``java -version``"""
+    found = JAVA_VERSION_RE.search(text)
+    if found is None:
+        return None
+    major, minor = found.groups()
+    if major == '1' and minor is not None:
+        return int(minor)
+    return int(major)
+
+
+_versions = {}
+
+
+def validator_version(jar=ODK_VALIDATE_JAR):
+    """Get a hash of the ODK Validate jar, computed once per session"""
+    if jar not in _versions:
+        _versions[jar] = hash_file(jar)
+    return _versions[jar]
@@ -0,0 +1,168 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2016 PMA2020
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Convert XLSForms again every time they are saved
+
+Watch mode polls the given files, and the XLSForms in the given directories,
+for changes in modification time or size. Excel writes a workbook in several
+steps when saving, so a change only triggers a conversion once the files
+have stopped changing for a moment.
+
+All runs share one process, so pmaxform stays imported, parsed workbooks are
+kept in memory, and ODK Validate runs in one long-lived service. Conversions
+are incremental: only forms that changed are converted again, though linking
+checks cover all of them.
+"""
+
+import os
+import os.path
+import time
+import datetime
+import traceback
+
+import constants
+from cache import MemoryCache
+from convert import xlsform_convert
+from errors import ConvertError
+from errors import XformError
+from errors import XlsformError
+
+
+POLL_INTERVAL = 0.5
+SETTLE_TIME = 1.0
+XLSFORM_EXTS = (u'.xlsx', u'.xls')
+# Excel's lock file for an open workbook
+LOCK_PREFIX = u'~$'
+
+
+def watch(paths, interval=POLL_INTERVAL, settle=SETTLE_TIME, runs=None,
+          **kwargs):
+    """Convert the XLSForms now and again after every change
+
+    Runs until interrupted with Ctrl-C.
+
+    Args:
+        paths (list): XLSForm files and directories with XLSForms
+        interval (float): Seconds between checks for changes
+        settle (float): Seconds files must stay unchanged before converting
+        runs (int): Stop after this many conversions. Default is no limit.
+        **kwargs: Options for ``convert.xlsform_convert``
+    """
+    kwargs = dict(kwargs)
+    kwargs[constants.INCREMENTAL] = True
+    kwargs.setdefault(constants.VALIDATE_SERVICE, True)
+    if kwargs.get(constants.CACHE, True):
+        kwargs[constants.CACHE] = MemoryCache()
+    count = 0
+    previous = None
+    try:
+        while runs is None or count < runs:
+            current = snapshot(expand_paths(paths))
+            if current == previous:
+                time.sleep(interval)
+                continue
+            if previous is not None:
+                current = wait_until_settled(paths, current, settle)
+            previous = current
+            run_once(sorted(current), kwargs)
+            count += 1
+    except KeyboardInterrupt:
+        print u'*** Stopped watching'
+
+
+def run_once(xlsxfiles, kwargs):
+    """Convert once, reporting every error so that watching goes on
+
+    Args:
+        xlsxfiles (list): The XLSForms to convert
+        kwargs (dict): Options for ``convert.xlsform_convert``
+    """
+    stamp = datetime.datetime.now().strftime(u'%H:%M:%S')
+    header = u' {} converting {} file(s) '.format(stamp, len(xlsxfiles))
+    print header.center(50, u'-')
+    if not xlsxfiles:
+        print u'*** No XLSForms found'
+        return
+    try:
+        xlsform_convert(xlsxfiles, **kwargs)
+    except (ConvertError, XformError, XlsformError) as e:
+        print unicode(e)
+    except OSError as e:
+        print e
+    except Exception as e:
+        print u'### Unexpected error: %s' % repr(e)
+        traceback.print_exc()
+    print u'*** Watching for changes. Press Ctrl-C to stop.'
+
+
+def expand_paths(paths):
+    """List the XLSForms named by files and directories
+
+    Args:
+        paths (list): Paths to XLSForms or directories
+
+    Returns:
+        A list of file paths. Directories contribute the XLSForms directly
+        inside them, but not Excel lock files. Named files that do not exist
+        at the moment are left out.
+    """
+    found = []
+    for path in paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                is_xlsform = name.lower().endswith(XLSFORM_EXTS)
+                if is_xlsform and not name.startswith(LOCK_PREFIX):
+                    found.append(os.path.join(path, name))
+        elif os.path.isfile(path):
+            found.append(path)
+    return found
+
+
+def snapshot(files):
+    """Get the modification time and size of each file that exists"""
+    stats = {}
+    for path in files:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        stats[path] = (stat.st_mtime, stat.st_size)
+    return stats
+
+
+def wait_until_settled(paths, current, settle):
+    """Wait until the files stop changing
+
+    Args:
+        paths (list): The watched files and directories
+        current (dict): The latest snapshot
+        settle (float): Seconds the files must stay unchanged
+
+    Returns:
+        The snapshot once it has stayed the same for settle seconds
+    """
+    while True:
+        time.sleep(settle)
+        again = snapshot(expand_paths(paths))
+        if again == current:
+            return again
+        current = again
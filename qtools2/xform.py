@@ -20,15 +20,91 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
+import os
 import os.path
+import re
+import shutil
+import tempfile
+import StringIO
 import xml.etree.ElementTree as ElementTree
 
 import constants
 from errors import XformError
+from utils import cached_property
+from utils import replace_file
 from __init__ import __version__ as VERSION
 
 
+# An xpath made only of plain element names, e.g. "/HHQ/grp/name". Anything
+# else is left to ElementTree to interpret.
+SIMPLE_XPATH = re.compile(r'^(?:/[^/\[\]()@=\s*:.]+){2,}$')
+
+
+def get_substitutions():
+    """Get the text replacements that ``make_edits`` applies to an XForm
+
+    Returns:
+        A dictionary {old: new}
+    """
+    substitutions = {fluff: "" for fluff in constants.placeholders}
+    substitutions["&amp;#x"] = "&#x"
+    return substitutions
+
+
+def compile_substitutions(substitutions):
+    """Compile replacements into one regex and a function for re.sub
+
+    Longer strings are tried first, so one string that contains another is
+    replaced whole.
+
+    Args:
+        substitutions (dict): {old: new}
+
+    Returns:
+        A tuple (regex, repl) to use as ``regex.sub(repl, text)``
+    """
+    ordered = sorted(substitutions, key=len, reverse=True)
+    regex = re.compile('|'.join(re.escape(old) for old in ordered))
+
+    def repl(match):
+        return substitutions[match.group()]
+    return regex, repl
+
+
+def stream_edits(src, dst, substitutions, stamp=None, stamp_line_number=1):
+    """Copy a file line by line, making every substitution in one pass
+
+    Args:
+        src: A file-like object to read
+        dst: A file-like object to write
+        substitutions (dict): {old: new} strings to replace
+        stamp (str): A line to insert, or None
+        stamp_line_number (int): The index of the inserted line
+    """
+    regex, repl = compile_substitutions(substitutions)
+    i = 0
+    for i, line in enumerate(src):
+        if i == stamp_line_number and stamp is not None:
+            dst.write(stamp)
+        dst.write(regex.sub(repl, line))
+    if i < stamp_line_number and stamp is not None:
+        # Too few lines to reach the stamp line
+        dst.write(stamp)
+
+
 class Xform:
+    """An XForm file, to be edited and checked for linking
+
+    ``make_edits`` streams the file through all edits at once and replaces it
+    without reading it into memory. The single edit methods instead work on
+    ``data``, the lines of the file, which are read when first needed and
+    written back with ``overwrite``.
+
+    The XML is parsed the first time the tree or the instance is needed and
+    then kept, along with an index of the binds by nodeset and the set of
+    paths in the instance. The edits drop all of these so that they are built
+    again from the edited text.
+    """
 
     def __init__(self, xlsform=None, filename=None, form_id=None):
         if xlsform is not None:
@@ -39,17 +115,71 @@ class Xform:
             short_filename = os.path.split(self.filename)[1]
             short_name = os.path.splitext(short_filename)[0]
             self.form_id = short_name if form_id is None else form_id
-        self.data = []
+
+    @classmethod
+    def from_text(cls, xlsform, xml_text):
+        """Edit newly generated XML in memory, then write it out once
+
+        The same edits as ``make_edits`` are made. The edited lines are kept
+        in ``data`` for the linking checks, so the file is not read back.
+
+        Args:
+            xlsform (Xlsform): The XLSForm the XML was generated from
+            xml_text (unicode): The XML from pmaxform
+
+        Returns:
+            An Xform for the file written to ``xlsform.outpath``
+        """
+        xform = cls(xlsform)
+        xform.data = cls.edit_text(xml_text)
+        xform.overwrite()
+        return xform
+
+    @staticmethod
+    def edit_text(xml_text):
+        """Make the ``make_edits`` edits to XML in memory
+
+        Args:
+            xml_text (unicode): The XML from pmaxform
+
+        Returns:
+            A list of the edited lines, UTF-8 encoded
+        """
+        src = StringIO.StringIO(xml_text.encode('utf-8'))
+        dst = StringIO.StringIO()
+        stream_edits(src, dst, get_substitutions(), Xform.version_stamp())
+        dst.seek(0)
+        return list(dst)
+
+    @cached_property
+    def data(self):
         with open(self.filename) as f:
-            self.data = list(f)
+            return list(f)
 
     def make_edits(self):
-        self.newline_fix()
-        self.remove_placeholders()
-        self.inject_version()
+        """Fix newlines, remove placeholders, and stamp the version in place
+
+        The edited XForm is written to a temporary file that then replaces
+        the original (see ``utils.replace_file``). If anything fails, the
+        original is left as it was.
+        """
+        directory = os.path.dirname(self.filename)
+        fd, tmp = tempfile.mkstemp(dir=directory or u'.', suffix=u'.tmp')
+        try:
+            with open(self.filename) as src, os.fdopen(fd, 'w') as dst:
+                stream_edits(src, dst, get_substitutions(),
+                             self.version_stamp())
+            shutil.copymode(self.filename, tmp)
+            replace_file(tmp, self.filename)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        self.__dict__.pop('data', None)
+        self.clear_parsed()
 
     def newline_fix(self):
         self.data = [line.replace("&amp;#x", "&#x") for line in self.data]
+        self.clear_parsed()
 
     def remove_placeholders(self):
         new_data = []
@@ -58,39 +188,68 @@ class Xform:
                 line = line.replace(fluff, "")
             new_data.append(line)
         self.data = new_data
+        self.clear_parsed()
 
     def inject_version(self):
-        version_stamp = '<!-- qtools2 v{} -->\n'.format(VERSION)
         stamp_line_number = 1
-        self.data.insert(stamp_line_number, version_stamp)
+        self.data.insert(stamp_line_number, self.version_stamp())
+        self.clear_parsed()
+
+    @staticmethod
+    def version_stamp():
+        return '<!-- qtools2 v{} -->\n'.format(VERSION)
 
     def overwrite(self):
         with open(self.filename, 'w') as f:
             f.writelines(self.data)
 
-    def get_xml_root(self):
-        xml_text = ''.join(self.data)
-        xml_root = ElementTree.fromstring(xml_text)
-        return xml_root
+    def clear_parsed(self):
+        """Forget the parsed tree after self.data changes"""
+        for attr in ('xml_root', 'instance_xml', 'bind_index',
+                     'relevant_memo', 'instance_paths'):
+            self.__dict__.pop(attr, None)
 
-    def get_instance_xml(self):
-        xml_text = ''.join(self.data)
-        root = ElementTree.fromstring(xml_text)
+    @cached_property
+    def xml_root(self):
+        if 'data' in self.__dict__:
+            xml_text = ''.join(self.data)
+            return ElementTree.fromstring(xml_text)
+        return ElementTree.parse(self.filename).getroot()
+
+    @cached_property
+    def instance_xml(self):
         query = ".//*[@id='{}']".format(self.form_id)
-        instance_xml = root.find(query)
+        instance_xml = self.xml_root.find(query)
         if instance_xml is None:
             m = u'Unable to locate XML instance in "{}".'.format(self.filename)
             m += u' Please confirm instance ID in settings tab.'
             raise XformError(m)
         return instance_xml
 
+    @cached_property
+    def bind_index(self):
+        return self.index_binds(self.xml_root)
+
+    @cached_property
+    def relevant_memo(self):
+        return {}
+
+    @cached_property
+    def instance_paths(self):
+        return self.index_paths(self.instance_xml)
+
+    def get_xml_root(self):
+        return self.xml_root
+
+    def get_instance_xml(self):
+        return self.instance_xml
+
     def discover_all(self, xpaths):
         outcomes = []
         msg = []
         xml_root = self.get_xml_root()
-        instance = self.get_instance_xml()
         for xpath in xpaths:
-            discovered = self.discover_xpath(xpath, instance)
+            discovered = self.discover(xpath)
             outcomes.append(discovered)
             if discovered:
                 try:
@@ -110,10 +269,22 @@ class Xform:
         self.check_bind_relevant(xpath, xml_root)
         self.check_bind_calculate(xpath, xml_root)
 
+    def get_bind_index(self, xml_root):
+        """Get the nodeset to bind attributes index for xml_root
+
+        Returns:
+            A tuple (binds, memo). memo is for ``first_relevant`` and is kept
+            between calls only for this Xform's own tree.
+        """
+        if xml_root is self.xml_root:
+            return self.bind_index, self.relevant_memo
+        return self.index_binds(xml_root), {}
+
     def check_bind_calculate(self, xpath, xml_root):
-        this_bind = self.xpath_query(xpath, xml_root)
+        binds = self.get_bind_index(xml_root)[0]
+        this_bind = binds.get(xpath)
         if this_bind is not None:
-            has_calculate = 'calculate' in this_bind.attrib
+            has_calculate = 'calculate' in this_bind
             if has_calculate:
                 m = (u'In form_id "{}", linked xpath "{}" also defines a '
                      u'calculation.')
@@ -127,28 +298,80 @@ class Xform:
 
     def check_bind_relevant(self, xpath, xml_root):
         # Must check ancestors (containing groups)
+        binds, memo = self.get_bind_index(xml_root)
         xpath_split = xpath.split("/")
-        for i in (j+1 for j in range(2, len(xpath_split))):
-            xpath_to_check = "/".join(xpath_split[:i])
-            this_bind = self.xpath_query(xpath_to_check, xml_root)
-            if this_bind is not None:
-                has_relevant = 'relevant' in this_bind.attrib
-                if has_relevant and xpath_to_check == xpath:
-                    m = (u'In form_id "{}", linked xpath "{}" also defines a '
-                         u'relevant.')
-                    m = m.format(self.form_id, xpath)
-                    raise XformError(m)
-                elif has_relevant:  # and xpath_to_check != xpath:
-                    m = (u'In form_id "{}", ancestor xpath "{}" of linked '
-                         u'xpath "{}" also defines a relevant.')
-                    m = m.format(self.form_id, xpath_to_check, xpath)
-                    raise XformError(m)
-            elif xpath_to_check == xpath:  # and this_bind is None:
-                # should never happen
-                m = (u'In form_id "{}", valid xpath "{}" has no associated '
-                     u'<bind>')
-                m = m.format(self.form_id, xpath)
-                raise XformError(m)
+        if len(xpath_split) < 3:
+            return
+        parent = "/".join(xpath_split[:-1])
+        ancestor = self.first_relevant(parent, binds, memo)
+        if ancestor is not None:
+            m = (u'In form_id "{}", ancestor xpath "{}" of linked '
+                 u'xpath "{}" also defines a relevant.')
+            m = m.format(self.form_id, ancestor, xpath)
+            raise XformError(m)
+        this_bind = binds.get(xpath)
+        if this_bind is None:
+            # should never happen
+            m = (u'In form_id "{}", valid xpath "{}" has no associated '
+                 u'<bind>')
+            m = m.format(self.form_id, xpath)
+            raise XformError(m)
+        elif 'relevant' in this_bind:
+            m = (u'In form_id "{}", linked xpath "{}" also defines a '
+                 u'relevant.')
+            m = m.format(self.form_id, xpath)
+            raise XformError(m)
+
+    @staticmethod
+    def first_relevant(xpath, binds, memo):
+        """Find the outermost bind with a relevant at or above an xpath
+
+        Sibling xpaths share ancestors, so answers are kept in memo.
+
+        Args:
+            xpath (str): The xpath to start from, e.g. "/HHQ/grp"
+            binds (dict): Bind attributes by nodeset, from ``index_binds``
+            memo (dict): Answers from earlier calls with the same binds
+
+        Returns:
+            The xpath of the outermost bind that defines a relevant, not
+            counting the root, or None if there is none
+        """
+        try:
+            return memo[xpath]
+        except KeyError:
+            pass
+        xpath_split = xpath.split("/")
+        found = None
+        if len(xpath_split) > 3:
+            parent = "/".join(xpath_split[:-1])
+            found = Xform.first_relevant(parent, binds, memo)
+        if found is None and len(xpath_split) > 2:
+            this_bind = binds.get(xpath)
+            if this_bind is not None and 'relevant' in this_bind:
+                found = xpath
+        memo[xpath] = found
+        return found
+
+    @staticmethod
+    def index_binds(xml_root):
+        """Map each bind nodeset to its attributes in one pass
+
+        Args:
+            xml_root: The root Element of the XForm
+
+        Returns:
+            A dictionary {nodeset: attrib}. If a nodeset has more than one
+            bind, the first in document order is kept.
+        """
+        ns_key = constants.xml_ns.keys()[0]
+        query = ".//{}:bind".format(ns_key)
+        binds = {}
+        for bind in xml_root.iterfind(query, constants.xml_ns):
+            nodeset = bind.get('nodeset')
+            if nodeset is not None:
+                binds.setdefault(nodeset, bind.attrib)
+        return binds
 
     @staticmethod
     def xpath_query(xpath, xml_root):
@@ -157,6 +380,46 @@ class Xform:
         found = xml_root.find(query, constants.xml_ns)
         return found
 
+    def discover(self, xpath):
+        """Check whether an xpath is in this XForm's instance
+
+        Plain paths are looked up in ``instance_paths``. Others, e.g. with
+        predicates, are searched for in the instance with ElementTree.
+        """
+        if SIMPLE_XPATH.match(xpath):
+            return xpath in self.instance_paths
+        return self.discover_xpath(xpath, self.instance_xml)
+
+    @staticmethod
+    def index_paths(instance):
+        """Collect the xpath of every element in an instance in one pass
+
+        Only elements in the XForms namespace are included, as only those
+        can be found by ``discover_xpath``.
+
+        Args:
+            instance: The instance Element
+
+        Returns:
+            A set of xpaths, e.g. {"/HHQ/grp", "/HHQ/grp/name"}, without the
+            path of the instance itself
+        """
+        ns_key = constants.xml_ns.keys()[0]
+        prefix = '{{{}}}'.format(constants.xml_ns[ns_key])
+        paths = set()
+        if not instance.tag.startswith(prefix):
+            return paths
+        stack = [('/' + instance.tag[len(prefix):], instance)]
+        while stack:
+            path, element = stack.pop()
+            for child in element:
+                tag = child.tag
+                if isinstance(tag, basestring) and tag.startswith(prefix):
+                    child_path = path + '/' + tag[len(prefix):]
+                    paths.add(child_path)
+                    stack.append((child_path, child))
+        return paths
+
     @staticmethod
     def discover_xpath(xpath, instance):
         result = False
@@ -28,12 +28,26 @@ import re
 import shutil
 import itertools
 import collections
+import zipfile
+import csv
+import StringIO
 
 import xlrd
+from pmaxform import builder
+from pmaxform.xls2json import workbook_to_json
 from pmaxform.xls2xform import xls2xform_convert
+from pmaxform.utils import has_external_choices
 
 import constants
+import profiling
 from errors import XlsformError
+from sheetindex import SheetIndex
+from tokenrules import TokenScanner
+from tokenrules import DEFAULT_RULES
+from utils import cached_property
+from validator import check_xform
+from xform import Xform
+from xlsxreader import read_sheet_index
 
 
 class Xlsform:
@@ -43,8 +57,24 @@ class Xlsform:
     and final paths for output should be. Performs checks that if failed, halt
     processing and raise an exception. Checks for conflicts with pre-existing
     files.
+
+    Checks that only produce warnings (the "extras") are computed the first
+    time their attribute is read and then kept.
+
+    If a ``cache.DiskCache`` is given, the sheets read from the file are
+    stored there and reused the next time the same file contents are seen.
+    If the contents of the workbook are given, the file is not read at all,
+    and path is used only for names and messages.
+
+    The token rules that translations are checked against can be set with
+    ``translation_rules`` before the translation checks are first read.
     """
-    def __init__(self, path, outpath=None, suffix=None, pma=True):
+
+    # A sequence of tokenrules.TokenRule, or None for the default rules
+    translation_rules = None
+
+    def __init__(self, path, outpath=None, suffix=None, pma=True,
+                 cache=None, contents=None):
         self.path = path
         self.base_dir, self.short_file = os.path.split(self.path)
         self.short_name, self.ext = os.path.splitext(self.short_file)
@@ -54,60 +84,260 @@ class Xlsform:
             self.outpath = outpath
         self.media_dir = self.get_media_dir(self.outpath)
 
-        wb = self.get_workbook()
+        self.contents = contents
+        with profiling.span(profiling.READ_WORKBOOK, path):
+            self.index = self.get_index(cache)
+        # The edited XForm, once converted
+        self.xform = None
 
         # Survey
-        self.save_instance = self.filter_column(wb, constants.SURVEY,
-                                                constants.SAVE_INSTANCE)
-        self.save_form = self.filter_column(wb, constants.SURVEY,
-                                            constants.SAVE_FORM)
-        self.delete_form = self.filter_column(wb, constants.SURVEY,
-                                              constants.DELETE_FORM)
-        self.linking_consistency(self.path, self.save_instance, self.save_form)
-        self.survey_blanks = self.undefined_cols(wb, constants.SURVEY)
-        self.unused_lists = self.find_unused_lists(wb)
-
-        # Choices
-        self.choices_blanks = self.undefined_cols(wb, constants.CHOICES)
-        self.choices_multiple = self.find_multiple_lists(wb, constants.CHOICES)
-        self.name_dups = self.find_name_dups(wb, constants.CHOICES)
-        self.choices_ascii = self.find_non_ascii(wb, constants.CHOICES)
+        with profiling.span(profiling.check_phase(u'linking'), path):
+            self.save_instance = self.filter_column(
+                self.index, constants.SURVEY, constants.SAVE_INSTANCE)
+            self.save_form = self.filter_column(
+                self.index, constants.SURVEY, constants.SAVE_FORM)
+            self.delete_form = self.filter_column(
+                self.index, constants.SURVEY, constants.DELETE_FORM)
+            self.linking_consistency(self.path, self.save_instance,
+                                     self.save_form)
 
         # External choices
-        self.external_choices_consistency(self.path, wb)
-        self.external_blanks = self.undefined_cols(wb,
-                constants.EXTERNAL_CHOICES)
-        self.external_multiple = self.find_multiple_lists(wb,
-                constants.EXTERNAL_CHOICES)
-        self.external_dups = self.find_name_dups(wb,
-                constants.EXTERNAL_CHOICES)
-        self.external_ascii = self.find_non_ascii(wb,
-                constants.EXTERNAL_CHOICES)
+        with profiling.span(profiling.check_phase(u'external_choices'), path):
+            self.external_choices_consistency(self.path, self.index)
 
         # Settings
-        self.settings = self.get_settings(wb)
-        self.form_id = self.get_form_id(pma)
-        self.form_title = self.get_form_title(pma)
-        self.xml_root = self.get_xml_root(pma)
-        self.settings_blanks = self.undefined_cols(wb, constants.SETTINGS)
-
-        # Language
-        self.language_consistency = self.check_languages(wb)
-        self.missing_translations = self.find_missing_translations(wb,
-                self.language_consistency)
-        self.regex_tranlsations = self.find_by_regex_translations(wb,
-                self.language_consistency)
+        with profiling.span(profiling.check_phase(u'settings'), path):
+            self.settings = self.get_settings(self.index)
+            self.form_id = self.get_form_id(pma)
+            self.form_title = self.get_form_title(pma)
+            self.xml_root = self.get_xml_root(pma)
+
+    # Survey
+    @cached_property
+    def survey_blanks(self):
+        return self.undefined_cols(self.index, constants.SURVEY)
+
+    @cached_property
+    def unused_lists(self):
+        return self.find_unused_lists(self.index)
+
+    # Choices
+    @cached_property
+    def choices_blanks(self):
+        return self.undefined_cols(self.index, constants.CHOICES)
+
+    @cached_property
+    def choices_multiple(self):
+        return self.find_multiple_lists(self.index, constants.CHOICES)
+
+    @cached_property
+    def name_dups(self):
+        return self.find_name_dups(self.index, constants.CHOICES)
+
+    @cached_property
+    def choices_ascii(self):
+        return self.find_non_ascii(self.index, constants.CHOICES)
+
+    # External choices
+    @cached_property
+    def external_blanks(self):
+        return self.undefined_cols(self.index, constants.EXTERNAL_CHOICES)
+
+    @cached_property
+    def external_multiple(self):
+        return self.find_multiple_lists(self.index, constants.EXTERNAL_CHOICES)
+
+    @cached_property
+    def external_dups(self):
+        return self.find_name_dups(self.index, constants.EXTERNAL_CHOICES)
+
+    @cached_property
+    def external_ascii(self):
+        return self.find_non_ascii(self.index, constants.EXTERNAL_CHOICES)
+
+    # Settings
+    @cached_property
+    def settings_blanks(self):
+        return self.undefined_cols(self.index, constants.SETTINGS)
+
+    # Language
+    @cached_property
+    def language_consistency(self):
+        return self.check_languages(self.index)
+
+    @cached_property
+    def translation_report(self):
+        return self.analyze_translations(self.index,
+                                         self.language_consistency,
+                                         self.translation_rules)
+
+    @cached_property
+    def missing_translations(self):
+        return self.translation_report[0]
+
+    @cached_property
+    def regex_tranlsations(self):
+        return self.translation_report[1]
+
+    def get_index(self, cache=None):
+        """Get the XLSForm tabs of the workbook as a SheetIndex
+
+        Args:
+            cache (DiskCache): If not None, where to look for the index
+                before reading the file, and where to store it after. Not
+                used when the workbook contents were given.
+
+        Returns:
+            A SheetIndex
+        """
+        if cache is None or self.contents is not None:
+            return self.read_index()
+        try:
+            key = u'index:{}'.format(cache.file_key(self.path))
+        except (IOError, OSError):
+            # Let the reader report the problem
+            return self.read_index()
+        record = cache.get(key)
+        if record is not None:
+            return SheetIndex.from_record(record)
+        index = self.read_index()
+        cache.put(key, index.to_record())
+        return index
+
+    def read_index(self):
+        """Read the XLSForm tabs of the workbook into a SheetIndex
+
+        An .xlsx file is streamed by ``xlsxreader``, which skips the sheets
+        that qtools2 does not use. Other files, and .xlsx files that the
+        streaming reader cannot make sense of, are opened with ``xlrd``.
+        """
+        if self.ext.lower() == constants.XLSX_EXT:
+            try:
+                return read_sheet_index(self.open_source())
+            except (zipfile.BadZipfile, KeyError, SyntaxError, ValueError):
+                # Let xlrd have a go and report the problem
+                pass
+        return SheetIndex.from_workbook(self.get_workbook())
 
     def get_workbook(self):
         # IO Error if not existing
         # Perhaps catch xlrd.XLRDError and throw XlsformError?
+        if self.contents is not None:
+            return xlrd.open_workbook(file_contents=self.contents)
         wb = xlrd.open_workbook(self.path)
         return wb
 
-    def xlsform_convert(self, validate=True):
-        msg = xls2xform_convert(self.path, self.outpath, validate=validate)
-        self.assert_itemsets_moved()
-        return msg
+    def open_source(self):
+        """Get the path to read, or a file-like object for the contents"""
+        if self.contents is not None:
+            return StringIO.StringIO(self.contents)
+        return self.path
+
+    def xlsform_convert(self, validate=True, service=None, cache=None):
+        """Convert to XML from the sheets already read for the checks
+
+        The workbook dictionary is built from ``self.index`` and handed to the
+        pmaxform survey builder, so the file is not parsed again. The XML is
+        edited in memory (see ``Xform``) and written once, before validation.
+        The result is kept in ``self.xform``.
+
+        If the workbook has sheets that pmaxform reads but the index does not
+        hold, pmaxform converts from the file instead, and the file is then
+        edited in place.
+
+        Args:
+            validate (bool): Whether to run ODK Validate
+            service (ValidatorService): A long-lived ODK Validate process to
+                use, or None to start one process for this form
+            cache (DiskCache): Where to look for and keep ODK Validate
+                results, or None to always validate
+
+        Returns:
+            A list of warnings from pmaxform
+        """
+        if self.index.unindexed(constants.PYXFORM_SHEETS):
+            with profiling.span(profiling.PYXFORM, self.path):
+                warnings = xls2xform_convert(self.path, self.outpath,
+                                             validate=False)
+                self.assert_itemsets_moved()
+            with profiling.span(profiling.EDIT_XFORM, self.path):
+                self.xform = Xform(self)
+                self.xform.make_edits()
+            if validate:
+                with profiling.span(profiling.VALIDATE, self.path):
+                    warnings.extend(check_xform(self.outpath, service, cache))
+            return warnings
+        warnings = []
+        with profiling.span(profiling.PYXFORM, self.path):
+            json_survey, survey = self.build_survey(warnings)
+            xml_text = survey._to_pretty_xml()
+        with profiling.span(profiling.EDIT_XFORM, self.path):
+            self.xform = Xform.from_text(self, xml_text)
+        if validate:
+            with profiling.span(profiling.VALIDATE, self.path):
+                warnings.extend(check_xform(self.outpath, service, cache))
+        if has_external_choices(json_survey):
+            if not self.write_itemsets():
+                warnings.append(u'Could not export itemsets.csv, perhaps the '
+                                u'external choices sheet is missing.')
+        return warnings
+
+    def build_survey(self, warnings, workbook_dict=None):
+        """Build the pmaxform survey for this XLSForm
+
+        Args:
+            warnings (list): Where pmaxform adds its warnings
+            workbook_dict (dict): The workbook as pmaxform reads it, by
+                default built from ``self.index``
+
+        Returns:
+            A tuple (json_survey, survey) of the pmaxform JSON dictionary and
+            the Survey built from it
+        """
+        if workbook_dict is None:
+            workbook_dict = self.index.to_workbook_dict()
+        json_survey = workbook_to_json(workbook_dict, self.short_name,
+                                       u'default', warnings)
+        survey = builder.create_survey_element_from_dict(json_survey)
+        return json_survey, survey
+
+    def write_itemsets(self):
+        """Write the external_choices tab to itemsets.csv in the media folder
+
+        Returns:
+            True if the file is written, False if there is no external_choices
+            tab or it has no rows after the header
+        """
+        if not self.has_itemsets():
+            return False
+        if not os.path.exists(self.media_dir):
+            os.mkdir(self.media_dir)
+        itemsets = os.path.join(self.media_dir, constants.ITEMSETS)
+        with open(itemsets, 'wb') as f:
+            self.itemsets_to_csv(f)
+        return True
+
+    def has_itemsets(self):
+        """Check for an external_choices tab with rows after the header"""
+        try:
+            sheet = self.index.sheet_by_name(constants.EXTERNAL_CHOICES)
+        except xlrd.XLRDError:
+            return False
+        return sheet.nrows >= 2
+
+    def itemsets_to_csv(self, f):
+        """Write the external_choices tab as CSV to a file-like object
+
+        Writes the same as ``pmaxform.utils.sheet_to_csv``: every value
+        quoted, columns without a header dropped.
+        """
+        sheet = self.index.sheet_by_name(constants.EXTERNAL_CHOICES)
+        mask = [bool(h and h.strip()) for h in sheet.headers]
+        writer = csv.writer(f, quoting=csv.QUOTE_ALL)
+        for rowx in xrange(sheet.nrows):
+            row = sheet.row_values(rowx)
+            writer.writerow([v.encode('utf-8') if isinstance(v, unicode)
+                             else v for v, m in zip(row, mask) if m])
 
     def assert_itemsets_moved(self):
         base_dir = os.path.split(self.outpath)[0]
@@ -128,27 +358,20 @@ class Xlsform:
     def filter_column(wb, sheet, header):
         found = []
         try:
-            survey = wb.sheet_by_name(sheet)
-            full_column = Xlsform.get_column(survey, header)
+            survey = SheetIndex.wrap(wb).sheet_by_name(sheet)
+            full_column = survey.column(header)
             found = filter(None, full_column)
         except (xlrd.XLRDError, IndexError, ValueError):
             # No survey found, nothing in survey, header not found
             pass
         return found
 
-    @staticmethod
-    def get_column(sheet, header):
-        headers = sheet.row_values(0)
-        col = headers.index(header)
-        col_values = sheet.col_values(col)
-        return [unicode(val) for val in col_values]
-
     @staticmethod
     def find_multiple_lists(wb, sheetname):
         """Find list_names that are defined in multiple places
 
         Args:
-            wb: An `xlrd` Book instance
+            wb: An `xlrd` Book or SheetIndex instance
             sheetname (str): The name of the sheet to search for
 
         Returns:
@@ -158,8 +381,8 @@ class Xlsform:
         """
         dups = []
         try:
-            choices = wb.sheet_by_name(sheetname)
-            lists = Xlsform.get_column(choices, constants.LIST_NAME)
+            choices = SheetIndex.wrap(wb).sheet_by_name(sheetname)
+            lists = choices.column(constants.LIST_NAME)
             current_list = None
             found = set()
 
@@ -191,7 +414,7 @@ class Xlsform:
         Returns empty if either "list_name" or "name" is missing.
 
         Args:
-            wb: An `xlrd` Book instance
+            wb: An `xlrd` Book or SheetIndex instance
             sheetname (str): The name of the sheet to search for
 
         Return:
@@ -200,9 +423,9 @@ class Xlsform:
         """
         dups = []
         try:
-            choices = wb.sheet_by_name(sheetname)
-            lists = Xlsform.get_column(choices, constants.LIST_NAME)
-            names = Xlsform.get_column(choices, constants.NAME)
+            choices = SheetIndex.wrap(wb).sheet_by_name(sheetname)
+            lists = choices.column(constants.LIST_NAME)
+            names = choices.column(constants.NAME)
             d = {}
             for i, tup in enumerate(zip(lists, names)):
                 if i == 0:
@@ -228,18 +451,19 @@ class Xlsform:
         """Get the names of unused lists
 
         Args:
-            wb: An `xlrd` Book instance
+            wb: An `xlrd` Book or SheetIndex instance
 
         Return:
             A dictionary with keys 'choices' and 'external_choices' and
             values as the (str) list names that are unused. Keys exist only
             if missing list names are found.
         """
+        index = SheetIndex.wrap(wb)
         d = {}
         choice_lists = set()
         try:
-            choices = wb.sheet_by_name(constants.CHOICES)
-            lists = Xlsform.get_column(choices, constants.LIST_NAME)[1:]
+            choices = index.sheet_by_name(constants.CHOICES)
+            lists = choices.column(constants.LIST_NAME)[1:]
             choice_lists = set(filter(None, lists))
         except (xlrd.XLRDError, ValueError, IndexError):
             # sheet not found, list_name not found, not more than first row
@@ -247,16 +471,16 @@ class Xlsform:
 
         external_lists = set()
         try:
-            external = wb.sheet_by_name(constants.EXTERNAL_CHOICES)
-            lists = Xlsform.get_column(external, constants.LIST_NAME)[1:]
+            external = index.sheet_by_name(constants.EXTERNAL_CHOICES)
+            lists = external.column(constants.LIST_NAME)[1:]
             external_lists = set(filter(None, lists))
         except (xlrd.XLRDError, ValueError, IndexError):
             # sheet not found, list_name not found, not more than first row
             pass
 
         try:
-            survey = wb.sheet_by_name(constants.SURVEY)
-            types = Xlsform.get_column(survey, constants.TYPE)
+            survey = index.sheet_by_name(constants.SURVEY)
+            types = survey.column(constants.TYPE)
             for i, item in enumerate(types):
                 so = u'select_one '
                 sm = u'select_multiple '
@@ -285,7 +509,7 @@ class Xlsform:
         """Get ODK choice names with improper names
 
         Args:
-            wb: An `xlrd` Book instance
+            wb: An `xlrd` Book or SheetIndex instance
             sheetname (str): The name of the sheet to search
 
         Return:
@@ -299,8 +523,8 @@ class Xlsform:
 
         nonascii = []
         try:
-            choices = wb.sheet_by_name(sheetname)
-            names = Xlsform.get_column(choices, constants.NAME)
+            choices = SheetIndex.wrap(wb).sheet_by_name(sheetname)
+            names = choices.column(constants.NAME)
             for i, name in enumerate(names):
                 if i == 0 or unicode(name).strip() == u'':
                     continue
@@ -316,7 +540,7 @@ class Xlsform:
         """Check for language consistency throughout the questionnaire
 
         Args:
-            wb: An `xlrd` Book instance
+            wb: An `xlrd` Book or SheetIndex instance
 
         Return:
             A dictionary with three keys for 'survey', 'choices', and
@@ -368,7 +592,7 @@ class Xlsform:
             """Get a dictionary of translated items and their languages.
 
             Args:
-                sheet (xlrd.Sheet): The sheet to inspect
+                sheet (IndexedSheet): The sheet to inspect
                 src_cols (seq): A sequence of columns that are translated
 
             Returns:
@@ -376,8 +600,7 @@ class Xlsform:
                 the languages that are found with those source columns.
             """
             d = {}
-            headers = sheet.row_values(0)
-            for h in headers:
+            for h in sheet.headers:
                 if not isinstance(h, unicode):
                     continue
                 for t in src_cols:
@@ -396,9 +619,10 @@ class Xlsform:
                     break
             return d
 
+        index = SheetIndex.wrap(wb)
         d_survey = {}
         try:
-            survey = wb.sheet_by_name(constants.SURVEY)
+            survey = index.sheet_by_name(constants.SURVEY)
             d_survey = build_sheet_dict(survey, SURVEY_TRANSLATIONS)
         except (xlrd.XLRDError):
             # sheet not found
@@ -406,7 +630,7 @@ class Xlsform:
 
         d_choices = {}
         try:
-            choices = wb.sheet_by_name(constants.CHOICES)
+            choices = index.sheet_by_name(constants.CHOICES)
             d_choices = build_sheet_dict(choices, CHOICES_TRANSLATIONS)
         except (xlrd.XLRDError):
             # sheet not found
@@ -414,7 +638,7 @@ class Xlsform:
 
         d_external = {}
         try:
-            external = wb.sheet_by_name(constants.EXTERNAL_CHOICES)
+            external = index.sheet_by_name(constants.EXTERNAL_CHOICES)
             d_external = build_sheet_dict(external, CHOICES_TRANSLATIONS)
         except (xlrd.XLRDError):
             # sheet not found
@@ -428,16 +652,17 @@ class Xlsform:
         return big_d
 
     @staticmethod
-    def translation_pairs(ws, lang_dict):
-        """Iterate over pairs of translations.
+    def translation_columns(lang_dict):
+        """List the pairs of columns that translate each other
 
         Args:
-            ws: An `xlrd` Sheet instance
-            lang_dict: A language dictionary, built up by this instance
+            lang_dict: A language dictionary for one sheet, built by
+                ``check_languages``
 
-        Yields:
-            A tuple for each translation pair: (eng_row, eng_col, eng_value,
-            other_row, other_col, other_value).
+        Returns:
+            A list of tuples (default header, other header). The default
+            language is the one without "::", else English, else the first
+            alphabetically.
         """
         column_pairs = []
         for k in lang_dict:
@@ -457,6 +682,21 @@ class Xlsform:
                 others = [u'{}::{}'.format(k, l) for l in other_langs]
                 for other in others:
                     column_pairs.append((default, other))
+        return column_pairs
+
+    @staticmethod
+    def translation_pairs(ws, lang_dict):
+        """Iterate over pairs of translations.
+
+        Args:
+            ws: An `xlrd` Sheet or IndexedSheet instance
+            lang_dict: A language dictionary, built up by this instance
+
+        Yields:
+            A tuple for each translation pair: (eng_row, eng_col, eng_value,
+            other_row, other_col, other_value).
+        """
+        column_pairs = Xlsform.translation_columns(lang_dict)
         headers = ws.row_values(0)
         pair_inds = [
             (headers.index(a), headers.index(b)) for (a, b) in column_pairs
@@ -471,120 +711,103 @@ class Xlsform:
                 yield (i, a, a_val, i, b, b_val)
 
     @staticmethod
-    def find_missing_translations(wb, lang_dict=None):
-        """Find missing translations in the workbook.
+    def analyze_translations(wb, lang_dict=None, rules=None):
+        """Find missing and regex mis-matched translations in one pass.
+
+        Each translated column is read once. Every distinct string is scanned
+        for all token rules at once, no matter how many columns or languages
+        it appears in, and the results are compared row by row.
 
         Args:
-            wb: An `xlrd` Book instance
+            wb: An `xlrd` Book or SheetIndex instance
             lang_dict: The language dictionary for this workbook
+            rules (seq): The TokenRule objects to check, by default
+                ``tokenrules.DEFAULT_RULES``
 
         Returns:
-            A list of tuples of all missing or extraneous translations.
+            A tuple (missing, mismatched). missing is as returned by
+            ``find_missing_translations``, and mismatched as returned by
+            ``find_by_regex_translations``.
         """
+        scanner = TokenScanner(rules or DEFAULT_RULES)
+        wb = SheetIndex.wrap(wb)
         if not lang_dict:
             lang_dict = Xlsform.check_languages(wb)
-        d_survey = lang_dict[constants.SURVEY]
-        d_choices = lang_dict[constants.CHOICES]
-        d_external = lang_dict[constants.EXTERNAL_CHOICES]
-
-        def missing_by_sheet(d, wb, sheetname):
-            missing = []
+        missing = []
+        mismatched = []
+        sheetnames = (
+            constants.SURVEY,
+            constants.CHOICES,
+            constants.EXTERNAL_CHOICES
+        )
+        for sheetname in sheetnames:
+            d = lang_dict[sheetname]
+            if not d:
+                continue
             sheet = wb.sheet_by_name(sheetname)
-            for pair in Xlsform.translation_pairs(sheet, d):
-                a_val = pair[2]
-                b_val = pair[5]
-                if a_val and not b_val:
-                    missing.append((sheetname, pair[3], pair[4], True))
-                elif not a_val and b_val:
-                    missing.append((sheetname, pair[3], pair[4], False))
-            return missing
+            headers = sheet.headers
+            pairs = [(headers.index(a), headers.index(b)) for (a, b) in
+                     Xlsform.translation_columns(d)]
+            values = {}
+            found = {}
+            for col in set(itertools.chain.from_iterable(pairs)):
+                values[col] = sheet.col_values(col)
+                text = sheet.column(headers[col])
+                found[col] = [scanner.signature(val) for val in text]
+            for i in xrange(1, sheet.nrows):
+                for a, b in pairs:
+                    a_val = values[a][i]
+                    b_val = values[b][i]
+                    if a_val and not b_val:
+                        missing.append((sheetname, i, b, True))
+                    elif not a_val and b_val:
+                        missing.append((sheetname, i, b, False))
+                    a_found = found[a][i]
+                    b_found = found[b][i]
+                    if a_found != b_found:
+                        fails = scanner.mismatches(a_found, b_found)
+                        mismatched.append((sheetname, i, b, fails))
+        return missing, mismatched
 
-        missing = []
-        if d_survey:
-            l = missing_by_sheet(d_survey, wb, constants.SURVEY)
-            missing.extend(l)
-        if d_choices:
-            l = missing_by_sheet(d_choices, wb, constants.CHOICES)
-            missing.extend(l)
-        if d_external:
-            l = missing_by_sheet(d_external, wb, constants.EXTERNAL_CHOICES)
-            missing.extend(l)
-        return missing
+    @staticmethod
+    def find_missing_translations(wb, lang_dict=None):
+        """Find missing translations in the workbook.
+
+        Args:
+            wb: An `xlrd` Book or SheetIndex instance
+            lang_dict: The language dictionary for this workbook
+
+        Returns:
+            A list of tuples of all missing or extraneous translations.
+        """
+        return Xlsform.analyze_translations(wb, lang_dict)[0]
 
     @staticmethod
     def find_by_regex_translations(wb, lang_dict=None):
         """Find missing items by regex in translations in the workbook.
 
         Args:
-            wb: An `xlrd` Book instance
+            wb: An `xlrd` Book or SheetIndex instance
             lang_dict: The language dictionary for this workbook
 
         Returns:
             A list of tuples of all mis-matching items identified by regex.
         """
-
-        regex_list = [
-            r'\$\{(.*?)\}',
-            r'\d+'
-        ]
-        regex_prog = [re.compile(pattern) for pattern in regex_list]
-        regex_desc = [
-            "'${...}'",
-            "'[0-9]+'"
-        ]
-
-        if not lang_dict:
-            lang_dict = Xlsform.check_languages(wb)
-        d_survey = lang_dict[constants.SURVEY]
-        d_choices = lang_dict[constants.CHOICES]
-        d_external = lang_dict[constants.EXTERNAL_CHOICES]
-
-        def missing_by_sheet(d, wb, sheetname):
-            missing = []
-            sheet = wb.sheet_by_name(sheetname)
-            for pair in Xlsform.translation_pairs(sheet, d):
-                fails = []
-                a_val = pair[2]
-                b_val = pair[5]
-                if not isinstance(a_val, (str, unicode)):
-                    a_val = unicode(a_val)
-                if not isinstance(b_val, (str, unicode)):
-                    b_val = unicode(b_val)
-                for regex, prog in zip(regex_desc, regex_prog):
-                    a_found = sorted(prog.findall(a_val))
-                    b_found = sorted(prog.findall(b_val))
-                    if a_found != b_found:
-                        fails.append(regex)
-                if fails:
-                    record = sheetname, pair[3], pair[4], tuple(fails)
-                    missing.append(record)
-            return missing
-
-        missing = []
-        if d_survey:
-            l = missing_by_sheet(d_survey, wb, constants.SURVEY)
-            missing.extend(l)
-        if d_choices:
-            l = missing_by_sheet(d_choices, wb, constants.CHOICES)
-            missing.extend(l)
-        if d_external:
-            l = missing_by_sheet(d_external, wb, constants.EXTERNAL_CHOICES)
-            missing.extend(l)
-        return missing
+        return Xlsform.analyze_translations(wb, lang_dict)[1]
 
     @staticmethod
     def undefined_cols(wb, sheetname):
         """Return a list of columns that have values without a heading
 
         Args:
-            wb: An `xlrd` Book instance
+            wb: An `xlrd` Book or SheetIndex instance
             sheetname (str): The name of the sheet to search for
 
         Returns:
             A sorted list of (int) columns that have values without headers
         """
         try:
-            survey = wb.sheet_by_name(sheetname)
+            survey = SheetIndex.wrap(wb).sheet_by_name(sheetname)
             headers = survey.row_values(0)
             blank = [i for i, val in enumerate(headers) if val == u'']
             headless = []
@@ -618,10 +841,10 @@ class Xlsform:
     def get_settings(wb):
         values = {}
         try:
-            settings = wb.sheet_by_name(constants.SETTINGS)
-            for k, v in zip(settings.row(0), settings.row(1)):
-                if k.value != u'' and v.value != u'':
-                    values[k.value] = v.value
+            settings = SheetIndex.wrap(wb).sheet_by_name(constants.SETTINGS)
+            for k, v in zip(settings.row_values(0), settings.row_values(1)):
+                if k != u'' and v != u'':
+                    values[k] = v
         except xlrd.XLRDError:
             # No settings found
             pass
@@ -791,6 +1014,7 @@ class Xlsform:
 
     @staticmethod
     def external_choices_consistency(filename, wb):
+        wb = SheetIndex.wrap(wb)
         has_external_type = Xlsform.find_external_type(wb)
         has_external_choices_sheet = Xlsform.find_external_choices(wb)
         inconsistent = has_external_type ^ has_external_choices_sheet
@@ -838,6 +1062,34 @@ class Xlsform:
             m = m.format(self.path, u', '.join(version))
             raise XlsformError(m)
 
+    # The extra checks, in the order they are reported. Each name is the
+    # method name without the "extra_" prefix.
+    EXTRA_CHECKS = (
+        u'undefined_column',
+        u'undefined_ref',
+        u'multiple_choicelist',
+        u'unused_choicelist',
+        u'same_choices',
+        u'missing_translation',
+        u'regex_translation',
+        u'language_conflict',
+        u'nonascii'
+    )
+
+    def extra_warnings(self):
+        """Run every extra check
+
+        Returns:
+            A list of tuples (check name, warning), where the check name is
+            from ``EXTRA_CHECKS``
+        """
+        found = []
+        for name in self.EXTRA_CHECKS:
+            check = getattr(self, u'extra_' + name)
+            with profiling.span(profiling.check_phase(name), self.path):
+                found.extend((name, warning) for warning in check())
+        return found
+
     def extra_undefined_column(self):
         """Return warnings about undefined (headerless) columns
 
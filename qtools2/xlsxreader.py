@@ -0,0 +1,381 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2016 PMA2020
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Read the XLSForm tabs of an .xlsx file without loading the whole workbook
+
+``xlrd.open_workbook`` parses every sheet and every cell of a workbook into
+memory. This module streams only the worksheets that qtools2 uses (survey,
+choices, external_choices, settings) with an incremental XML parser and
+builds a ``SheetIndex`` from them. Scratch tabs are never parsed.
+
+Cell values follow the ``xlrd`` conventions so that the checks cannot tell
+the two readers apart: text is unicode, numbers are float, booleans are 0 or
+1, errors are ``xlrd`` error codes, and empty cells are the empty string.
+Booleans, errors, and numbers with a date format are noted in the sheet's
+``types`` as ``xlrd`` cell types.
+"""
+
+import re
+import zipfile
+import xml.etree.cElementTree as ElementTree
+
+import xlrd
+from xlrd.biffh import error_text_from_code
+from xlrd.formatting import is_date_format_string
+
+import constants
+from sheetindex import SheetIndex
+from sheetindex import IndexedSheet
+
+
+SSML = u'{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+ODREL = (u'{http://schemas.openxmlformats.org/officeDocument/2006/'
+         u'relationships}')
+PKGREL = u'{http://schemas.openxmlformats.org/package/2006/relationships}'
+XML_SPACE = u'{http://www.w3.org/XML/1998/namespace}space'
+
+ROW_TAG = SSML + u'row'
+V_TAG = SSML + u'v'
+IS_TAG = SSML + u'is'
+SI_TAG = SSML + u'si'
+T_TAG = SSML + u't'
+R_TAG = SSML + u'r'
+SHEET_DATA_TAG = SSML + u'sheetData'
+CELL_XFS_TAG = SSML + u'cellXfs'
+NUM_FMT_TAG = SSML + u'numFmt'
+
+WORKBOOK = u'xl/workbook.xml'
+WORKBOOK_RELS = u'xl/_rels/workbook.xml.rels'
+
+ERROR_CODES = dict((v, k) for k, v in error_text_from_code.items())
+# Built-in number formats that are dates, as ``xlrd`` assumes for .xlsx
+DATE_FORMATS = set(range(14, 23) + range(45, 48))
+ESCAPE_RE = re.compile(ur'_x[0-9A-Fa-f]{4}_')
+
+
+def read_sheet_index(path_or_file, sheetnames=constants.XLSFORM_SHEETS,
+                     columns=None):
+    """Stream worksheets from an .xlsx file into a SheetIndex
+
+    Args:
+        path_or_file: A path to an .xlsx file or a file-like object
+        sheetnames (seq): The names of the worksheets to read. All others
+            are skipped.
+        columns (dict): Optional column projection. Maps a sheet name to the
+            headers to keep for that sheet. Cells in other columns are not
+            kept, though the header row is always complete. Columns with a
+            blank header are always kept. Sheets not in the dict are read in
+            full.
+
+    Returns:
+        A SheetIndex
+
+    Raises:
+        IOError: If the path does not exist
+        zipfile.BadZipfile: If the file is not a zip archive
+        KeyError: If the archive is missing workbook parts
+        SyntaxError: If a workbook part is malformed XML
+    """
+    with zipfile.ZipFile(path_or_file) as archive:
+        rels = get_relationships(archive)
+        targets, datemode = get_sheet_targets(archive, rels)
+        names = [name for name, _ in targets]
+        wanted = [(n, t) for n, t in targets if n in sheetnames]
+        sst = []
+        date_xfs = set()
+        if wanted:
+            sst = get_shared_strings(archive, rels)
+            date_xfs = get_date_styles(archive, rels)
+        sheets = {}
+        for name, target in wanted:
+            keep = None
+            if columns is not None and name in columns:
+                keep = set(columns[name])
+            with archive.open(target) as stream:
+                sheets[name] = read_sheet(name, stream, sst, keep, date_xfs)
+    return SheetIndex(sheets, names, datemode)
+
+
+def get_relationships(archive):
+    """Get the parts that the workbook refers to
+
+    Args:
+        archive (zipfile.ZipFile): The opened .xlsx file
+
+    Returns:
+        A dictionary with relationship ids as keys and tuples (relationship
+        type, part name in the archive) as values
+    """
+    rels = {}
+    with archive.open(WORKBOOK_RELS) as stream:
+        for elem in ElementTree.parse(stream).iter(PKGREL + u'Relationship'):
+            target = elem.get(u'Target')
+            if target.startswith(u'/'):
+                target = target[1:]
+            else:
+                target = u'xl/' + target
+            reltype = elem.get(u'Type').split(u'/')[-1]
+            rels[elem.get(u'Id')] = reltype, target
+    return rels
+
+
+def get_sheet_targets(archive, rels):
+    """Get the worksheet names and their part names, in workbook order
+
+    Args:
+        archive (zipfile.ZipFile): The opened .xlsx file
+        rels (dict): The workbook relationships
+
+    Returns:
+        A tuple (targets, datemode). ``targets`` is a list of tuples (sheet
+        name, part name in the archive). Chart sheets and other
+        non-worksheets are left out, as in ``xlrd``. ``datemode`` is 1 for
+        the 1904 date system, otherwise 0.
+    """
+    targets = []
+    datemode = 0
+    with archive.open(WORKBOOK) as stream:
+        tree = ElementTree.parse(stream)
+    for elem in tree.iter(SSML + u'workbookPr'):
+        if elem.get(u'date1904', u'').lower() in (u'1', u'true', u'on'):
+            datemode = 1
+    for elem in tree.iter(SSML + u'sheet'):
+        reltype, target = rels[elem.get(ODREL + u'id')]
+        if reltype == u'worksheet':
+            name = unescape(unicode(elem.get(u'name')))
+            targets.append((name, target))
+    return targets, datemode
+
+
+def get_shared_strings(archive, rels):
+    """Read the shared string table
+
+    Args:
+        archive (zipfile.ZipFile): The opened .xlsx file
+        rels (dict): The workbook relationships
+
+    Returns:
+        A list of unicode, empty if the workbook has no shared strings
+    """
+    sst = []
+    targets = [t for reltype, t in rels.values() if reltype == u'sharedStrings']
+    if not targets:
+        return sst
+    with archive.open(targets[0]) as stream:
+        for _, elem in ElementTree.iterparse(stream):
+            if elem.tag == SI_TAG:
+                sst.append(get_rich_text(elem))
+                elem.clear()
+    return sst
+
+
+def get_date_styles(archive, rels):
+    """Find the cell formats that display numbers as dates
+
+    Args:
+        archive (zipfile.ZipFile): The opened .xlsx file
+        rels (dict): The workbook relationships
+
+    Returns:
+        A set of indices into the cellXfs list of the stylesheet
+    """
+    date_xfs = set()
+    targets = [t for reltype, t in rels.values() if reltype == u'styles']
+    if not targets:
+        return date_xfs
+    date_formats = set(DATE_FORMATS)
+    book = xlrd.book.Book()
+    with archive.open(targets[0]) as stream:
+        tree = ElementTree.parse(stream)
+    for elem in tree.iter(NUM_FMT_TAG):
+        num_fmt = int(elem.get(u'numFmtId'))
+        if is_date_format_string(book, unicode(elem.get(u'formatCode'))):
+            date_formats.add(num_fmt)
+        else:
+            date_formats.discard(num_fmt)
+    for cell_xfs in tree.iter(CELL_XFS_TAG):
+        for i, xf in enumerate(cell_xfs):
+            if int(xf.get(u'numFmtId', u'0')) in date_formats:
+                date_xfs.add(i)
+    return date_xfs
+
+
+def read_sheet(name, stream, sst, keep=None, date_xfs=frozenset()):
+    """Stream one worksheet into an IndexedSheet
+
+    Rows are discarded from the parse tree as soon as they are read, so
+    memory holds only the values that are kept.
+
+    Args:
+        name (str): The name of the sheet
+        stream: A file-like object with the worksheet XML
+        sst (list): The shared string table
+        keep (set): If not None, the headers of columns to keep
+        date_xfs (set): The cell formats that display numbers as dates
+
+    Returns:
+        An IndexedSheet
+    """
+    columns = []
+    types = {}
+    headers = {}
+    nrows = 0
+    rowx = -1
+    sheet_data = None
+    for event, elem in ElementTree.iterparse(stream, ('start', 'end')):
+        if event == 'start':
+            if elem.tag == SHEET_DATA_TAG:
+                sheet_data = elem
+            continue
+        if elem.tag != ROW_TAG:
+            continue
+        row_number = elem.get(u'r')
+        rowx = rowx + 1 if row_number is None else int(row_number) - 1
+        colx = -1
+        for cell in elem:
+            ref = cell.get(u'r')
+            colx = colx + 1 if ref is None else column_index(ref)
+            found, value = cell_value(cell, sst)
+            if not found:
+                continue
+            if rowx == 0:
+                headers[colx] = value
+            elif keep is not None and headers.get(colx, u'') != u'':
+                if headers[colx] not in keep:
+                    value = u''
+            if value != u'':
+                ctype = cell_type(cell, date_xfs)
+                if ctype is not None:
+                    types[(rowx, colx)] = ctype
+            while len(columns) <= colx:
+                columns.append([])
+            column = columns[colx]
+            if len(column) < rowx:
+                column.extend([u''] * (rowx - len(column)))
+            column.append(value)
+            nrows = max(nrows, rowx + 1)
+        if sheet_data is not None:
+            sheet_data.clear()
+    for column in columns:
+        if len(column) < nrows:
+            column.extend([u''] * (nrows - len(column)))
+    return IndexedSheet(name, columns, types)
+
+
+def cell_type(cell, date_xfs):
+    """Get the ``xlrd`` type of a <c> element if it is not text or number"""
+    t = cell.get(u't', u'n')
+    if t == u'n':
+        if int(cell.get(u's', u'0')) in date_xfs:
+            return xlrd.XL_CELL_DATE
+    elif t == u'b':
+        return xlrd.XL_CELL_BOOLEAN
+    elif t == u'e':
+        return xlrd.XL_CELL_ERROR
+    return None
+
+
+def cell_value(cell, sst):
+    """Get the value of a <c> element as ``xlrd`` would see it
+
+    Args:
+        cell: The <c> element
+        sst (list): The shared string table
+
+    Returns:
+        A tuple (found, value). ``found`` is False for cells that ``xlrd``
+        does not record, i.e. cells with formatting but no value.
+    """
+    cell_type = cell.get(u't', u'n')
+    text = None
+    inline = None
+    for child in cell:
+        if child.tag == V_TAG:
+            text = child.text
+        elif child.tag == IS_TAG:
+            inline = get_rich_text(child)
+    if cell_type == u'n':
+        if not text:
+            return False, u''
+        return True, float(text)
+    elif cell_type == u's':
+        if not text:
+            return False, u''
+        return True, sst[int(text)]
+    elif cell_type == u'str':
+        return True, cooked_text(cell.find(V_TAG))
+    elif cell_type == u'b':
+        return True, 1 if text in (u'1', u'true', u'on') else 0
+    elif cell_type == u'e':
+        return True, ERROR_CODES[text or u'#N/A']
+    elif cell_type == u'inlineStr':
+        value = inline if inline is not None else text
+        if not value:
+            return False, u''
+        return True, value
+    raise ValueError(u'Unknown cell type "{}"'.format(cell_type))
+
+
+def get_rich_text(elem):
+    """Join the text of an <si> or <is> element, including rich text runs"""
+    accum = []
+    for child in elem:
+        if child.tag == T_TAG:
+            accum.append(cooked_text(child))
+        elif child.tag == R_TAG:
+            for t in child.iter(T_TAG):
+                accum.append(cooked_text(t))
+    return u''.join(accum)
+
+
+def cooked_text(elem):
+    if elem is None or elem.text is None:
+        return u''
+    text = elem.text
+    if elem.get(XML_SPACE) != u'preserve':
+        text = text.strip(u'\t\n \r')
+    return unescape(unicode(text))
+
+
+def unescape(text):
+    """Replace Excel escapes such as "_x000D_" with their characters"""
+    if u'_' in text:
+        return ESCAPE_RE.sub(lambda m: unichr(int(m.group(0)[2:6], 16)), text)
+    return text
+
+
+def column_index(cell_name):
+    """Get the zero-indexed column from a cell name such as "AB12"
+
+    Args:
+        cell_name (str): The cell reference
+
+    Returns:
+        int: The column number
+    """
+    colx = 0
+    for c in cell_name:
+        if u'A' <= c <= u'Z':
+            colx = colx * 26 + ord(c) - 64
+        elif c != u'$':
+            break
+    return colx - 1
@@ -13,6 +13,9 @@ setup(
         'qtools2.test'
     ],
     package_data={
+        'qtools2': [
+            'ValidateService.java',
+        ],
         'qtools2.test': [
             'forms/*.xlsx',
             'forms/*.xml',